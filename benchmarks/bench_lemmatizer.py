@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Замер задержки лемматизатора слов запроса (см. Задание5/query_lemmatizer.py)
+
+Несколько потоков одновременно лемматизируют по одному слову за вызов, как
+SearchEngine.lemmatize_query для слова вне словаря лемм. Первый проход -
+слова, которых нет в кеше (каждое слово встречается один раз), второй - те же
+слова из кеша. Слова берутся из словоформ lemmas.txt Задания 2.
+
+Пример:
+    python bench_lemmatizer.py --lemmas-path ../Задание2/lemmas.txt --threads 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Задание5'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Задание2'))
+from query_lemmatizer import QueryLemmatizer
+from load_test import percentile
+
+
+def read_word_forms(lemmas_path: str, limit: int) -> list:
+    """Различные словоформы из файла лемм (строки «лемма: форма форма ...»)"""
+    words = {}
+    with open(lemmas_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if ':' not in line:
+                continue
+            for form in line.split(':', 1)[1].split():
+                words[form] = None
+    return list(words)[:limit]
+
+
+def run_pass(lemmatizer: QueryLemmatizer, words: list, threads: int) -> dict:
+    """
+    Лемматизация слов в threads потоках, по одному слову за вызов
+
+    :return: перцентили задержки вызова в миллисекундах и количество разобранных слов
+    """
+    latencies = []
+    lemmatized = 0
+    lock = threading.Lock()
+
+    def worker(part):
+        nonlocal lemmatized
+        local = []
+        found = 0
+        for word in part:
+            start = time.perf_counter()
+            found += len(lemmatizer.lemmatize([word]))
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            lemmatized += found
+
+    workers = [threading.Thread(target=worker, args=(words[index::threads],)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall_time = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'words': len(words),
+        'lemmatized': lemmatized,
+        'words_per_sec': round(len(words) / wall_time, 1) if wall_time > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 4),
+        'max_ms': round(latencies[-1] * 1000, 4) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер задержки лемматизатора слов запроса')
+    parser.add_argument('--lemmas-path', default='../Задание2/lemmas.txt', help='источник словоформ')
+    parser.add_argument('--backend', default='auto', help='auto, pymorphy или mystem')
+    parser.add_argument('--threads', type=int, default=8, help='параллельные потоки')
+    parser.add_argument('--words', type=int, default=20000, help='максимум различных слов')
+    args = parser.parse_args()
+
+    words = read_word_forms(args.lemmas_path, args.words)
+    lemmatizer = QueryLemmatizer(backend=args.backend)
+    # Запуск анализатора (загрузка словарей) не входит в замер
+    start = time.perf_counter()
+    lemmatizer.lemmatize(['прогрев'])
+    startup = time.perf_counter() - start
+
+    report = {
+        'backend': args.backend,
+        'threads': args.threads,
+        'startup_s': round(startup, 3),
+        'uncached': run_pass(lemmatizer, words, args.threads),
+        'cached': run_pass(lemmatizer, words, args.threads),
+    }
+    lemmatizer.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Замер задержки поиска SearchEngine (Задание 5) на наборе запросов
+
+Запускается отдельным процессом из run_benchmarks.py, чтобы пиковая память
+относилась только к поисковой системе. Результат - JSON в последней строке вывода.
+
+Пример:
+    python bench_search.py --queries corpus/queries.txt --pages-dir corpus/pages \\
+        --tokens-path corpus/tokens.txt --lemmas-path corpus/lemmas.txt \\
+        --index-path work/inverted_index.json --tf-idf-dir work/results
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Задание5'))
+from search_engine import SearchEngine
+from metrics import SearchProfile
+from load_test import percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер задержки поиска')
+    parser.add_argument('--queries', required=True, help='файл запросов (по одному в строке)')
+    parser.add_argument('--limit', type=int, default=1000, help='максимум запросов')
+    parser.add_argument('--ranking', default='tfidf')
+    parser.add_argument('--index-path', required=True)
+    parser.add_argument('--tokens-path', required=True)
+    parser.add_argument('--lemmas-path', required=True)
+    parser.add_argument('--pages-dir', required=True)
+    parser.add_argument('--tf-idf-dir', required=True)
+    args = parser.parse_args()
+
+    with open(args.queries, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()][:args.limit]
+
+    start_time = time.perf_counter()
+    engine = SearchEngine(index_path=args.index_path,
+                          tokens_path=args.tokens_path,
+                          lemmas_path=args.lemmas_path,
+                          pages_dir=args.pages_dir,
+                          tf_idf_dir=args.tf_idf_dir,
+                          semantic_dir=None)
+    load_seconds = time.perf_counter() - start_time
+
+    # Прогрев: ленивые структуры и кэши файловой системы
+    for query in queries[:10]:
+        engine.search(query, ranking=args.ranking)
+
+    # Задержка полного поиска (с заголовками и фрагментами); общий профиль
+    # накапливает счетчики первого уровня индекса
+    latencies = []
+    profile = SearchProfile()
+    start_time = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        engine.search(query, ranking=args.ranking, profile=profile)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+    search_seconds = time.perf_counter() - start_time
+    latencies.sort()
+
+    # Пропускная способность пакетного поиска (без чтения HTML)
+    start_time = time.perf_counter()
+    engine.search_batch(queries, ranking=args.ranking)
+    batch_seconds = time.perf_counter() - start_time
+
+    tier_queries = profile.counters.get('tier1_hits', 0) + profile.counters.get('tier1_fallbacks', 0)
+
+    print(json.dumps({
+        'documents': len(engine.doc_ids),
+        'queries': len(queries),
+        'load_seconds': round(load_seconds, 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'qps': round(len(queries) / search_seconds, 1) if search_seconds > 0 else 0.0,
+        'batch_qps': round(len(queries) / batch_seconds, 1) if batch_seconds > 0 else 0.0,
+        'tier1_hit_rate': round(profile.counters.get('tier1_hits', 0) / tier_queries, 4) if tier_queries else 0.0,
+    }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Замер первого уровня индекса TF-IDF (см. Задание5/tiered_index.py) при разных размерах уровня
+
+Для каждого размера уровня: доля вхождений в первом уровне, доля запросов, на
+которые первый уровень ответил с гарантией (tier1_hit_rate), задержка отбора
+top_n с гарантией точности (guaranteed_*) и без перехода на полные списки
+(tier1_only_*, результат приближенный), полнота (recall) приближенного ответа
+относительно полного поиска. Строка с размером 0 - поиск без первого уровня.
+Замеряется только ранжирование, без заголовков и фрагментов.
+
+Пример:
+    python bench_tiers.py --queries corpus/queries.txt --pages-dir corpus/pages \\
+        --tokens-path corpus/tokens.txt --lemmas-path corpus/lemmas.txt \\
+        --index-path work/inverted_index.json --tf-idf-dir work/results --sizes 16,64,256
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Задание5'))
+from search_engine import SearchEngine
+from tiered_index import TieredIndex
+from load_test import percentile
+
+
+def latency_report(prefix: str, latencies: list) -> dict:
+    """Перцентили задержки в миллисекундах"""
+    latencies = sorted(latencies)
+    return {f"{prefix}_p50_ms": round(percentile(latencies, 50), 3),
+            f"{prefix}_p99_ms": round(percentile(latencies, 99), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер первого уровня индекса TF-IDF')
+    parser.add_argument('--queries', required=True, help='файл запросов (по одному в строке)')
+    parser.add_argument('--limit', type=int, default=1000, help='максимум запросов')
+    parser.add_argument('--top-n', type=int, default=10, help='размер выдачи')
+    parser.add_argument('--sizes', default='8,16,32,64,128,256', help='размеры первого уровня')
+    parser.add_argument('--index-path', required=True)
+    parser.add_argument('--tokens-path', required=True)
+    parser.add_argument('--lemmas-path', required=True)
+    parser.add_argument('--pages-dir', required=True)
+    parser.add_argument('--tf-idf-dir', required=True)
+    args = parser.parse_args()
+
+    with open(args.queries, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()][:args.limit]
+
+    engine = SearchEngine(index_path=args.index_path,
+                          tokens_path=args.tokens_path,
+                          lemmas_path=args.lemmas_path,
+                          pages_dir=args.pages_dir,
+                          tf_idf_dir=args.tf_idf_dir,
+                          semantic_dir=None,
+                          tier_size=None)
+    vectors = [engine.compute_query_vector(engine.lemmatize_query(engine.tokenize_query(query)))
+               for query in queries]
+    vectors = [vector for vector in vectors if vector]
+
+    # Полный поиск: эталон для полноты и базовая задержка
+    exact = []
+    latencies = []
+    for vector in vectors:
+        start = time.perf_counter()
+        docs, _ = engine._rank_lexical(vector, args.top_n)
+        latencies.append((time.perf_counter() - start) * 1000)
+        exact.append(set(docs.tolist()))
+    rows = [dict({'tier_size': 0, 'tier1_postings_share': 1.0}, **latency_report('guaranteed', latencies))]
+
+    for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        engine.tier_size = size
+        engine.tiered_index = TieredIndex.build(engine.postings_offsets, engine.postings_docs,
+                                                engine.postings_weights, size)
+        guaranteed_latencies = []
+        tier_latencies = []
+        hits = 0
+        recall = 0.0
+        for vector, expected in zip(vectors, exact):
+            start = time.perf_counter()
+            docs, _, guaranteed = engine._rank_tiered(vector, args.top_n)
+            tier_latencies.append((time.perf_counter() - start) * 1000)
+            hits += guaranteed
+            found = set(engine.doc_ids[docs].tolist())
+            recall += len(found & expected) / len(expected) if expected else 1.0
+
+            start = time.perf_counter()
+            engine._rank_lexical(vector, args.top_n)
+            guaranteed_latencies.append((time.perf_counter() - start) * 1000)
+
+        row = {
+            'tier_size': size,
+            'tier1_postings_share': round(len(engine.tiered_index.docs) / max(len(engine.postings_docs), 1), 4),
+            'tier1_hit_rate': round(hits / len(vectors), 4) if vectors else 0.0,
+            'tier1_only_recall': round(recall / len(vectors), 4) if vectors else 0.0,
+        }
+        row.update(latency_report('tier1_only', tier_latencies))
+        row.update(latency_report('guaranteed', guaranteed_latencies))
+        rows.append(row)
+
+    print(json.dumps({'documents': len(engine.doc_ids), 'queries': len(vectors),
+                      'top_n': args.top_n, 'tiers': rows}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
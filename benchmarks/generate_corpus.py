@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Генератор воспроизводимого синтетического корпуса HTML-страниц
+
+Словарь состоит из кириллических лемм с формами (основа + окончание) и
+латинских слов; частоты слов подчиняются закону Ципфа. Кроме страниц
+генерируются файлы, которые в реальном конвейере строит Задание 2
+(tokens.txt, lemmas.txt), - поэтому последующие этапы можно измерять без
+mystem, - и набор запросов для измерения задержки поиска.
+
+Структура результата:
+    <output>/pages/page_NNN.html
+    <output>/tokens.txt
+    <output>/lemmas.txt
+    <output>/queries.txt
+    <output>/corpus.json - параметры генерации
+
+Пример:
+    python generate_corpus.py --output corpus --documents 10000
+"""
+
+import argparse
+import glob
+import json
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+CYRILLIC_CONSONANTS = 'бвгдзклмнпрстфхцчшщ'
+CYRILLIC_VOWELS = 'аеиоуыяю'
+LATIN_CONSONANTS = 'bcdfghklmnprstvz'
+LATIN_VOWELS = 'aeiou'
+# Окончания форм кириллических лемм
+CYRILLIC_ENDINGS = ('', 'а', 'у', 'ом', 'е', 'ы', 'ов', 'ами')
+# Стоп-слова, которые токенизатор должен отбрасывать
+STOP_WORDS = ('и', 'в', 'на', 'не', 'что', 'как', 'для', 'the', 'of', 'and', 'to', 'in')
+
+DEFAULT_DOCUMENTS = 1000
+DEFAULT_VOCABULARY = 20000
+DEFAULT_ZIPF_EXPONENT = 1.1
+DEFAULT_LATIN_SHARE = 0.2
+DEFAULT_MEAN_LENGTH = 300
+DEFAULT_QUERIES = 1000
+
+
+def _make_stem(rng: np.random.Generator, consonants: str, vowels: str) -> str:
+    """Случайная основа из 2-4 слогов"""
+    syllables = rng.integers(2, 5)
+    return ''.join(consonants[rng.integers(len(consonants))] + vowels[rng.integers(len(vowels))]
+                   for _ in range(syllables))
+
+
+def build_vocabulary(size: int, latin_share: float, seed: int) -> List[Tuple[str, List[str]]]:
+    """
+    Построение словаря лемм с формами
+
+    :param size: количество лемм
+    :param latin_share: доля латинских слов
+    :param seed: зерно генератора случайных чисел
+    :return: список (лемма, формы) в порядке убывания частоты
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = []
+    seen = set()
+    while len(vocabulary) < size:
+        if rng.random() < latin_share:
+            word = _make_stem(rng, LATIN_CONSONANTS, LATIN_VOWELS)
+            forms = [word]
+        else:
+            word = _make_stem(rng, CYRILLIC_CONSONANTS, CYRILLIC_VOWELS)
+            forms = [word + ending for ending in CYRILLIC_ENDINGS[:rng.integers(2, len(CYRILLIC_ENDINGS) + 1)]]
+        if word in seen or any(form in seen for form in forms):
+            continue
+        seen.add(word)
+        seen.update(forms)
+        vocabulary.append((word, forms))
+    return vocabulary
+
+
+def zipf_probabilities(size: int, exponent: float) -> np.ndarray:
+    """Вероятности рангов 1..size по закону Ципфа"""
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def render_page(doc_id: int, title: List[str], paragraphs: List[List[str]]) -> str:
+    """HTML-страница документа (со скриптом и стилем, которые удаляются при извлечении текста)"""
+    body = '\n'.join(f"<p>{' '.join(words)}</p>" for words in paragraphs)
+    return (f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{' '.join(title)}</title>\n"
+            f"<style>body {{ font-family: sans-serif; }}</style>\n"
+            f"<script>var documentId = {doc_id};</script>\n"
+            f"</head>\n<body>\n<h1>{' '.join(title)}</h1>\n{body}\n</body>\n</html>\n")
+
+
+def generate_corpus(output_dir: str, documents: int = DEFAULT_DOCUMENTS,
+                    vocabulary_size: int = DEFAULT_VOCABULARY,
+                    zipf_exponent: float = DEFAULT_ZIPF_EXPONENT,
+                    latin_share: float = DEFAULT_LATIN_SHARE,
+                    mean_length: int = DEFAULT_MEAN_LENGTH,
+                    queries: int = DEFAULT_QUERIES,
+                    seed: int = 42) -> Dict[str, object]:
+    """
+    Генерация корпуса
+
+    :param output_dir: директория результата (страницы прошлой генерации в ней удаляются)
+    :param documents: количество документов
+    :param vocabulary_size: количество лемм в словаре
+    :param zipf_exponent: показатель закона Ципфа
+    :param latin_share: доля латинских слов в словаре
+    :param mean_length: средняя длина документа в словах
+    :param queries: количество запросов
+    :param seed: зерно генератора случайных чисел
+    :return: параметры и статистика корпуса
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = build_vocabulary(vocabulary_size, latin_share, seed)
+    cumulative = np.cumsum(zipf_probabilities(len(vocabulary), zipf_exponent))
+
+    # Плоская таблица форм: форма i-й леммы с номером j - forms[form_offsets[i] + j]
+    forms = np.array([form for _, lemma_forms in vocabulary for form in lemma_forms], dtype=object)
+    form_counts = np.array([len(lemma_forms) for _, lemma_forms in vocabulary])
+    form_offsets = np.concatenate([[0], np.cumsum(form_counts)[:-1]])
+    used_forms = np.zeros(len(forms), dtype=bool)
+    stop_words = np.array(STOP_WORDS, dtype=object)
+
+    pages_dir = os.path.join(output_dir, 'pages')
+    os.makedirs(pages_dir, exist_ok=True)
+    # Страницы прошлого корпуса большего размера иначе остались бы в корпусе
+    for path in glob.glob(os.path.join(pages_dir, 'page_*.html')):
+        os.remove(path)
+    total_words = 0
+
+    for doc_id in range(1, documents + 1):
+        length = max(20, int(rng.lognormal(np.log(mean_length), 0.5)))
+        lemma_ids = np.minimum(np.searchsorted(cumulative, rng.random(length)), len(vocabulary) - 1)
+        form_ids = form_offsets[lemma_ids] + (rng.random(length) * form_counts[lemma_ids]).astype(np.int64)
+        used_forms[form_ids] = True
+        words = forms[form_ids]
+
+        # Стоп-слова примерно на каждом десятом месте
+        stop_positions = rng.integers(0, length, size=length // 10)
+        words[stop_positions] = stop_words[rng.integers(0, len(stop_words), size=len(stop_positions))]
+        words = words.tolist()
+        total_words += length
+
+        title = words[:rng.integers(3, 8)]
+        paragraph_size = 60
+        paragraphs = [words[i:i + paragraph_size] for i in range(0, len(words), paragraph_size)]
+        with open(os.path.join(pages_dir, f"page_{doc_id:03d}.html"), 'w', encoding='utf-8') as f:
+            f.write(render_page(doc_id, title, paragraphs))
+
+    # Результаты Задания 2: токены (формы длиной от 3 букв) и леммы с формами
+    tokens = []
+    with open(os.path.join(output_dir, 'lemmas.txt'), 'w', encoding='utf-8') as f:
+        for (lemma, lemma_forms), offset in zip(vocabulary, form_offsets):
+            lemma_forms = [form for j, form in enumerate(lemma_forms)
+                           if used_forms[offset + j] and len(form) >= 3]
+            if lemma_forms:
+                tokens.extend(lemma_forms)
+                f.write(f"{lemma}: {' '.join(lemma_forms)}\n")
+    with open(os.path.join(output_dir, 'tokens.txt'), 'w', encoding='utf-8') as f:
+        for token in tokens:
+            f.write(f"{token}\n")
+
+    # Запросы из 1-3 слов с тем же распределением частот
+    with open(os.path.join(output_dir, 'queries.txt'), 'w', encoding='utf-8') as f:
+        for _ in range(queries):
+            lemma_ids = np.minimum(np.searchsorted(cumulative, rng.random(rng.integers(1, 4))),
+                                   len(vocabulary) - 1)
+            f.write(' '.join(vocabulary[lemma_id][1][0] for lemma_id in lemma_ids) + '\n')
+
+    info = {
+        'documents': documents,
+        'vocabulary_size': vocabulary_size,
+        'zipf_exponent': zipf_exponent,
+        'latin_share': latin_share,
+        'mean_length': mean_length,
+        'queries': queries,
+        'seed': seed,
+        'total_words': total_words,
+        'tokens': len(tokens),
+    }
+    with open(os.path.join(output_dir, 'corpus.json'), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генерация синтетического корпуса HTML-страниц')
+    parser.add_argument('--output', default='corpus', help='директория корпуса')
+    parser.add_argument('--documents', type=int, default=DEFAULT_DOCUMENTS)
+    parser.add_argument('--vocabulary', type=int, default=DEFAULT_VOCABULARY)
+    parser.add_argument('--zipf-exponent', type=float, default=DEFAULT_ZIPF_EXPONENT)
+    parser.add_argument('--latin-share', type=float, default=DEFAULT_LATIN_SHARE)
+    parser.add_argument('--mean-length', type=int, default=DEFAULT_MEAN_LENGTH)
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    info = generate_corpus(args.output, args.documents, args.vocabulary, args.zipf_exponent,
+                           args.latin_share, args.mean_length, args.queries, args.seed)
+    print(json.dumps(info, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Запуск скрипта этапа с записью пиковой памяти процесса
+
+ru_maxrss дочернего процесса в Linux учитывает память родителя на момент
+fork, поэтому пиковый RSS берется из VmHWM в /proc/self/status (память
+только этого процесса после exec) и записывается при выходе в файл из
+переменной окружения OIP_PEAK_RSS_FILE.
+
+Пример:
+    OIP_PEAK_RSS_FILE=peak.txt python measure.py main.py
+"""
+
+import atexit
+import os
+import resource
+import runpy
+import sys
+
+
+def peak_rss_bytes() -> int:
+    """Пиковый RSS текущего процесса в байтах"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Вне Linux: ru_maxrss в байтах (macOS) или килобайтах
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def write_peak_rss():
+    """Запись пикового RSS в файл OIP_PEAK_RSS_FILE"""
+    path = os.environ.get('OIP_PEAK_RSS_FILE')
+    if path:
+        with open(path, 'w') as f:
+            f.write(str(peak_rss_bytes()))
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Использование: python measure.py <скрипт> [аргументы...]")
+        sys.exit(2)
+    atexit.register(write_peak_rss)
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path[0] = os.path.dirname(os.path.abspath(script))
+    runpy.run_path(script, run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
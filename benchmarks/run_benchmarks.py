@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Сквозной бенчмарк всех этапов на синтетическом корпусе
+
+Этапы запускаются отдельными процессами с путями, переданными через
+переменные окружения (OIP_PAGES_DIR, OIP_TOKENS_PATH и др.), поэтому рабочие
+данные заданий не затрагиваются:
+
+    crawl    - краулер Задания 1 скачивает страницы корпуса с локального HTTP-сервера
+    tokenize - токенизация и лемматизация Задания 2 (требует pymystem3)
+    index    - инвертированный индекс Задания 3
+    tf_idf   - TF-IDF, словарь и вклады BM25 Задания 4
+    search   - задержка поиска Задания 5 (bench_search.py)
+
+Для каждого этапа записываются время, документы в секунду и пиковая память
+процесса (RSS, см. measure.py); для поиска - p50/p99 задержки и QPS. Отчет в JSON можно
+сравнить с отчетом другого коммита (--baseline): при ухудшении любой метрики
+больше допуска скрипт завершается с кодом 1.
+
+Пример:
+    python run_benchmarks.py --documents 10000 --output report.json
+    python run_benchmarks.py --corpus corpus --baseline report.json
+"""
+
+import argparse
+import datetime
+import functools
+import http.server
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from generate_corpus import generate_corpus
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+MEASURE_SCRIPT = os.path.join(BENCHMARKS_DIR, 'measure.py')
+STAGES = ('crawl', 'tokenize', 'index', 'tf_idf', 'search')
+
+# Метрики, рост которых - ухудшение, и метрики, падение которых - ухудшение
+LOWER_IS_BETTER = ('seconds', 'peak_rss_mb', 'p50_ms', 'p99_ms')
+HIGHER_IS_BETTER = ('docs_per_sec', 'qps', 'batch_qps', 'tier1_hit_rate')
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """Раздача файлов корпуса без журнала запросов"""
+    def log_message(self, format, *args):
+        pass
+
+
+def run_stage(name: str, script: List[str], cwd: str, env: Dict[str, str], log_dir: str,
+              documents: int, stdin: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Запуск этапа отдельным процессом с замером времени и пиковой памяти
+
+    :param name: имя этапа
+    :param script: скрипт этапа и его аргументы
+    :param cwd: рабочая директория (директория задания)
+    :param env: дополнительные переменные окружения
+    :param log_dir: директория журналов вывода этапов
+    :param documents: количество обрабатываемых документов
+    :param stdin: текст, подаваемый на стандартный ввод
+    :return: результат этапа
+    """
+    print(f"[{name}] {' '.join(script)}")
+    log_path = os.path.join(log_dir, f"{name}.log")
+    peak_rss_path = os.path.join(log_dir, f"{name}.peak_rss")
+    if os.path.exists(peak_rss_path):
+        os.remove(peak_rss_path)
+
+    with open(log_path, 'w', encoding='utf-8') as log:
+        start_time = time.perf_counter()
+        process = subprocess.Popen([sys.executable, MEASURE_SCRIPT] + script, cwd=cwd,
+                                   env={**os.environ, **env, 'OIP_PEAK_RSS_FILE': peak_rss_path},
+                                   stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT)
+        process.communicate(stdin.encode('utf-8') if stdin is not None else None)
+        seconds = time.perf_counter() - start_time
+
+    try:
+        with open(peak_rss_path, 'r') as f:
+            rss_bytes = int(f.read())
+    except (OSError, ValueError):
+        rss_bytes = 0
+    result = {
+        'status': 'ok' if process.returncode == 0 else 'failed',
+        'seconds': round(seconds, 3),
+        'documents': documents,
+        'docs_per_sec': round(documents / seconds, 1) if seconds > 0 else 0.0,
+        'peak_rss_mb': round(rss_bytes / 2 ** 20, 1),
+    }
+    if process.returncode != 0:
+        with open(log_path, 'r', encoding='utf-8', errors='replace') as log:
+            result['error'] = log.read()[-500:]
+        print(f"[{name}] ошибка (код {process.returncode}), журнал: {log_path}")
+    else:
+        print(f"[{name}] {result['seconds']} с, {result['docs_per_sec']} док/с, "
+              f"{result['peak_rss_mb']} МБ")
+    return result
+
+
+def benchmark_crawl(corpus_dir: str, work_dir: str, log_dir: str, documents: int) -> Dict[str, Any]:
+    """Краулер Задания 1 против локального HTTP-сервера со страницами корпуса"""
+    pages_dir = os.path.join(corpus_dir, 'pages')
+    handler = functools.partial(QuietHandler, directory=pages_dir)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    page_files = sorted(f for f in os.listdir(pages_dir) if f.endswith('.html'))[:documents]
+    urls_path = os.path.join(work_dir, 'crawl_urls.txt')
+    with open(urls_path, 'w', encoding='utf-8') as f:
+        for page_file in page_files:
+            f.write(f"http://127.0.0.1:{server.server_address[1]}/{page_file}\n")
+
+    try:
+        return run_stage('crawl', ['ultra_simple_crawler.py'],
+                         cwd=os.path.join(REPO_DIR, 'Задание_1', 'crawler'),
+                         env={'OIP_CRAWLER_URLS_FILE': urls_path,
+                              'OIP_PAGES_DIR': os.path.join(work_dir, 'crawled'),
+                              'OIP_CRAWLER_INDEX_FILE': os.path.join(work_dir, 'crawled_index.txt'),
+                              'OIP_CRAWLER_MAX_PAGES': str(len(page_files)),
+                              'OIP_CRAWLER_MIN_DELAY': '0',
+                              'OIP_CRAWLER_MAX_DELAY': '0'},
+                         log_dir=log_dir, documents=len(page_files))
+    finally:
+        server.shutdown()
+
+
+def run_benchmarks(corpus_dir: str, work_dir: str, stages: List[str],
+                   crawl_documents: int, queries: int) -> Dict[str, Any]:
+    """
+    Запуск выбранных этапов
+
+    Этапы после токенизации используют tokens.txt и lemmas.txt генератора,
+    поэтому их результаты не зависят от наличия mystem.
+
+    :param corpus_dir: директория корпуса (см. generate_corpus.py)
+    :param work_dir: директория промежуточных результатов
+    :param stages: этапы
+    :param crawl_documents: количество страниц для краулера
+    :param queries: количество поисковых запросов
+    :return: отчет
+    """
+    with open(os.path.join(corpus_dir, 'corpus.json'), 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+    documents = corpus['documents']
+    corpus_dir = os.path.abspath(corpus_dir)
+    work_dir = os.path.abspath(work_dir)
+    log_dir = os.path.join(work_dir, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    paths = {
+        'OIP_PAGES_DIR': os.path.join(corpus_dir, 'pages'),
+        'OIP_TOKENS_PATH': os.path.join(corpus_dir, 'tokens.txt'),
+        'OIP_LEMMAS_PATH': os.path.join(corpus_dir, 'lemmas.txt'),
+        'OIP_INDEX_PATH': os.path.join(work_dir, 'inverted_index.json'),
+        'OIP_TF_IDF_DIR': os.path.join(work_dir, 'results'),
+        'OIP_TOKENIZER_OUTPUT_DIR': os.path.join(work_dir, 'tokenizer'),
+    }
+    os.makedirs(paths['OIP_TOKENIZER_OUTPUT_DIR'], exist_ok=True)
+
+    results = {}
+    if 'crawl' in stages:
+        results['crawl'] = benchmark_crawl(corpus_dir, work_dir, log_dir, min(crawl_documents, documents))
+
+    if 'tokenize' in stages:
+        results['tokenize'] = run_stage('tokenize', ['tokenizer.py'],
+                                        cwd=os.path.join(REPO_DIR, 'Задание2'), env=paths,
+                                        log_dir=log_dir, documents=documents)
+
+    if 'index' in stages:
+        results['index'] = run_stage('index', ['main.py', '--build'],
+                                     cwd=os.path.join(REPO_DIR, 'Задание3'), env=paths,
+                                     log_dir=log_dir, documents=documents)
+
+    if 'tf_idf' in stages:
+        results['tf_idf'] = run_stage('tf_idf', ['main.py'],
+                                      cwd=os.path.join(REPO_DIR, 'Задание4'), env=paths,
+                                      log_dir=log_dir, documents=documents)
+
+    if 'search' in stages:
+        command = [os.path.join(BENCHMARKS_DIR, 'bench_search.py'),
+                   '--queries', os.path.join(corpus_dir, 'queries.txt'),
+                   '--limit', str(queries),
+                   '--index-path', paths['OIP_INDEX_PATH'],
+                   '--tokens-path', paths['OIP_TOKENS_PATH'],
+                   '--lemmas-path', paths['OIP_LEMMAS_PATH'],
+                   '--pages-dir', paths['OIP_PAGES_DIR'],
+                   '--tf-idf-dir', paths['OIP_TF_IDF_DIR']]
+        result = run_stage('search', command, cwd=os.path.join(REPO_DIR, 'Задание5'), env={},
+                           log_dir=log_dir, documents=documents)
+        if result['status'] == 'ok':
+            with open(os.path.join(log_dir, 'search.log'), 'r', encoding='utf-8') as f:
+                result.update(json.loads(f.read().strip().splitlines()[-1]))
+            # Документы в секунду для поиска не имеют смысла
+            del result['docs_per_sec']
+        results['search'] = result
+
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': corpus,
+        'stages': results,
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Текущий коммит репозитория (None вне git)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(report: Dict[str, Any], baseline: Dict[str, Any],
+                    tolerance: float) -> List[str]:
+    """
+    Сравнение отчета с базовым
+
+    :param report: текущий отчет
+    :param baseline: базовый отчет
+    :param tolerance: допустимое относительное ухудшение (0.2 = 20%)
+    :return: список описаний регрессий
+    """
+    regressions = []
+    print(f"\nСравнение с {baseline.get('commit')} (допуск {tolerance:.0%}):")
+    for stage, result in report['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if not base or result.get('status') != 'ok' or base.get('status') != 'ok':
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if metric not in result or metric not in base or not base[metric]:
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            mark = ' <- регрессия' if worse else ''
+            print(f"  {stage}.{metric}: {base[metric]} -> {result[metric]} ({change:+.1%}){mark}")
+            if worse:
+                regressions.append(f"{stage}.{metric}: {base[metric]} -> {result[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сквозной бенчмарк этапов поисковой системы')
+    parser.add_argument('--corpus', help='готовый корпус (по умолчанию генерируется в <work>/corpus)')
+    parser.add_argument('--documents', type=int, default=1000, help='размер генерируемого корпуса')
+    parser.add_argument('--vocabulary', type=int, default=20000, help='размер словаря корпуса')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--work', default='benchmark_work', help='директория промежуточных результатов')
+    parser.add_argument('--stages', default=','.join(STAGES), help='этапы через запятую')
+    parser.add_argument('--crawl-documents', type=int, default=200,
+                        help='страниц для краулера (он скачивает последовательно)')
+    parser.add_argument('--queries', type=int, default=500, help='поисковых запросов')
+    parser.add_argument('--output', default='benchmark_report.json', help='файл отчета')
+    parser.add_argument('--baseline', help='отчет для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение')
+    parser.add_argument('--clean', action='store_true', help='удалить рабочую директорию после замера')
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"неизвестные этапы: {', '.join(sorted(unknown))}")
+
+    corpus_dir = args.corpus
+    if corpus_dir is None:
+        corpus_dir = os.path.join(args.work, 'corpus')
+        print(f"Генерация корпуса из {args.documents} документов в {corpus_dir}...")
+        generate_corpus(corpus_dir, documents=args.documents, vocabulary_size=args.vocabulary,
+                        seed=args.seed)
+
+    report = run_benchmarks(corpus_dir, args.work, stages, args.crawl_documents, args.queries)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Отчет сохранен в {args.output}")
+
+    if args.clean:
+        shutil.rmtree(args.work, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_reports(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Регрессии: {len(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
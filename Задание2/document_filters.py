@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Метаданные документов и фильтры поиска
+
+Краулер (Задание 1) записывает в data/index.txt строку на страницу:
+    <id> <url> [<дата загрузки YYYY-MM-DD> <размер в байтах> <язык>]
+Для индексов старого формата (только id и URL) дата, размер и язык берутся
+из файла страницы: время изменения, размер файла и атрибут lang тега <html>.
+
+Категориальные поля (хост вместе со всеми родительскими доменами, язык)
+компилируются в битовые карты документов: по одной упакованной карте
+(np.packbits, бит на документ) на значение, значения ищутся в TermDictionary.
+Числовые поля (дата, размер) хранятся столбцами, условие на диапазон - одно
+векторное сравнение. Фильтр запроса - конъюнкция условий, вычисляемая в маску
+допустимых документов до ранжирования: при избирательном фильтре списки
+вхождений терминов не просматриваются целиком (см. DocumentFilter.restrict).
+
+Синтаксис условий (в тексте запроса или отдельным параметром):
+    site:wikipedia.org   - хост или его родительский домен
+    -site:habr.com       - исключение (префикс `-` у любого условия)
+    lang:en              - язык страницы
+    date:>=2025-04-01    - дата загрузки (>, >=, <, <=, точное значение, диапазон a..b)
+    length:<100000       - размер страницы в байтах
+"""
+
+import datetime
+import os
+import re
+from collections import defaultdict
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from term_dictionary import TermDictionary
+
+CATEGORICAL_FIELDS = ('site', 'lang')
+NUMERIC_FIELDS = ('date', 'length')
+# Условие фильтра в тексте запроса: [-]поле:значение, отдельное слово
+CLAUSE_PATTERN = re.compile(r'(?<!\S)(-?)(site|lang|date|length):(\S+)')
+RANGE_PATTERN = re.compile(r'(>=|<=|>|<)?([^.<>=]+)(?:\.\.([^.<>=]+))?')
+# Атрибут lang тега <html> (ищется в начале страницы)
+HTML_LANG_PATTERN = re.compile(rb'<html[^>]*?\blang\s*=\s*["\']?([a-zA-Z]{2,3})', re.IGNORECASE)
+HTML_HEAD_BYTES = 4096
+# Неизвестное значение числового поля
+UNKNOWN = -1
+
+
+def parse_date(value: str) -> int:
+    """
+    Дата YYYY-MM-DD в число YYYYMMDD (порядок чисел совпадает с порядком дат)
+
+    :raises ValueError: если строка не является датой
+    """
+    date = datetime.date.fromisoformat(value)
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def url_host(url: str) -> str:
+    """Хост URL в нижнем регистре без порта"""
+    return (urlsplit(url).hostname or '').lower()
+
+
+def host_domains(host: str) -> List[str]:
+    """
+    Хост и все его родительские домены
+
+    :param host: хост, например ru.wikipedia.org
+    :return: ['ru.wikipedia.org', 'wikipedia.org', 'org']
+    """
+    parts = host.split('.')
+    return ['.'.join(parts[i:]) for i in range(len(parts)) if parts[i]]
+
+
+def html_lang(head: bytes) -> Optional[str]:
+    """Основной код языка из атрибута lang тега <html> (None, если его нет)"""
+    match = HTML_LANG_PATTERN.search(head)
+    return match.group(1).decode('ascii').lower() if match else None
+
+
+def page_metadata(path: str) -> Dict[str, object]:
+    """
+    Метаданные страницы по ее файлу: дата изменения, размер и язык
+
+    :param path: путь к HTML-файлу
+    :return: словарь с ключами date, length, lang (пустой, если файл не прочитан)
+    """
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            head = f.read(HTML_HEAD_BYTES)
+    except OSError:
+        return {}
+    date = datetime.date.fromtimestamp(stat.st_mtime)
+    return {
+        'date': date.year * 10000 + date.month * 100 + date.day,
+        'length': stat.st_size,
+        'lang': html_lang(head),
+    }
+
+
+def read_crawl_index(path: str) -> Dict[int, Dict[str, object]]:
+    """
+    Чтение индексного файла краулера
+
+    :param path: путь к data/index.txt
+    :return: {ID документа: {'url': ..., 'date': ..., 'length': ..., 'lang': ...}};
+             поля, которых нет в строке, отсутствуют в словаре
+    """
+    documents = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 2 or not parts[0].isdigit():
+                    continue
+                metadata = {'url': parts[1]}
+                if len(parts) >= 5:
+                    try:
+                        metadata['date'] = parse_date(parts[2])
+                        metadata['length'] = int(parts[3])
+                    except ValueError:
+                        pass
+                    if parts[4] != '-':
+                        metadata['lang'] = parts[4].lower()
+                documents[int(parts[0])] = metadata
+    except Exception as e:
+        print(f"Ошибка при чтении индекса краулера {path}: {e}")
+    return documents
+
+
+class FilterClause:
+    """
+    Условие фильтра: значение категориального поля или диапазон числового
+    """
+    def __init__(self, field: str, negate: bool = False, value: Optional[str] = None,
+                 low: Optional[int] = None, high: Optional[int] = None):
+        """
+        :param field: поле (site, lang, date, length)
+        :param negate: исключить документы, удовлетворяющие условию
+        :param value: значение категориального поля
+        :param low: нижняя граница числового поля включительно (None - без границы)
+        :param high: верхняя граница числового поля включительно (None - без границы)
+        """
+        self.field = field
+        self.negate = negate
+        self.value = value
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def parse(cls, text: str) -> 'FilterClause':
+        """
+        Разбор условия вида [-]поле:значение
+
+        :raises ValueError: если условие некорректно
+        """
+        match = CLAUSE_PATTERN.fullmatch(text.strip())
+        if match is None:
+            raise ValueError(f"Некорректное условие фильтра: {text}")
+        negate, field, value = match.group(1) == '-', match.group(2), match.group(3)
+        if field in CATEGORICAL_FIELDS:
+            return cls(field, negate, value=value.lower())
+
+        bounds = RANGE_PATTERN.fullmatch(value)
+        if bounds is None:
+            raise ValueError(f"Некорректное условие фильтра: {text}")
+        convert = parse_date if field == 'date' else int
+        try:
+            operator, first = bounds.group(1), convert(bounds.group(2))
+            second = convert(bounds.group(3)) if bounds.group(3) is not None else None
+        except ValueError:
+            raise ValueError(f"Некорректное значение в условии фильтра: {text}")
+        if second is not None:
+            if operator is not None:
+                raise ValueError(f"Некорректное условие фильтра: {text}")
+            return cls(field, negate, low=first, high=second)
+        low, high = {
+            None: (first, first),
+            '>=': (first, None),
+            '>': (first + 1, None),
+            '<=': (None, first),
+            '<': (None, first - 1),
+        }[operator]
+        return cls(field, negate, low=low, high=high)
+
+    def __repr__(self) -> str:
+        return f"FilterClause({self.field!r}, negate={self.negate}, value={self.value!r}, " \
+               f"low={self.low}, high={self.high})"
+
+
+def parse_filters(query: str) -> Tuple[str, List[FilterClause]]:
+    """
+    Выделение условий фильтра из текста запроса
+
+    :param query: текст запроса
+    :return: (запрос без условий, условия)
+    :raises ValueError: если условие некорректно
+    """
+    clauses = [FilterClause.parse(match.group(0)) for match in CLAUSE_PATTERN.finditer(query)]
+    return CLAUSE_PATTERN.sub(' ', query).strip(), clauses
+
+
+class DocumentFilter:
+    """
+    Скомпилированный фильтр: маска допустимых документов
+    """
+    def __init__(self, mask: np.ndarray, matches_unknown: bool = False):
+        """
+        :param mask: булева маска по позициям документов
+        :param matches_unknown: проходят ли фильтр документы без метаданных
+                                (добавленные после построения индекса) - только
+                                если все условия фильтра исключающие
+        """
+        self.mask = mask
+        self.docs = np.flatnonzero(mask)
+        self.matches_unknown = matches_unknown
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def packed(self) -> np.ndarray:
+        """Маска, упакованная по биту на документ (для передачи процессам шардов)"""
+        return np.packbits(self.mask)
+
+    @classmethod
+    def unpack(cls, packed: np.ndarray, doc_indices: np.ndarray,
+               matches_unknown: bool = False) -> 'DocumentFilter':
+        """
+        Фильтр по части документов из упакованной маски
+
+        :param packed: результат packed()
+        :param doc_indices: позиции документов части в исходной маске
+        """
+        return cls(np.unpackbits(packed).astype(bool)[doc_indices], matches_unknown)
+
+    def restrict(self, docs: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Вхождения допустимых документов в списке вхождений термина
+
+        Если допустимых документов намного меньше, чем вхождений, каждый из
+        них ищется в отсортированном списке двоичным поиском (O(m log n)),
+        и список не просматривается целиком; иначе список фильтруется маской.
+
+        :param docs: позиции документов списка вхождений (по возрастанию)
+        :param values: веса вхождений
+        :return: (позиции, веса, количество просмотренных элементов)
+        """
+        if not len(docs):
+            return docs, values, 0
+        if len(self.docs) * int(len(docs)).bit_length() < len(docs):
+            # Типы приводятся к типу списка, иначе searchsorted копирует весь список
+            allowed = self.docs.astype(docs.dtype, copy=False)
+            positions = np.minimum(np.searchsorted(docs, allowed), len(docs) - 1)
+            positions = positions[docs[positions] == allowed]
+            return docs[positions], values[positions], len(self.docs)
+        keep = self.mask[docs]
+        return docs[keep], values[keep], len(docs)
+
+
+class FilterIndex:
+    """
+    Битовые карты значений категориальных полей и столбцы числовых полей
+    """
+    def __init__(self, keys: TermDictionary, bitmaps: np.ndarray,
+                 dates: np.ndarray, lengths: np.ndarray):
+        """
+        :param keys: значения категориальных полей вида `site:habr.com`, `lang:ru`
+        :param bitmaps: упакованные битовые карты значений (значения × байты, uint8)
+        :param dates: дата загрузки документов YYYYMMDD (UNKNOWN - неизвестна)
+        :param lengths: размер документов в байтах (UNKNOWN - неизвестен)
+        """
+        self.keys = keys
+        self.bitmaps = bitmaps
+        self.dates = dates
+        self.lengths = lengths
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def nbytes(self) -> int:
+        """Суммарный размер массивов индекса в байтах"""
+        return self.keys.nbytes + self.bitmaps.nbytes + self.dates.nbytes + self.lengths.nbytes
+
+    @classmethod
+    def build(cls, doc_ids: Sequence[int], crawl_index_path: Optional[str],
+              page_paths: Mapping) -> 'FilterIndex':
+        """
+        Построение индекса фильтров
+
+        :param doc_ids: отсортированные ID документов (позиции карт - позиции в doc_ids)
+        :param crawl_index_path: индексный файл краулера (None - только файлы страниц)
+        :param page_paths: {ID документа: путь к HTML-файлу} для полей, которых нет в индексе
+        :return: индекс фильтров
+        """
+        crawled = read_crawl_index(crawl_index_path) if crawl_index_path else {}
+        dates = np.full(len(doc_ids), UNKNOWN, dtype=np.int32)
+        lengths = np.full(len(doc_ids), UNKNOWN, dtype=np.int64)
+        postings = defaultdict(list)
+
+        for position, doc_id in enumerate(doc_ids):
+            metadata = crawled.get(int(doc_id), {})
+            if 'date' not in metadata and int(doc_id) in page_paths:
+                metadata = {**page_metadata(page_paths[int(doc_id)]), **metadata}
+            if metadata.get('url'):
+                for domain in host_domains(url_host(metadata['url'])):
+                    postings[f"site:{domain}"].append(position)
+            if metadata.get('lang'):
+                postings[f"lang:{metadata['lang']}"].append(position)
+            dates[position] = metadata.get('date', UNKNOWN)
+            lengths[position] = metadata.get('length', UNKNOWN)
+
+        keys = TermDictionary.from_terms(postings)
+        bitmaps = np.zeros((len(keys), (len(doc_ids) + 7) // 8), dtype=np.uint8)
+        for key, positions in postings.items():
+            mask = np.zeros(len(doc_ids), dtype=bool)
+            mask[positions] = True
+            bitmaps[keys[key]] = np.packbits(mask)
+        return cls(keys, bitmaps, dates, lengths)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Массивы индекса для сохранения"""
+        arrays = self.keys.to_arrays('keys.')
+        arrays['bitmaps'] = self.bitmaps
+        arrays['dates'] = self.dates
+        arrays['lengths'] = self.lengths
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping) -> 'FilterIndex':
+        """Индекс из массивов, сохраненных методом to_arrays"""
+        keys = TermDictionary.from_arrays(arrays, 'keys.')
+        dates = arrays['dates']
+        bitmaps = arrays['bitmaps'].reshape(len(keys), (len(dates) + 7) // 8)
+        return cls(keys, bitmaps, dates, arrays['lengths'])
+
+    def clause_mask(self, clause: FilterClause) -> np.ndarray:
+        """
+        Документы, удовлетворяющие условию (без учета его отрицания)
+
+        :param clause: условие фильтра
+        :return: булева маска по позициям документов
+        """
+        if clause.field in CATEGORICAL_FIELDS:
+            key = self.keys.get(f"{clause.field}:{clause.value}")
+            if key is None:
+                return np.zeros(len(self), dtype=bool)
+            return np.unpackbits(self.bitmaps[key], count=len(self)).astype(bool)
+
+        column = self.dates if clause.field == 'date' else self.lengths
+        mask = column != UNKNOWN
+        if clause.low is not None:
+            mask &= column >= clause.low
+        if clause.high is not None:
+            mask &= column <= clause.high
+        return mask
+
+    def compile(self, clauses: Sequence[FilterClause]) -> Optional[DocumentFilter]:
+        """
+        Маска документов, удовлетворяющих всем условиям
+
+        :param clauses: условия фильтра
+        :return: фильтр или None, если условий нет
+        """
+        if not clauses:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        for clause in clauses:
+            if clause.negate:
+                mask &= ~self.clause_mask(clause)
+            else:
+                mask &= self.clause_mask(clause)
+        return DocumentFilter(mask, matches_unknown=all(clause.negate for clause in clauses))
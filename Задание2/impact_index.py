@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Индекс с предвычисленными квантованными вкладами терминов (impact scores)
+
+Вклад термина в оценку документа (BM25 или BM25F) вычисляется при построении
+индекса (Задание 4) и квантуется в 8 бит с общим масштабом. Во время поиска
+(Задание 5) оценка документа - целочисленная сумма вкладов терминов запроса,
+умноженная на масштаб.
+"""
+
+import math
+import os
+from collections.abc import Mapping
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from term_dictionary import TermDictionary
+
+# Параметры BM25 по умолчанию
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Веса и параметры нормализации длины полей BM25F
+BM25F_FIELD_WEIGHTS = {'body': 1.0, 'title': 3.0}
+BM25F_FIELD_B = {'body': 0.75, 'title': 0.5}
+
+IMPACT_BITS = 8
+
+
+def bm25_idf(df: int, total_docs: int) -> float:
+    """IDF в форме BM25 (всегда неотрицательный)"""
+    return math.log((total_docs - df + 0.5) / (df + 0.5) + 1)
+
+
+def bm25_impact(tf: int, doc_length: int, avg_length: float, df: int, total_docs: int,
+                k1: float = BM25_K1, b: float = BM25_B) -> float:
+    """
+    Вклад термина в оценку BM25 документа
+
+    :param tf: частота термина в документе
+    :param doc_length: длина документа в токенах
+    :param avg_length: средняя длина документа
+    :param df: количество документов с термином
+    :param total_docs: общее количество документов
+    :return: вклад термина
+    """
+    norm = 1 - b + b * doc_length / avg_length if avg_length > 0 else 1.0
+    return bm25_idf(df, total_docs) * tf * (k1 + 1) / (tf + k1 * norm)
+
+
+def bm25f_impact(field_tfs: Dict[str, int], field_lengths: Dict[str, int],
+                 avg_field_lengths: Dict[str, float], df: int, total_docs: int,
+                 k1: float = BM25_K1) -> float:
+    """
+    Вклад термина в оценку BM25F документа
+
+    Частоты термина в полях нормализуются по длине поля, взвешиваются
+    и суммируются, после чего применяется насыщение BM25.
+
+    :param field_tfs: частоты термина по полям
+    :param field_lengths: длины полей документа
+    :param avg_field_lengths: средние длины полей
+    :param df: количество документов с термином
+    :param total_docs: общее количество документов
+    :return: вклад термина
+    """
+    pseudo_tf = 0.0
+    for field, tf in field_tfs.items():
+        if not tf:
+            continue
+        b = BM25F_FIELD_B[field]
+        avg_length = avg_field_lengths[field]
+        norm = 1 - b + b * field_lengths[field] / avg_length if avg_length > 0 else 1.0
+        pseudo_tf += BM25F_FIELD_WEIGHTS[field] * tf / norm
+    return bm25_idf(df, total_docs) * pseudo_tf * (k1 + 1) / (pseudo_tf + k1)
+
+
+class ImpactIndex:
+    """
+    Списки вхождений терминов с квантованными вкладами
+    """
+    def __init__(self, terms: TermDictionary, offsets: np.ndarray, docs: np.ndarray,
+                 impacts: np.ndarray, scale: float):
+        """
+        :param terms: словарь терминов
+        :param offsets: смещения списков вхождений терминов (int64)
+        :param docs: документы списков вхождений, по возрастанию внутри термина (int32)
+        :param impacts: квантованные вклады (uint8)
+        :param scale: множитель перевода суммы вкладов в оценку
+        """
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.impacts = impacts
+        self.scale = float(scale)
+
+    @classmethod
+    def quantize(cls, postings: Dict[str, List[Tuple[int, float]]],
+                 bits: int = IMPACT_BITS) -> 'ImpactIndex':
+        """
+        Построение индекса из вещественных вкладов
+
+        Все вклады делятся на общий масштаб max / (2^bits - 1) и округляются;
+        положительный вклад не округляется до нуля.
+
+        :param postings: {термин: [(документ, вклад), ...]}
+        :param bits: разрядность вклада
+        :return: индекс
+        """
+        terms = TermDictionary.from_terms(postings)
+        max_impact = max((impact for term_postings in postings.values()
+                          for _, impact in term_postings), default=0.0)
+        levels = (1 << bits) - 1
+        scale = max_impact / levels if max_impact > 0 else 1.0
+
+        offsets = [0]
+        docs = []
+        impacts = []
+        for term in terms:
+            for doc, impact in sorted(postings[term]):
+                docs.append(doc)
+                impacts.append(min(levels, max(1, round(impact / scale))))
+            offsets.append(len(docs))
+
+        return cls(terms, np.array(offsets, dtype=np.int64), np.array(docs, dtype=np.int32),
+                   np.array(impacts, dtype=np.uint8), scale)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Список вхождений термина
+
+        :param term: термин
+        :return: (документы, квантованные вклады)
+        """
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return self.docs[:0], self.impacts[:0]
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.docs[start:end], self.impacts[start:end]
+
+    def remap_docs(self, doc_ids: np.ndarray) -> 'ImpactIndex':
+        """
+        Индекс с документами, замененными на позиции в отсортированном массиве doc_ids
+
+        :param doc_ids: отсортированные идентификаторы документов
+        :return: новый индекс
+        """
+        return ImpactIndex(self.terms, self.offsets,
+                           np.searchsorted(doc_ids, self.docs).astype(np.int32),
+                           self.impacts, self.scale)
+
+    @property
+    def nbytes(self) -> int:
+        """Объем памяти массивов индекса"""
+        return self.terms.nbytes + self.offsets.nbytes + self.docs.nbytes + self.impacts.nbytes
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Массивы индекса для сохранения"""
+        arrays = self.terms.to_arrays('terms.')
+        arrays.update({
+            'offsets': self.offsets,
+            'docs': self.docs,
+            'impacts': self.impacts,
+            'scale': np.array([self.scale], dtype=np.float64),
+        })
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping) -> 'ImpactIndex':
+        """Индекс из массивов, сохраненных методом to_arrays"""
+        return cls(TermDictionary.from_arrays(arrays, 'terms.'), arrays['offsets'], arrays['docs'],
+                   arrays['impacts'], float(arrays['scale'][0]))
+
+    def save(self, directory: str):
+        """Сохранение индекса в директорию (по одному .npy файлу на массив)"""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.to_arrays().items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'ImpactIndex':
+        """Загрузка индекса, сохраненного методом save"""
+        mmap_mode = 'r' if mmap else None
+        arrays = {}
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.npy'):
+                arrays[file_name[:-4]] = np.load(os.path.join(directory, file_name), mmap_mode=mmap_mode)
+        return cls.from_arrays(arrays)
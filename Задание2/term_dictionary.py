@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Компактный неизменяемый словарь терминов
+
+Термины хранятся отсортированными в одном UTF-8 блобе с массивом смещений,
+поиск термина выполняется за O(1) через хеш-таблицу с открытой адресацией
+(crc32 от UTF-8 байтов, линейное пробирование). Отсортированный порядок
+позволяет искать диапазоны терминов по префиксу за O(log n).
+
+Все данные - массивы NumPy, поэтому словарь можно сохранить в .npy файлы
+и загрузить через mmap, разделяя его между процессами и этапами обработки
+(расчет TF-IDF в Задании 4 и поисковая система в Задании 5).
+"""
+
+import os
+import zlib
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+EMPTY_SLOT = -1
+MAX_LOAD_FACTOR = 0.7
+
+# Роли термина в Lexicon (битовые флаги)
+TOKEN = 1
+FORM = 2
+LEMMA = 4
+
+
+class TermDictionary:
+    """
+    Отсортированный словарь терминов: термин <-> идентификатор
+    """
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, table: np.ndarray):
+        """
+        Создание словаря из готовых массивов
+
+        :param blob: UTF-8 байты терминов, разделенные символом перевода строки (uint8)
+        :param offsets: смещения начала терминов в блобе, n + 1 элемент (uint32)
+        :param table: хеш-таблица идентификаторов, размер - степень двойки (int32)
+        """
+        self.blob = blob
+        self.offsets = offsets
+        self.table = table
+        self._view = memoryview(blob)
+        self._mask = len(table) - 1
+
+    @classmethod
+    def from_terms(cls, terms: Iterable[str]) -> 'TermDictionary':
+        """
+        Построение словаря из произвольного набора терминов
+
+        :param terms: термины (дубликаты удаляются)
+        :return: словарь терминов
+        """
+        encoded = sorted({term.encode('utf-8') for term in terms})
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        if encoded:
+            offsets[1:] = np.cumsum([len(b) + 1 for b in encoded])
+        blob = np.frombuffer(b''.join(b + b'\n' for b in encoded), dtype=np.uint8)
+
+        # Хеш-таблица с коэффициентом заполнения не более MAX_LOAD_FACTOR
+        size = 1
+        while size * MAX_LOAD_FACTOR < len(encoded):
+            size <<= 1
+        table = np.full(size, EMPTY_SLOT, dtype=np.int32)
+        mask = size - 1
+        for term_id, key in enumerate(encoded):
+            slot = zlib.crc32(key) & mask
+            while table[slot] != EMPTY_SLOT:
+                slot = (slot + 1) & mask
+            table[slot] = term_id
+
+        return cls(blob, offsets, table)
+
+    def to_arrays(self, prefix: str = '') -> Dict[str, np.ndarray]:
+        """Массивы словаря для сохранения"""
+        return {f"{prefix}blob": self.blob, f"{prefix}offsets": self.offsets, f"{prefix}table": self.table}
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping, prefix: str = '') -> 'TermDictionary':
+        """Словарь из массивов, сохраненных методом to_arrays"""
+        return cls(arrays[f"{prefix}blob"], arrays[f"{prefix}offsets"], arrays[f"{prefix}table"])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _key(self, term_id: int) -> memoryview:
+        """UTF-8 байты термина без копирования"""
+        return self._view[self.offsets[term_id]:self.offsets[term_id + 1] - 1]
+
+    def term(self, term_id: int) -> str:
+        """
+        Термин по идентификатору
+
+        :param term_id: идентификатор (позиция в отсортированном порядке)
+        :return: термин
+        """
+        return bytes(self._key(term_id)).decode('utf-8')
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        """
+        Идентификатор термина
+
+        :param term: термин
+        :param default: значение, если термина нет в словаре
+        :return: идентификатор термина
+        """
+        if not len(self):
+            return default
+        key = term.encode('utf-8')
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            term_id = int(self.table[slot])
+            if term_id == EMPTY_SLOT:
+                return default
+            if self._key(term_id) == key:
+                return term_id
+            slot = (slot + 1) & self._mask
+
+    def __getitem__(self, term: str) -> int:
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+
+    def __contains__(self, term) -> bool:
+        return isinstance(term, str) and self.get(term) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """Термины в отсортированном порядке"""
+        if not len(self):
+            return iter(())
+        return iter(bytes(self.blob).decode('utf-8').split('\n')[:-1])
+
+    def terms(self) -> List[str]:
+        """Все термины в отсортированном порядке"""
+        return list(self)
+
+    def _lower_bound(self, key: bytes, prefix_only: bool = False) -> int:
+        """
+        Первая позиция, термин в которой не меньше key
+
+        :param key: искомые байты
+        :param prefix_only: сравнивать только первые len(key) байт термина
+                            (дает верхнюю границу диапазона с префиксом key)
+        """
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = bytes(self._key(mid))
+            if prefix_only:
+                below = current[:len(key)] <= key
+            else:
+                below = current < key
+            if below:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """
+        Диапазон идентификаторов терминов, начинающихся с префикса
+
+        :param prefix: префикс
+        :return: (начало, конец) - полуинтервал идентификаторов
+        """
+        key = prefix.encode('utf-8')
+        return self._lower_bound(key), self._lower_bound(key, prefix_only=True)
+
+    @property
+    def nbytes(self) -> int:
+        """Объем памяти массивов словаря"""
+        return self.blob.nbytes + self.offsets.nbytes + self.table.nbytes
+
+
+class Lexicon:
+    """
+    Словарь токенов и лемм, общий для расчета TF-IDF и поиска
+
+    Токены, словоформы и леммы в основном совпадают, поэтому все строки хранятся
+    в одном TermDictionary, а роль каждого термина задается битовыми флагами.
+    Связи форма -> лемма и лемма -> формы хранятся массивами идентификаторов.
+    """
+    ARRAY_NAMES = ('flags', 'form_lemma', 'lemma_forms_offsets', 'lemma_form_ids')
+
+    def __init__(self, terms: TermDictionary, flags: np.ndarray, form_lemma: np.ndarray,
+                 lemma_forms_offsets: np.ndarray, lemma_form_ids: np.ndarray):
+        """
+        :param terms: словарь всех строк (токены, словоформы и леммы)
+        :param flags: роли терминов - комбинация TOKEN, FORM, LEMMA (uint8)
+        :param form_lemma: идентификатор леммы для каждой формы, -1 для остальных (int32)
+        :param lemma_forms_offsets: смещения списков форм каждого термина (uint32)
+        :param lemma_form_ids: идентификаторы форм лемм (int32)
+        """
+        self.terms = terms
+        self.flags = flags
+        self.form_lemma = form_lemma
+        self.lemma_forms_offsets = lemma_forms_offsets
+        self.lemma_form_ids = lemma_form_ids
+
+        # Представления с интерфейсом коллекций Python
+        self.tokens = TermSubset(self, TOKEN)
+        self.lemmas_dict = LemmaOfForm(self)
+        self.lemma_to_forms = FormsOfLemma(self)
+
+    @classmethod
+    def from_files(cls, tokens_path: str, lemmas_path: str) -> 'Lexicon':
+        """
+        Построение словаря из tokens.txt и lemmas.txt Задания 2
+
+        :param tokens_path: путь к файлу с токенами
+        :param lemmas_path: путь к файлу с леммами (формат `лемма: форма1 форма2 ...`)
+        :return: словарь
+        """
+        tokens = []
+        try:
+            with open(tokens_path, 'r', encoding='utf-8') as f:
+                tokens = [line.strip() for line in f if line.strip()]
+        except Exception as e:
+            print(f"Ошибка при загрузке токенов: {e}")
+
+        lemmas_dict = {}  # словарь вида {word_form: lemma}
+        lemma_to_forms = {}  # словарь вида {lemma: [word_forms]}
+        try:
+            with open(lemmas_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+
+                    parts = line.split(':')
+                    if len(parts) != 2:
+                        continue
+
+                    lemma = parts[0].strip()
+                    forms = parts[1].strip().split()
+
+                    lemma_to_forms[lemma] = forms
+
+                    # Добавляем саму лемму как форму
+                    lemmas_dict[lemma] = lemma
+
+                    # Каждой форме соответствует лемма
+                    for form in forms:
+                        lemmas_dict[form] = lemma
+        except Exception as e:
+            print(f"Ошибка при загрузке лемм: {e}")
+
+        return cls.build(tokens, lemmas_dict, lemma_to_forms)
+
+    @classmethod
+    def build(cls, tokens: Iterable[str], lemmas_dict: Dict[str, str],
+              lemma_to_forms: Dict[str, List[str]]) -> 'Lexicon':
+        """
+        Построение словаря из структур Python
+
+        :param tokens: токены
+        :param lemmas_dict: словарь {форма: лемма}
+        :param lemma_to_forms: словарь {лемма: [формы]}
+        :return: словарь
+        """
+        tokens = set(tokens)
+        terms = TermDictionary.from_terms(tokens | set(lemmas_dict) | set(lemma_to_forms))
+
+        flags = np.zeros(len(terms), dtype=np.uint8)
+        form_lemma = np.full(len(terms), -1, dtype=np.int32)
+        for token in tokens:
+            flags[terms[token]] |= TOKEN
+        for form, lemma in lemmas_dict.items():
+            form_id = terms[form]
+            flags[form_id] |= FORM
+            form_lemma[form_id] = terms[lemma]
+
+        offsets = [0]
+        form_ids = []
+        for term_id, term in enumerate(terms):
+            forms = lemma_to_forms.get(term)
+            if forms is not None:
+                flags[term_id] |= LEMMA
+                form_ids.extend(terms[form] for form in forms)
+            offsets.append(len(form_ids))
+
+        return cls(terms, flags, form_lemma,
+                   np.array(offsets, dtype=np.uint32), np.array(form_ids, dtype=np.int32))
+
+    def lemma_id(self, form: str) -> Optional[int]:
+        """
+        Идентификатор леммы словоформы
+
+        :param form: словоформа
+        :return: идентификатор леммы или None
+        """
+        form_id = self.terms.get(form)
+        if form_id is None or not self.flags[form_id] & FORM:
+            return None
+        return int(self.form_lemma[form_id])
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Все массивы словаря для сохранения"""
+        arrays = self.terms.to_arrays('terms.')
+        for name in self.ARRAY_NAMES:
+            arrays[name] = getattr(self, name)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping) -> 'Lexicon':
+        """Словарь из массивов, сохраненных методом to_arrays"""
+        return cls(TermDictionary.from_arrays(arrays, 'terms.'),
+                   *(arrays[name] for name in cls.ARRAY_NAMES))
+
+    def save(self, directory: str):
+        """
+        Сохранение словаря в директорию (по одному .npy файлу на массив)
+
+        :param directory: директория
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.to_arrays().items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'Lexicon':
+        """
+        Загрузка словаря, сохраненного методом save
+
+        :param directory: директория
+        :param mmap: отображать файлы в память вместо чтения
+        :return: словарь
+        """
+        mmap_mode = 'r' if mmap else None
+        arrays = {}
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.npy'):
+                arrays[file_name[:-4]] = np.load(os.path.join(directory, file_name), mmap_mode=mmap_mode)
+        return cls.from_arrays(arrays)
+
+    @property
+    def nbytes(self) -> int:
+        """Объем памяти всех массивов словаря"""
+        return self.terms.nbytes + sum(getattr(self, name).nbytes for name in self.ARRAY_NAMES)
+
+
+class TermSubset:
+    """
+    Множество терминов Lexicon с заданной ролью (например, все токены)
+    """
+    def __init__(self, lexicon: Lexicon, role: int):
+        self._lexicon = lexicon
+        self._role = role
+        self._count = None
+
+    def __contains__(self, term) -> bool:
+        if not isinstance(term, str):
+            return False
+        term_id = self._lexicon.terms.get(term)
+        return term_id is not None and bool(self._lexicon.flags[term_id] & self._role)
+
+    def __iter__(self) -> Iterator[str]:
+        mask = (np.asarray(self._lexicon.flags) & self._role) != 0
+        return (term for term, selected in zip(self._lexicon.terms, mask) if selected)
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = int(np.count_nonzero(np.asarray(self._lexicon.flags) & self._role))
+        return self._count
+
+
+class LemmaOfForm(Mapping):
+    """
+    Представление словаря {форма: лемма} поверх Lexicon
+    """
+    def __init__(self, lexicon: Lexicon):
+        self._lexicon = lexicon
+        self._forms = TermSubset(lexicon, FORM)
+
+    def __getitem__(self, form: str) -> str:
+        lemma_id = self._lexicon.lemma_id(form)
+        if lemma_id is None:
+            raise KeyError(form)
+        return self._lexicon.terms.term(lemma_id)
+
+    def __contains__(self, form) -> bool:
+        return form in self._forms
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._forms)
+
+    def __len__(self) -> int:
+        return len(self._forms)
+
+
+class FormsOfLemma(Mapping):
+    """
+    Представление словаря {лемма: [формы]} поверх Lexicon
+    """
+    def __init__(self, lexicon: Lexicon):
+        self._lexicon = lexicon
+        self._lemmas = TermSubset(lexicon, LEMMA)
+
+    def __getitem__(self, lemma: str) -> List[str]:
+        lexicon = self._lexicon
+        lemma_id = lexicon.terms.get(lemma)
+        if lemma_id is None or not lexicon.flags[lemma_id] & LEMMA:
+            raise KeyError(lemma)
+        start, end = lexicon.lemma_forms_offsets[lemma_id], lexicon.lemma_forms_offsets[lemma_id + 1]
+        return [lexicon.terms.term(int(form_id)) for form_id in lexicon.lemma_form_ids[start:end]]
+
+    def __contains__(self, lemma) -> bool:
+        return lemma in self._lemmas
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._lemmas)
+
+    def __len__(self) -> int:
+        return len(self._lemmas)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Расширение терминов запроса по словарю терминов (TermDictionary)
+
+- по префиксу и шаблону (`поиск*`, `*ание`, `по?ск*`) - через диапазоны
+  отсортированного словаря (для шаблонов с ведущей звездочкой используется
+  словарь перевернутых терминов, его можно сохранить вместе с индексом удалений);
+- нечеткое (расстояние Левенштейна 1-2) - через индекс удалений в стиле SymSpell:
+  для каждого термина заранее сохраняются хеши всех вариантов с удалением до
+  max_distance символов, а при запросе кандидаты ищутся бинарным поиском по
+  хешам вариантов запроса и проверяются точным расстоянием.
+
+Количество расширений ограничивается max_expansions; при наличии весов
+(например, документных частот) остаются термины с наибольшим весом.
+"""
+
+import fnmatch
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from term_dictionary import TermDictionary
+from text_tokenizer import WILDCARDS, is_pattern
+DEFAULT_MAX_EXPANSIONS = 50
+DEFAULT_MAX_DISTANCE = 2
+# Опечатки в словах не длиннее SHORT_WORD_LENGTH исправляются только на расстоянии 1,
+# слова короче MIN_FUZZY_LENGTH не исправляются: иначе у них десятки случайных соседей
+SHORT_WORD_LENGTH = 5
+MIN_FUZZY_LENGTH = 3
+# Шаблоны с коротким литеральным префиксом проверяются регулярным выражением
+# не более чем на MAX_PATTERN_SCAN кандидатах (или на limit, если он больше)
+MAX_PATTERN_SCAN = 50000
+
+
+def deletes(word: str, max_distance: int) -> Set[str]:
+    """
+    Все варианты слова с удалением от 1 до max_distance символов
+
+    :param word: слово
+    :param max_distance: максимальное количество удалений
+    :return: множество вариантов
+    """
+    result = set()
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for variant in frontier:
+            for i in range(len(variant)):
+                next_frontier.add(variant[:i] + variant[i + 1:])
+        next_frontier -= result
+        result |= next_frontier
+        frontier = next_frontier
+    return result
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    Расстояние Левенштейна с ранним выходом
+
+    :param a: первая строка
+    :param b: вторая строка
+    :param max_distance: порог
+    :return: расстояние или max_distance + 1, если оно больше порога
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            current.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+def _hash(term: str) -> int:
+    """Хеш варианта термина для индекса удалений"""
+    return zlib.crc32(term.encode('utf-8'))
+
+
+class TermExpander:
+    """
+    Расширение шаблонов и опечаток в термины словаря
+    """
+    def __init__(self, dictionary: TermDictionary,
+                 weights: Optional[np.ndarray] = None,
+                 max_expansions: int = DEFAULT_MAX_EXPANSIONS,
+                 max_distance: int = DEFAULT_MAX_DISTANCE,
+                 deletion_index: Optional[Dict[str, np.ndarray]] = None,
+                 reverse_index: Optional[Dict[str, np.ndarray]] = None):
+        """
+        :param dictionary: словарь терминов
+        :param weights: вес каждого термина (термины с нулевым весом не предлагаются)
+        :param max_expansions: максимальное количество расширений одного термина
+        :param max_distance: максимальное расстояние нечеткого поиска
+        :param deletion_index: готовый индекс удалений (см. deletion_index_arrays)
+        :param reverse_index: готовый словарь перевернутых терминов (см. reverse_index)
+        """
+        self.dictionary = dictionary
+        self.weights = weights
+        self.max_expansions = max_expansions
+        self.max_distance = max_distance
+        self._deletion_index = deletion_index
+        self._reverse = None
+        if reverse_index is not None:
+            self._reverse = (TermDictionary.from_arrays(reverse_index), reverse_index['term_ids'])
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_pattern(term: str) -> bool:
+        """Содержит ли термин символы шаблона"""
+        return is_pattern(term)
+
+    def typo_distance(self, term: str) -> int:
+        """Допустимое расстояние исправления опечатки в зависимости от длины слова"""
+        if len(term) < MIN_FUZZY_LENGTH:
+            return 0
+        if len(term) <= SHORT_WORD_LENGTH:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def expand(self, term: str) -> List[str]:
+        """
+        Расширение термина: шаблон, точное совпадение или исправление опечатки
+
+        Для опечатки остаются только ближайшие термины: кандидаты на расстоянии 2
+        не добавляются, если есть термины на расстоянии 1.
+
+        :param term: термин запроса
+        :return: термины словаря
+        """
+        if self.is_pattern(term):
+            return self.expand_wildcard(term)
+        if term in self.dictionary:
+            return [term]
+        max_distance = self.typo_distance(term)
+        if max_distance == 0:
+            return []
+        matches = self.expand_fuzzy(term, max_distance)
+        if not matches:
+            return []
+        nearest = matches[0][1]
+        return [candidate for candidate, distance in matches if distance == nearest]
+
+    def _select(self, term_ids: np.ndarray, limit: Optional[int]) -> np.ndarray:
+        """Отбор не более limit терминов с наибольшим весом"""
+        limit = self.max_expansions if limit is None else limit
+        if self.weights is None or limit <= 0:
+            return term_ids[:max(limit, 0)]
+        weights = self.weights[term_ids]
+        term_ids = term_ids[weights > 0]
+        weights = weights[weights > 0]
+        if len(term_ids) > limit:
+            top = np.argpartition(-weights, limit - 1)[:limit]
+            term_ids, weights = term_ids[top], weights[top]
+        return term_ids[np.argsort(-weights, kind='stable')]
+
+    def _range_terms(self, lo: int, hi: int, dictionary: TermDictionary) -> List[str]:
+        """Термины диапазона одним декодированием"""
+        if lo >= hi:
+            return []
+        start, end = int(dictionary.offsets[lo]), int(dictionary.offsets[hi])
+        return bytes(dictionary.blob[start:end]).decode('utf-8').split('\n')[:-1]
+
+    def expand_prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """
+        Термины, начинающиеся с префикса
+
+        :param prefix: префикс
+        :param limit: ограничение количества (по умолчанию max_expansions)
+        :return: термины словаря
+        """
+        lo, hi = self.dictionary.prefix_range(prefix)
+        selected = self._select(np.arange(lo, hi), limit)
+        return [self.dictionary.term(int(term_id)) for term_id in selected]
+
+    def _reverse_dictionary(self) -> Tuple[TermDictionary, np.ndarray]:
+        """Словарь перевернутых терминов и соответствие его идентификаторов прямым"""
+        if self._reverse is None:
+            with self._lock:
+                if self._reverse is None:
+                    terms = self.dictionary.terms()
+                    order = sorted(range(len(terms)), key=lambda i: terms[i][::-1].encode('utf-8'))
+                    reverse = TermDictionary.from_terms(term[::-1] for term in terms)
+                    self._reverse = (reverse, np.array(order, dtype=np.int32))
+        return self._reverse
+
+    @property
+    def reverse_index(self) -> Dict[str, np.ndarray]:
+        """
+        Словарь перевернутых терминов для шаблонов с ведущей `*` (строится при первом обращении)
+
+        :return: массивы TermDictionary.to_arrays и term_ids (прямой идентификатор каждого термина)
+        """
+        reverse, reverse_to_forward = self._reverse_dictionary()
+        arrays = reverse.to_arrays()
+        arrays['term_ids'] = reverse_to_forward
+        return arrays
+
+    def expand_wildcard(self, pattern: str, limit: Optional[int] = None) -> List[str]:
+        """
+        Термины, соответствующие шаблону (`*` - любая строка, `?` - один символ)
+
+        Кандидаты берутся из диапазона литерального префикса шаблона, а если
+        шаблон начинается с `*` - из диапазона литерального суффикса в словаре
+        перевернутых терминов. Шаблоны без литерального префикса и суффикса
+        (например, `*а*`) не расширяются.
+
+        :param pattern: шаблон
+        :param limit: ограничение количества (по умолчанию max_expansions)
+        :return: термины словаря
+        """
+        first = min(pattern.find(char) for char in WILDCARDS if char in pattern)
+        last = max(pattern.rfind(char) for char in WILDCARDS)
+        prefix, suffix = pattern[:first], pattern[last + 1:]
+
+        max_scan = max(MAX_PATTERN_SCAN, self.max_expansions if limit is None else limit)
+        if prefix:
+            lo, hi = self.dictionary.prefix_range(prefix)
+            candidate_ids = np.arange(lo, hi)
+            candidates = self._range_terms(lo, min(hi, lo + max_scan), self.dictionary)
+        elif suffix:
+            reverse, reverse_to_forward = self._reverse_dictionary()
+            lo, hi = reverse.prefix_range(suffix[::-1])
+            candidate_ids = reverse_to_forward[lo:hi]
+            candidates = [term[::-1] for term in
+                          self._range_terms(lo, min(hi, lo + max_scan), reverse)]
+        else:
+            return []
+
+        regex = re.compile(fnmatch.translate(pattern))
+        matched = np.array([term_id for term_id, term in zip(candidate_ids, candidates)
+                            if regex.match(term)], dtype=np.int64)
+        selected = self._select(matched, limit)
+        return [self.dictionary.term(int(term_id)) for term_id in selected]
+
+    def prepare(self):
+        """
+        Построение индекса удалений и словаря перевернутых терминов заранее
+
+        Вызывается при загрузке до fork воркеров: иначе каждый процесс строил бы их
+        сам во время первого запроса с опечаткой или шаблоном `*ание`.
+        """
+        self._reverse_dictionary()
+        self.deletion_index
+
+    @property
+    def deletion_index(self) -> Dict[str, np.ndarray]:
+        """Индекс удалений (строится при первом нечетком поиске)"""
+        if self._deletion_index is None:
+            with self._lock:
+                if self._deletion_index is None:
+                    self._deletion_index = self.deletion_index_arrays()
+        return self._deletion_index
+
+    def deletion_index_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Построение индекса удалений
+
+        :return: массивы hashes (отсортированные хеши вариантов), term_ids
+                 (термин каждого варианта) и term_lengths (длины терминов)
+        """
+        hashes = []
+        term_ids = []
+        lengths = []
+        for term_id, term in enumerate(self.dictionary):
+            lengths.append(len(term))
+            for variant in deletes(term, self.max_distance) | {term}:
+                hashes.append(_hash(variant))
+                term_ids.append(term_id)
+
+        hashes = np.array(hashes, dtype=np.uint32)
+        order = np.argsort(hashes, kind='stable')
+        return {
+            'hashes': hashes[order],
+            'term_ids': np.array(term_ids, dtype=np.int32)[order],
+            'term_lengths': np.array(lengths, dtype=np.uint16),
+        }
+
+    def expand_fuzzy(self, term: str, max_distance: Optional[int] = None,
+                     limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Термины словаря на расстоянии Левенштейна не больше max_distance
+
+        :param term: термин (обычно опечатка)
+        :param max_distance: максимальное расстояние (не больше заданного при построении)
+        :param limit: ограничение количества (по умолчанию max_expansions)
+        :return: пары (термин, расстояние) по возрастанию расстояния и убыванию веса
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        limit = self.max_expansions if limit is None else limit
+        index = self.deletion_index
+
+        variant_hashes = np.array([_hash(variant) for variant in deletes(term, max_distance) | {term}],
+                                  dtype=np.uint32)
+        starts = np.searchsorted(index['hashes'], variant_hashes, side='left')
+        ends = np.searchsorted(index['hashes'], variant_hashes, side='right')
+        chunks = [index['term_ids'][start:end] for start, end in zip(starts, ends) if end > start]
+        if not chunks:
+            return []
+
+        candidates = np.unique(np.concatenate(chunks))
+        lengths = index['term_lengths'][candidates].astype(np.int64)
+        candidates = candidates[np.abs(lengths - len(term)) <= max_distance]
+        if self.weights is not None:
+            candidates = candidates[self.weights[candidates] > 0]
+
+        matches = []
+        for term_id in candidates:
+            candidate = self.dictionary.term(int(term_id))
+            distance = bounded_levenshtein(term, candidate, max_distance)
+            if distance <= max_distance:
+                weight = float(self.weights[term_id]) if self.weights is not None else 0.0
+                matches.append((distance, -weight, candidate))
+
+        matches.sort()
+        return [(candidate, distance) for distance, _, candidate in matches[:limit]]
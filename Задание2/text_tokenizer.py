@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Общий токенизатор всех этапов
+
+Текст нормализуется (нижний регистр, ё -> е), токены - последовательности
+русских и латинских букв - выделяются одним скомпилированным регулярным
+выражением за один проход по тексту. Токенизатор используется при построении
+словаря (Задание 2), инвертированного индекса (Задание 3), расчете TF-IDF
+(Задание 4) и в поисковой системе (Задание 5), поэтому словари всех этапов
+совпадают.
+
+VocabularyTokenizer преобразует текст сразу в идентификаторы терминов
+словаря; стоп-слова отбрасываются проверкой идентификатора по множеству.
+"""
+
+import re
+from typing import Dict, FrozenSet, List, Tuple
+
+# Токен - последовательность букв нормализованного текста (ё заменяется на е до поиска)
+TOKEN_PATTERN = re.compile(r'[а-яa-z]+')
+# Слова, достаточно длинные для индекса (короткие слова не выделяются совсем)
+INDEX_TOKEN_PATTERN = re.compile(r'[а-яa-z]{3,}')
+# Символы шаблонов запроса: `*` - любая строка, `?` - один символ
+WILDCARDS = '*?'
+# Токен запроса может содержать символы шаблона. `?` входит в токен, только если за ним
+# следует буква или `*` (`по?ск`), иначе это знак вопроса в конце слова
+QUERY_TOKEN_PATTERN = re.compile(r'[*?]?[а-яa-z](?:[а-яa-z*]|\?(?=[а-яa-z*]))*')
+MIN_TOKEN_LENGTH = 3  # должно совпадать с INDEX_TOKEN_PATTERN
+# Ограничение кеша VocabularyTokenizer (число различных слов)
+MAX_CACHE_SIZE = 1_000_000
+
+STOP_WORDS = frozenset({
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так',
+    'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было',
+    'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему', 'теперь', 'когда', 'даже', 'ну', 'вдруг',
+    'ли', 'если', 'уже', 'или', 'ни', 'быть', 'был', 'него', 'до', 'вас', 'нибудь', 'опять', 'уж',
+    'вам', 'ведь', 'там', 'потом', 'себя', 'ничего', 'ей', 'может', 'они', 'тут', 'где', 'есть',
+    'надо', 'ней', 'для', 'мы', 'тебя', 'их', 'чем', 'была', 'сам', 'чтоб', 'без', 'будто', 'чего',
+    'раз', 'тоже', 'себе', 'под', 'будет', 'ж', 'тогда', 'кто', 'этот', 'того', 'потому', 'этого',
+    'какой', 'совсем', 'этом', 'этой', 'при', 'об', 'над', 'pro',
+    'the', 'of', 'and', 'to', 'in', 'a', 'is', 'that', 'for', 'it', 'as', 'was', 'with', 'be', 'by',
+    'are', 'this', 'an', 'am', 'has', 'have', 'had', 'do', 'does', 'did', 'but', 'if', 'or',
+    'because', 'until', 'while', 'at', 'about', 'against', 'between', 'into', 'through', 'during',
+    'before', 'after', 'above', 'below', 'from', 'up', 'down', 'out', 'on', 'off', 'over', 'under',
+    'again', 'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 'all',
+    'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
+    'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don',
+    'should', 'now'
+})
+
+
+def normalize(text: str) -> str:
+    """
+    Нормализация текста: нижний регистр и замена ё на е
+
+    :param text: исходный текст
+    :return: нормализованный текст
+    """
+    return text.lower().replace('ё', 'е')
+
+
+def words(text: str) -> List[str]:
+    """
+    Все слова текста (без фильтрации стоп-слов и коротких слов)
+
+    :param text: исходный текст
+    :return: нормализованные слова в порядке следования
+    """
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def is_indexable(word: str) -> bool:
+    """Слово нормализовано, достаточно длинное и не является стоп-словом"""
+    return len(word) >= MIN_TOKEN_LENGTH and word not in STOP_WORDS
+
+
+def is_pattern(token: str) -> bool:
+    """Содержит ли токен запроса символы шаблона"""
+    return any(char in token for char in WILDCARDS)
+
+
+def strip_wildcards(token: str) -> str:
+    """Токен запроса без символов шаблона (для подсветки во фрагментах)"""
+    return token.replace('*', '').replace('?', '')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Токены текста, попадающие в индекс
+
+    :param text: исходный текст
+    :return: токены в порядке следования (с повторами)
+    """
+    return [word for word in INDEX_TOKEN_PATTERN.findall(normalize(text)) if word not in STOP_WORDS]
+
+
+def unique_tokens(text: str) -> List[str]:
+    """
+    Уникальные токены текста
+
+    :param text: исходный текст
+    :return: токены в порядке первого появления
+    """
+    return list(dict.fromkeys(tokenize(text)))
+
+
+def tokenize_query(query: str) -> List[str]:
+    """
+    Токенизация поискового запроса
+
+    :param query: текст запроса
+    :return: токены запроса; шаблоны (`поиск*`, `по?ск`) сохраняются, стоп-слова отбрасываются
+    """
+    return [token for token in QUERY_TOKEN_PATTERN.findall(normalize(query))
+            if is_pattern(token) or is_indexable(token)]
+
+
+class VocabularyTokenizer:
+    """
+    Токенизация текста в идентификаторы терминов словаря
+
+    Словарь - TermDictionary или любое отображение термин -> id с методом get.
+    Результаты поиска слов в словаре кешируются: в тексте повторяется
+    небольшое число различных слов, поэтому каждое слово ищется в словаре
+    один раз.
+    """
+    def __init__(self, vocabulary):
+        """
+        :param vocabulary: словарь терминов (термин -> id)
+        """
+        self.vocabulary = vocabulary
+        # Идентификаторы стоп-слов, если они есть в словаре
+        self.stop_ids: FrozenSet[int] = frozenset(
+            term_id for term_id in (vocabulary.get(word) for word in STOP_WORDS) if term_id is not None
+        )
+        # Кеш слово -> id (-1 - слово не индексируется)
+        self._cache: Dict[str, int] = {}
+
+    def _lookup(self, word: str) -> int:
+        """Поиск слова в словаре с записью в кеш"""
+        term_id = self.vocabulary.get(word) if len(word) >= MIN_TOKEN_LENGTH else None
+        if term_id is None or term_id in self.stop_ids:
+            term_id = -1
+        if len(self._cache) >= MAX_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[word] = term_id
+        return term_id
+
+    def token_ids(self, text: str) -> Tuple[List[int], int]:
+        """
+        Идентификаторы токенов текста
+
+        :param text: исходный текст
+        :return: (id токенов словаря в порядке следования, общее число слов текста)
+        """
+        cache_get = self._cache.get
+        lookup = self._lookup
+        ids = []
+        text_words = TOKEN_PATTERN.findall(normalize(text))
+        for word in text_words:
+            term_id = cache_get(word)
+            if term_id is None:
+                term_id = lookup(word)
+            if term_id >= 0:
+                ids.append(term_id)
+        return ids, len(text_words)
+
+    def unique_ids(self, text: str) -> List[int]:
+        """
+        Уникальные идентификаторы токенов текста
+
+        :param text: исходный текст
+        :return: id в порядке первого появления
+        """
+        cache_get = self._cache.get
+        lookup = self._lookup
+        ids = []
+        # Каждое различное слово проверяется один раз
+        for word in dict.fromkeys(INDEX_TOKEN_PATTERN.findall(normalize(text))):
+            term_id = cache_get(word)
+            if term_id is None:
+                term_id = lookup(word)
+            if term_id >= 0:
+                ids.append(term_id)
+        return ids
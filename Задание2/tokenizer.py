@@ -7,32 +7,13 @@ import sys
 from bs4 import BeautifulSoup
 from pymystem3 import Mystem
 from collections import defaultdict
+# Токенизатор общий для всех этапов: нормализация и выделение уникальных токенов
+# (стоп-слова и минимальная длина учитываются внутри unique_tokens)
+from text_tokenizer import normalize, unique_tokens
 
-DATA_DIR = "../Задание_1/crawler/data/pages"
-OUTPUT_DIR = "."
-
-TOKEN_PATTERN = re.compile(r'^[а-яА-Яa-zA-Z]+$')
-MIN_TOKEN_LENGTH = 3
-
-STOP_WORDS = {
-    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так',
-    'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было',
-    'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему', 'теперь', 'когда', 'даже', 'ну', 'вдруг',
-    'ли', 'если', 'уже', 'или', 'ни', 'быть', 'был', 'него', 'до', 'вас', 'нибудь', 'опять', 'уж',
-    'вам', 'ведь', 'там', 'потом', 'себя', 'ничего', 'ей', 'может', 'они', 'тут', 'где', 'есть',
-    'надо', 'ней', 'для', 'мы', 'тебя', 'их', 'чем', 'была', 'сам', 'чтоб', 'без', 'будто', 'чего',
-    'раз', 'тоже', 'себе', 'под', 'будет', 'ж', 'тогда', 'кто', 'этот', 'того', 'потому', 'этого',
-    'какой', 'совсем', 'этом', 'этой', 'этот', 'при', 'об', 'the', 'of', 'and', 'to', 'in', 'a',
-    'is', 'that', 'for', 'it', 'as', 'was', 'with', 'be', 'by', 'are', 'this', 'an', 'на', 'то',
-    'не', 'как', 'над', 'под', 'от', 'pro', 'по', 'со', 'из',
-    'am', 'has', 'have', 'had', 'do', 'does', 'did', 'but', 'if', 'or', 'because', 'as', 'until',
-    'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into', 'through',
-    'during', 'before', 'after', 'above', 'below', 'to', 'from', 'up', 'down', 'in', 'out', 'on',
-    'off', 'over', 'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when', 'where',
-    'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such',
-    'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'can',
-    'will', 'just', 'don', 'should', 'now'
-}
+# Пути можно переопределить переменными окружения (см. benchmarks/README.md)
+DATA_DIR = os.environ.get("OIP_PAGES_DIR", "../Задание_1/crawler/data/pages")
+OUTPUT_DIR = os.environ.get("OIP_TOKENIZER_OUTPUT_DIR", ".")
 
 def extract_text_from_html(html_content):
     """Извлекает текст из HTML-файла, удаляя теги и JavaScript"""
@@ -42,8 +23,8 @@ def extract_text_from_html(html_content):
     for script in soup(["script", "style"]):
         script.extract()
     
-    # Получаем текст
-    text = soup.get_text()
+    # Получаем текст (слова соседних тегов не склеиваются, как в Задании 4)
+    text = soup.get_text(separator=' ')
     
     # Удаляем лишние пробелы и переносы строк
     text = re.sub(r'\s+', ' ', text).strip()
@@ -52,27 +33,8 @@ def extract_text_from_html(html_content):
 
 def tokenize_text(text):
     """Разбивает текст на отдельные слова (токены)"""
-    # Приводим к нижнему регистру и разбиваем на слова
-    words = text.lower().split()
-    
-    # Фильтруем токены
-    filtered_tokens = []
-    for word in words:
-        # Проверяем, что токен содержит только буквы и имеет достаточную длину
-        if (TOKEN_PATTERN.match(word) and 
-            len(word) >= MIN_TOKEN_LENGTH and 
-            word not in STOP_WORDS):
-            filtered_tokens.append(word)
-    
-    # Удаляем дубликаты, сохраняя порядок
-    unique_tokens = []
-    seen = set()
-    for token in filtered_tokens:
-        if token not in seen:
-            seen.add(token)
-            unique_tokens.append(token)
-    
-    return unique_tokens
+    # Нормализуем текст, выделяем слова и отбрасываем стоп-слова и короткие слова
+    return unique_tokens(text)
 
 def lemmatize_tokens(tokens):
     """Лемматизирует список токенов с помощью Mystem"""
@@ -86,7 +48,7 @@ def lemmatize_tokens(tokens):
     for token in tokens:
         lemmas = mystem.analyze(token)
         if lemmas and 'analysis' in lemmas[0] and lemmas[0]['analysis']:
-            lemma = lemmas[0]['analysis'][0]['lex']
+            lemma = normalize(lemmas[0]['analysis'][0]['lex'])
             lemmas_dict[lemma].add(token)
         else:
             # Если не удалось лемматизировать, используем сам токен как лемму
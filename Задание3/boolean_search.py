@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Булев поиск по инвертированному индексу (операторы AND, OR, NOT, скобки,
+шаблоны, нечеткий поиск и фильтры по метаданным страниц)
+
+BooleanSearcher загружает готовый inverted_index.json; построение индекса из
+HTML-файлов (build_inverted_index) выполняется только по явному запросу.
+search_batch выполняет пачку запросов в нескольких процессах: процессы
+создаются через fork после загрузки индекса и получают его без копирования
+и повторного чтения, результаты возвращаются в порядке запросов по мере
+готовности.
+
+Пример:
+    from boolean_search import BooleanSearcher
+    searcher = BooleanSearcher.load('inverted_index.json', '../Задание_1/crawler/data/pages')
+    searcher.search('(python OR html) AND NOT javascript site:ru.wikipedia.org')
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+
+# Словарь терминов и расширение шаблонов находятся в Задании 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Задание2'))
+from term_dictionary import TermDictionary
+from term_expansion import TermExpander
+from text_tokenizer import VocabularyTokenizer, normalize, unique_tokens
+from document_filters import FilterIndex, parse_filters
+
+# Запросов в одной задаче процесса пакетного поиска
+DEFAULT_CHUNK_SIZE = 64
+# Индекс удалений нечеткого поиска сохраняется рядом с индексом: inverted_index.expansion.npz
+EXPANSION_SUFFIX = '.expansion.npz'
+
+
+def page_doc_id(filename: str) -> int:
+    """ID документа по имени файла страницы (page_007.html -> 7)"""
+    return int(filename.split('_')[1].split('.')[0])
+
+
+def page_files(pages_dir: str) -> List[str]:
+    """HTML-файлы страниц директории"""
+    return [f for f in os.listdir(pages_dir) if f.endswith('.html')]
+
+
+def read_tokens(tokens_path: str) -> List[str]:
+    """
+    Чтение токенов Задания 2
+
+    :param tokens_path: путь к tokens.txt
+    :return: токены (пустой список, если файла нет)
+    """
+    try:
+        with open(tokens_path, 'r', encoding='utf-8') as file:
+            tokens = [line.strip() for line in file]
+        print(f"Прочитано {len(tokens)} токенов.")
+        return tokens
+    except FileNotFoundError:
+        print(f"Файл {tokens_path} не найден.")
+        return []
+
+
+def build_inverted_index(pages_dir: str, tokens_path: Optional[str] = None) -> Dict[str, List[int]]:
+    """
+    Построение инвертированного индекса из HTML-файлов страниц
+
+    Если есть токены Задания 2, индексируются только они (тем же словарем, что и в
+    Задании 2), иначе - все слова страниц.
+
+    :param pages_dir: директория с HTML-файлами
+    :param tokens_path: путь к tokens.txt (None - индексировать все слова)
+    :return: {токен: отсортированный список doc_id}
+    """
+    tokens = read_tokens(tokens_path) if tokens_path else []
+    if tokens:
+        # Словарь токенов: текст документа сразу преобразуется в id токенов
+        vocabulary = TermDictionary.from_terms(tokens)
+        tokenizer = VocabularyTokenizer(vocabulary)
+    else:
+        print("Токены не найдены, будем индексировать файлы напрямую.")
+
+    inverted_index = defaultdict(list)
+    html_files = page_files(pages_dir)
+    print(f"Создание инвертированного индекса по {len(html_files)} HTML файлам...")
+    for file_count, filename in enumerate(html_files, 1):
+        doc_id = page_doc_id(filename)
+        with open(os.path.join(pages_dir, filename), 'r', encoding='utf-8') as file:
+            content = file.read()
+
+        # Удаляем HTML теги
+        text = re.sub(r'<[^>]+>', ' ', content)
+        if tokens:
+            # Находим токены словаря в документе (каждый токен - один раз)
+            for term_id in tokenizer.unique_ids(text):
+                inverted_index[vocabulary.term(term_id)].append(doc_id)
+        else:
+            # Разбиваем на токены тем же токенизатором, что и в Задании 2
+            for word in unique_tokens(text):
+                inverted_index[word].append(doc_id)
+
+        if file_count % 1000 == 0:
+            print(f"Обработано {file_count} файлов")
+
+    for doc_ids in inverted_index.values():
+        doc_ids.sort()
+    return dict(inverted_index)
+
+
+def save_inverted_index(inverted_index: Dict[str, List[int]], index_path: str):
+    """Сохранение индекса в JSON-файл (через временный файл, чтобы не оставить недописанный индекс)"""
+    temp_path = f"{index_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(inverted_index, file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, index_path)
+
+
+def expansion_path(index_path: str) -> str:
+    """Путь к индексу удалений нечеткого поиска для файла индекса"""
+    return os.path.splitext(index_path)[0] + EXPANSION_SUFFIX
+
+
+def load_deletion_index(index_path: str) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Чтение сохраненного индекса удалений
+
+    :param index_path: путь к inverted_index.json
+    :return: массивы индекса удалений или None, если файла нет или он старше индекса
+    """
+    path = expansion_path(index_path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(index_path):
+        return None
+    with np.load(path) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+
+# Функции для парсинга и обработки булевых запросов
+
+def tokenize_query(query):
+    """Разбивает запрос на токены"""
+    tokens = []
+    i = 0
+    while i < len(query):
+        if query[i].isspace():
+            i += 1
+            continue
+        elif query[i:i+3] == 'AND':
+            tokens.append('AND')
+            i += 3
+        elif query[i:i+2] == 'OR':
+            tokens.append('OR')
+            i += 2
+        elif query[i:i+3] == 'NOT':
+            tokens.append('NOT')
+            i += 3
+        elif query[i] == '(':
+            tokens.append('(')
+            i += 1
+        elif query[i] == ')':
+            tokens.append(')')
+            i += 1
+        else:
+            # Извлекаем термин
+            start = i
+            while i < len(query) and not query[i].isspace() and query[i] not in '()' and not query[i:i+3] in ['AND', 'OR', 'NOT']:
+                i += 1
+            term = query[start:i]
+            tokens.append(normalize(term))
+    return tokens
+
+
+def lookup_term(term, inverted_index, expander=None, allowed=None):
+    """
+    Возвращает список doc_id для термина
+
+    Если передан expander, поддерживаются шаблоны (`поиск*`, `*ание`, `по?ск`)
+    и нечеткий поиск (`питон~` - расстояние 1, `питон~2` - расстояние 2).
+    Если передано множество allowed, возвращаются только его документы.
+    """
+    if expander is None:
+        return restrict_doc_ids(inverted_index.get(term, []), allowed)
+
+    fuzzy = re.fullmatch(r'(.+)~(\d)?', term)
+    if fuzzy:
+        max_distance = int(fuzzy.group(2) or 1)
+        expansions = [t for t, _ in expander.expand_fuzzy(fuzzy.group(1), max_distance)]
+    elif TermExpander.is_pattern(term):
+        expansions = expander.expand_wildcard(term)
+    else:
+        return restrict_doc_ids(inverted_index.get(term, []), allowed)
+
+    # Термин-шаблон означает OR по всем его расширениям
+    doc_ids = set()
+    for expansion in expansions:
+        doc_ids.update(restrict_doc_ids(inverted_index.get(expansion, []), allowed))
+    return sorted(doc_ids)
+
+
+def restrict_doc_ids(doc_ids, allowed=None):
+    """Оставляет только doc_id из множества allowed (None - без ограничения)"""
+    if allowed is None:
+        return doc_ids
+    return [doc_id for doc_id in doc_ids if doc_id in allowed]
+
+
+def evaluate_query(query, inverted_index, all_doc_ids, expander=None, allowed=None):
+    """
+    Оценивает булев запрос, возвращает список doc_id
+
+    Множество allowed (документы, прошедшие фильтр) применяется до вычисления
+    выражения: списки документов терминов и универсум для NOT сужаются сразу.
+    """
+    if allowed is not None:
+        all_doc_ids = restrict_doc_ids(all_doc_ids, allowed)
+    tokens = tokenize_query(query)
+    return evaluate_expression(tokens, 0, len(tokens), inverted_index, all_doc_ids, expander, allowed)[0]
+
+
+def evaluate_expression(tokens, start, end, inverted_index, all_doc_ids, expander=None, allowed=None):
+    """Рекурсивно оценивает выражение, возвращает (результат, новая_позиция)"""
+    if start >= end:
+        return [], start
+
+    result = []
+    i = start
+    last_operator = 'OR'  # По умолчанию используем OR
+    first_term = True
+    next_is_not = False
+
+    while i < end:
+        if tokens[i] == '(':
+            # Обрабатываем вложенное выражение
+            sub_result, i = evaluate_expression(tokens, i + 1, end, inverted_index, all_doc_ids,
+                                                expander, allowed)
+
+            # Применяем оператор к текущему результату
+            if first_term:
+                # Если это первый терм, просто присваиваем результат
+                if next_is_not:
+                    result = list(set(all_doc_ids) - set(sub_result))
+                    next_is_not = False
+                else:
+                    result = sub_result
+                first_term = False
+            else:
+                if last_operator == 'AND':
+                    result = list(set(result) & set(sub_result))
+                elif last_operator == 'OR':
+                    result = list(set(result) | set(sub_result))
+                elif last_operator == 'NOT':
+                    result = list(set(result) - set(sub_result))
+        elif tokens[i] == ')':
+            # Конец вложенного выражения
+            return result, i + 1
+        elif tokens[i] == 'AND':
+            last_operator = 'AND'
+            i += 1
+        elif tokens[i] == 'OR':
+            last_operator = 'OR'
+            i += 1
+        elif tokens[i] == 'NOT':
+            if first_term:
+                # Если NOT - первый оператор, запоминаем это
+                next_is_not = True
+            else:
+                last_operator = 'NOT'
+            i += 1
+        else:
+            # Обрабатываем терм
+            term = tokens[i]
+            term_docs = lookup_term(term, inverted_index, expander, allowed)
+
+            # Применяем оператор к текущему результату
+            if first_term:
+                # Если это первый терм, просто присваиваем результат
+                if next_is_not:
+                    result = list(set(all_doc_ids) - set(term_docs))
+                    next_is_not = False
+                else:
+                    result = term_docs
+                first_term = False
+            else:
+                if last_operator == 'AND':
+                    result = list(set(result) & set(term_docs))
+                elif last_operator == 'OR':
+                    result = list(set(result) | set(term_docs))
+                elif last_operator == 'NOT':
+                    # NOT должен работать с result, а не с all_doc_ids
+                    result = list(set(result) - set(term_docs))
+
+            i += 1
+
+    return result, i
+
+
+class BooleanSearcher:
+    """
+    Булев поиск по загруженному инвертированному индексу
+    """
+    def __init__(self, inverted_index: Dict[str, List[int]], doc_ids: Iterable[int],
+                 pages_dir: Optional[str] = None, crawl_index_path: Optional[str] = None,
+                 deletion_index: Optional[Dict[str, np.ndarray]] = None):
+        """
+        :param inverted_index: {токен: список doc_id}
+        :param doc_ids: ID всех документов коллекции (универсум для NOT)
+        :param pages_dir: директория с HTML-файлами (метаданные страниц для фильтров)
+        :param crawl_index_path: индексный файл краулера с URL и метаданными страниц
+        :param deletion_index: готовый индекс удалений нечеткого поиска (None - строится
+                               при первом запросе с ~)
+        """
+        self.inverted_index = inverted_index
+        self.doc_ids = sorted(doc_ids)
+        self.pages_dir = pages_dir
+        self.crawl_index_path = crawl_index_path
+        # Словарь терминов индекса для расширения шаблонов и опечаток. Шаблон в булевом
+        # запросе - OR по всем подходящим терминам, поэтому количество расширений не ограничено
+        dictionary = TermDictionary.from_terms(inverted_index)
+        self.expander = TermExpander(dictionary, max_expansions=len(dictionary),
+                                     deletion_index=deletion_index)
+        self._filter_index = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, index_path: str, pages_dir: Optional[str] = None,
+             crawl_index_path: Optional[str] = None) -> 'BooleanSearcher':
+        """
+        Загрузка готового индекса (и индекса удалений, если он сохранен при построении)
+
+        :param index_path: путь к inverted_index.json
+        :param pages_dir: директория с HTML-файлами (без нее универсум для NOT -
+                          документы, встречающиеся в индексе)
+        :param crawl_index_path: индексный файл краулера
+        :return: поисковик
+        :raises FileNotFoundError: если индекса нет
+        """
+        with open(index_path, 'r', encoding='utf-8') as file:
+            inverted_index = json.load(file)
+        if pages_dir and os.path.isdir(pages_dir):
+            doc_ids = [page_doc_id(filename) for filename in page_files(pages_dir)]
+        else:
+            doc_ids = {doc_id for postings in inverted_index.values() for doc_id in postings}
+        return cls(inverted_index, doc_ids, pages_dir, crawl_index_path,
+                   load_deletion_index(index_path))
+
+    @classmethod
+    def build(cls, pages_dir: str, tokens_path: Optional[str] = None,
+              index_path: Optional[str] = None,
+              crawl_index_path: Optional[str] = None) -> 'BooleanSearcher':
+        """
+        Построение индекса из HTML-файлов страниц
+
+        Вместе с индексом сохраняется индекс удалений нечеткого поиска: его
+        построение по словарю занимает больше времени, чем загрузка индекса.
+
+        :param pages_dir: директория с HTML-файлами
+        :param tokens_path: путь к tokens.txt Задания 2
+        :param index_path: куда сохранить индекс (None - не сохранять)
+        :param crawl_index_path: индексный файл краулера
+        :return: поисковик
+        """
+        inverted_index = build_inverted_index(pages_dir, tokens_path)
+        doc_ids = [page_doc_id(filename) for filename in page_files(pages_dir)]
+        searcher = cls(inverted_index, doc_ids, pages_dir, crawl_index_path)
+        if index_path:
+            print(f"Сохранение индекса в файл {index_path}...")
+            save_inverted_index(inverted_index, index_path)
+            np.savez(expansion_path(index_path), **searcher.expander.deletion_index)
+        print(f"Индекс создан. Всего уникальных токенов: {len(inverted_index)}")
+        return searcher
+
+    @property
+    def filter_index(self) -> FilterIndex:
+        """
+        Битовые карты хостов и языков, даты и размеры страниц для фильтров
+
+        Строится при первом запросе с фильтром: запросам без фильтров не нужно
+        читать индекс краулера и файлы страниц.
+        """
+        if self._filter_index is None:
+            with self._lock:
+                if self._filter_index is None:
+                    page_paths = {}
+                    if self.pages_dir:
+                        page_paths = {doc_id: os.path.join(self.pages_dir, f"page_{doc_id:03d}.html")
+                                      for doc_id in self.doc_ids}
+                    crawl_index_path = self.crawl_index_path
+                    if crawl_index_path and not os.path.exists(crawl_index_path):
+                        # Без индекса краулера поля берутся из файлов страниц (без site:)
+                        crawl_index_path = None
+                    self._filter_index = FilterIndex.build(self.doc_ids, crawl_index_path, page_paths)
+        return self._filter_index
+
+    def allowed_documents(self, clauses) -> Optional[Set[int]]:
+        """Множество doc_id, удовлетворяющих условиям фильтра (None, если условий нет)"""
+        doc_filter = self.filter_index.compile(clauses) if clauses else None
+        if doc_filter is None:
+            return None
+        return set(np.asarray(self.doc_ids, dtype=np.int64)[doc_filter.docs].tolist())
+
+    def search(self, query: str) -> List[int]:
+        """
+        Выполнение запроса
+
+        :param query: булев запрос, возможно с условиями фильтра (site:, lang:, date:, length:)
+        :return: отсортированные doc_id найденных документов
+        :raises Exception: при ошибке в запросе
+        """
+        query, clauses = parse_filters(query)
+        return sorted(evaluate_query(query, self.inverted_index, self.doc_ids, self.expander,
+                                     self.allowed_documents(clauses)))
+
+
+# Поисковик процессов пакетного поиска (наследуется при fork)
+_batch_searcher = None
+
+
+def search_result(searcher: BooleanSearcher, query: str) -> Dict[str, Any]:
+    """
+    Результат запроса для пакетного вывода
+
+    :return: запрос, количество и ID найденных документов, время выполнения
+             (или текст ошибки для некорректного запроса)
+    """
+    start = time.perf_counter()
+    try:
+        doc_ids = searcher.search(query)
+    except Exception as e:
+        return {'query': query, 'error': str(e)}
+    return {'query': query, 'count': len(doc_ids), 'doc_ids': doc_ids,
+            'time_ms': round((time.perf_counter() - start) * 1000, 3)}
+
+
+def _search_chunk(queries: List[str], searcher: Optional[BooleanSearcher] = None) -> List[Dict[str, Any]]:
+    """Выполнение части запросов в процессе (или потоке) пула"""
+    searcher = searcher or _batch_searcher
+    return [search_result(searcher, query) for query in queries]
+
+
+def _chunks(queries: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    """Разбиение потока запросов на части"""
+    chunk = []
+    for query in queries:
+        chunk.append(query)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def search_batch(searcher: BooleanSearcher, queries: Iterable[str], workers: int = 1,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Пакетное выполнение запросов
+
+    Запросы читаются из итератора по мере выполнения (в работе не больше
+    нескольких частей на процесс), поэтому подходят и файлы, и stdin.
+
+    :param searcher: поисковик
+    :param queries: запросы
+    :param workers: количество процессов (1 - в текущем процессе)
+    :param chunk_size: запросов в одной задаче процесса
+    :return: результаты search_result в порядке запросов
+    """
+    chunks = _chunks(queries, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _search_chunk(chunk, searcher)
+        return
+
+    global _batch_searcher
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # Структуры расширения терминов и фильтры строятся до fork, чтобы процессы не строили их каждый заново
+        searcher.expander.prepare()
+        if searcher.crawl_index_path or searcher.pages_dir:
+            searcher.filter_index
+        _batch_searcher = searcher
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        # Без fork индекс пришлось бы передавать каждому процессу: выполняем в потоках
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(executor.submit(_search_chunk, chunk, None if _batch_searcher else searcher))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        _batch_searcher = None
@@ -1,266 +1,160 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-# 1. Создаем инвертированный индекс из токенов файлов
-# 2. Реализуем булев поиск с операторами AND, OR, NOT
+# 1. Создаем инвертированный индекс из токенов файлов (только с --build)
+# 2. Реализуем булев поиск с операторами AND, OR, NOT (см. boolean_search.py)
 # 3. Обрабатываем сложные запросы со скобками
+# 4. Ограничиваем поиск фильтрами по метаданным страниц (site:, lang:, date:, length:)
+# 5. Выполняем пачку запросов из файла или stdin параллельно, результаты - строки JSON
+#
+# Примеры:
+#   python main.py --build                          # построить и сохранить индекс
+#   python main.py                                  # интерактивный поиск по готовому индексу
+#   python main.py --queries queries.txt --workers 8 > results.jsonl
+#   cat queries.txt | python main.py --queries -
 
 import os
-import re
+import sys
 import json
-from collections import defaultdict
+import time
+import argparse
+import contextlib
 
+from boolean_search import BooleanSearcher, search_batch, DEFAULT_CHUNK_SIZE
+
+# Пути можно переопределить переменными окружения (см. benchmarks/README.md)
 # Путь к директории с HTML-файлами
-DATA_DIR = "../Задание_1/crawler/data/pages"
+DATA_DIR = os.environ.get("OIP_PAGES_DIR", "../Задание_1/crawler/data/pages")
 # Путь к файлу с токенами из Задания 2
-TOKENS_FILE = "../Задание2/tokens.txt"
+TOKENS_FILE = os.environ.get("OIP_TOKENS_PATH", "../Задание2/tokens.txt")
 # Путь для сохранения индекса
-INDEX_FILE = "inverted_index.json"
-
-# В этом списке будем хранить все наши токены
-all_tokens = []
-
-# Инвертированный индекс - словарь, где ключ - токен, значение - список doc_id
-inverted_index = defaultdict(list)
-
-# Читаем токены из файла
-print("Чтение токенов из файла...")
-try:
-    with open(TOKENS_FILE, 'r', encoding='utf-8') as file:
-        all_tokens = [line.strip() for line in file.readlines()]
-    print(f"Прочитано {len(all_tokens)} токенов.")
-except FileNotFoundError:
-    print(f"Файл {TOKENS_FILE} не найден.")
-    all_tokens = []
-
-# Проверяем, что токены были прочитаны
-if not all_tokens:
-    print("Токены не найдены, будем индексировать файлы напрямую.")
-    
-    # Проверяем существование директории с данными
-    if not os.path.exists(DATA_DIR):
-        print(f"Ошибка: директория {DATA_DIR} не существует")
-        exit(1)
-        
-    # Получаем список HTML файлов
-    html_files = [f for f in os.listdir(DATA_DIR) if f.endswith('.html')]
-    print(f"Найдено {len(html_files)} HTML файлов.")
-    
-    # Для каждого HTML файла извлекаем токены и создаем индекс
-    for filename in html_files:
-        doc_id = int(filename.split('_')[1].split('.')[0])  # Извлекаем ID документа из имени файла
-        file_path = os.path.join(DATA_DIR, filename)
-        
-        # Читаем содержимое файла
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Удаляем HTML теги
-        text = re.sub(r'<[^>]+>', ' ', content)
-        
-        # Разбиваем на слова, приводим к нижнему регистру
-        words = re.findall(r'\b[а-яА-Яa-zA-Z]+\b', text.lower())
-        
-        # Добавляем токены в индекс
-        for word in words:
-            if word not in inverted_index[word]:
-                inverted_index[word].append(doc_id)
-                if word not in all_tokens:
-                    all_tokens.append(word)
-else:
-    # Если токены уже есть, просто строим инвертированный индекс
-    # Для каждого HTML файла проверяем наличие токенов
-    html_files = [f for f in os.listdir(DATA_DIR) if f.endswith('.html')]
-    
-    print("Создание инвертированного индекса...")
-    # Создаем множество всех токенов для быстрого поиска
-    all_tokens_set = set(all_tokens)
-    
-    # Обрабатываем каждый HTML файл
-    file_count = 0
-    for filename in html_files:
-        doc_id = int(filename.split('_')[1].split('.')[0])  # Извлекаем ID документа из имени файла
-        file_path = os.path.join(DATA_DIR, filename)
-        
-        # Читаем содержимое файла
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Удаляем HTML теги и приводим к нижнему регистру
-        text = re.sub(r'<[^>]+>', ' ', content).lower()
-        
-        # Разбиваем текст на слова
-        words = set(re.findall(r'\b[а-яА-Яa-zA-Z]+\b', text))
-        
-        # Находим пересечение с нашими токенами (это намного быстрее, чем проверка каждого токена)
-        matching_tokens = words.intersection(all_tokens_set)
-        
-        # Добавляем doc_id в индекс для каждого найденного токена
-        for token in matching_tokens:
-            inverted_index[token].append(doc_id)
-        
-        # Обновляем счётчик обработанных файлов
-        file_count += 1
-        if file_count % 10 == 0:
-            print(f"Обработано {file_count} файлов")
-    
-    # Сортируем doc_id в каждом списке
-    for token in inverted_index:
-        inverted_index[token].sort()
+INDEX_FILE = os.environ.get("OIP_INDEX_PATH", "inverted_index.json")
+# Индексный файл краулера с URL и метаданными страниц (для фильтров)
+CRAWL_INDEX_FILE = os.environ.get("OIP_CRAWL_INDEX_PATH", "../Задание_1/crawler/data/index.txt")
 
-# Сохраняем индекс в JSON файл
-print(f"Сохранение индекса в файл {INDEX_FILE}...")
-with open(INDEX_FILE, 'w', encoding='utf-8') as file:
-    json.dump(inverted_index, file, ensure_ascii=False, indent=2)
-
-print(f"Индекс создан и сохранен. Всего уникальных токенов: {len(inverted_index)}")
-
-# Функции для парсинга и обработки булевых запросов
-
-def tokenize_query(query):
-    """Разбивает запрос на токены"""
-    tokens = []
-    i = 0
-    while i < len(query):
-        if query[i].isspace():
-            i += 1
-            continue
-        elif query[i:i+3] == 'AND':
-            tokens.append('AND')
-            i += 3
-        elif query[i:i+2] == 'OR':
-            tokens.append('OR')
-            i += 2
-        elif query[i:i+3] == 'NOT':
-            tokens.append('NOT')
-            i += 3
-        elif query[i] == '(':
-            tokens.append('(')
-            i += 1
-        elif query[i] == ')':
-            tokens.append(')')
-            i += 1
-        else:
-            # Извлекаем термин
-            start = i
-            while i < len(query) and not query[i].isspace() and query[i] not in '()' and not query[i:i+3] in ['AND', 'OR', 'NOT']:
-                i += 1
-            term = query[start:i]
-            tokens.append(term.lower())  
-    return tokens
+# Количество документов на странице вывода результатов
+RESULTS_PAGE_SIZE = 50
 
-def evaluate_query(query, inverted_index, all_doc_ids):
-    """Оценивает булев запрос, возвращает список doc_id"""
-    tokens = tokenize_query(query)
-    return evaluate_expression(tokens, 0, len(tokens), inverted_index, all_doc_ids)[0]
-
-def evaluate_expression(tokens, start, end, inverted_index, all_doc_ids):
-    """Рекурсивно оценивает выражение, возвращает (результат, новая_позиция)"""
-    if start >= end:
-        return [], start
-    
-    result = []
-    i = start
-    last_operator = 'OR'  # По умолчанию используем OR
-    first_term = True
-    next_is_not = False  
-    
-    while i < end:
-        if tokens[i] == '(':
-            # Обрабатываем вложенное выражение
-            sub_result, i = evaluate_expression(tokens, i + 1, end, inverted_index, all_doc_ids)
-            
-            # Применяем оператор к текущему результату
-            if first_term:
-                # Если это первый терм, просто присваиваем результат
-                if next_is_not:
-                    result = list(set(all_doc_ids) - set(sub_result))
-                    next_is_not = False
-                else:
-                    result = sub_result
-                first_term = False
-            else:
-                if last_operator == 'AND':
-                    result = list(set(result) & set(sub_result))
-                elif last_operator == 'OR':
-                    result = list(set(result) | set(sub_result))
-                elif last_operator == 'NOT':
-                    result = list(set(result) - set(sub_result))
-        elif tokens[i] == ')':
-            # Конец вложенного выражения
-            return result, i + 1
-        elif tokens[i] == 'AND':
-            last_operator = 'AND'
-            i += 1
-        elif tokens[i] == 'OR':
-            last_operator = 'OR'
-            i += 1
-        elif tokens[i] == 'NOT':
-            if first_term:
-                # Если NOT - первый оператор, запоминаем это
-                next_is_not = True
-            else:
-                last_operator = 'NOT'
-            i += 1
-        else:
-            # Обрабатываем терм
-            term = tokens[i]
-            term_docs = inverted_index.get(term, [])
-            
-            # Применяем оператор к текущему результату
-            if first_term:
-                # Если это первый терм, просто присваиваем результат
-                if next_is_not:
-                    result = list(set(all_doc_ids) - set(term_docs))
-                    next_is_not = False
-                else:
-                    result = term_docs
-                first_term = False
-            else:
-                if last_operator == 'AND':
-                    result = list(set(result) & set(term_docs))
-                elif last_operator == 'OR':
-                    result = list(set(result) | set(term_docs))
-                elif last_operator == 'NOT':
-                    # NOT должен работать с result, а не с all_doc_ids
-                    result = list(set(result) - set(term_docs))
-            
-            i += 1
-    
-    return result, i
-
-def print_search_results(doc_ids):
-    """Выводит результаты поиска"""
+def print_search_results(doc_ids, page_size=RESULTS_PAGE_SIZE):
+    """Выводит результаты поиска постранично (Enter - следующая страница, q - прекратить)"""
     if not doc_ids:
         print("Ничего не найдено.")
         return
-    
-    print(f"Найдено документов: {len(doc_ids)}")
-    for doc_id in sorted(doc_ids):
-        print(f"Документ: page_{doc_id:03d}.html")
 
-# Получаем список всех doc_id
-all_doc_ids = []
-for filename in os.listdir(DATA_DIR):
-    if filename.endswith('.html'):
-        doc_id = int(filename.split('_')[1].split('.')[0])
-        all_doc_ids.append(doc_id)
-
-# Цикл для поиска
-print("\nБулев поиск (для выхода введите 'q')")
-print("Примеры запросов:")
-print("  python AND язык")
-print("  (python OR html) AND NOT javascript")
-print("  python OR (html AND css)")
-
-while True:
-    query = input("\nВведите запрос: ")
-    if query.lower() == 'q':
-        break
-    
+    print(f"Найдено документов: {len(doc_ids)}")
+    doc_ids = sorted(doc_ids)
+    for start in range(0, len(doc_ids), page_size):
+        for doc_id in doc_ids[start:start + page_size]:
+            print(f"Документ: page_{doc_id:03d}.html")
+        remaining = len(doc_ids) - start - page_size
+        if remaining > 0 and input(f"Еще {remaining} документов (Enter - показать, q - прекратить): ").lower() == 'q':
+            break
+
+def interactive_search(searcher):
+    """Цикл для поиска: запросы вводятся с клавиатуры"""
+    print("\nБулев поиск (для выхода введите 'q')")
+    print("Примеры запросов:")
+    print("  python AND язык")
+    print("  (python OR html) AND NOT javascript")
+    print("  python OR (html AND css)")
+    print("  поиск* AND NOT питон~")
+    print("  python AND язык site:ru.wikipedia.org -lang:en")
+
+    while True:
+        try:
+            query = input("\nВведите запрос: ")
+        except EOFError:
+            break
+        if query.lower() == 'q':
+            break
+
+        try:
+            print_search_results(searcher.search(query))
+        except Exception as e:
+            print(f"Ошибка: {str(e)}")
+            print("Пожалуйста, проверьте синтаксис запроса.")
+
+def read_queries(file):
+    """Непустые строки файла запросов (строки, начинающиеся с #, - комментарии)"""
+    for line in file:
+        query = line.strip()
+        if query and not query.startswith('#'):
+            yield query
+
+def batch_search(searcher, queries_path, output_path=None, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Пакетный поиск: по строке JSON на запрос в порядке запросов
+
+    Сводка (количество запросов, ошибок, время) выводится в stderr, чтобы не
+    смешиваться с результатами в stdout.
+
+    :return: количество запросов с ошибкой
+    """
+    source = sys.stdin if queries_path == '-' else open(queries_path, 'r', encoding='utf-8')
+    output = open(output_path, 'w', encoding='utf-8') if output_path else sys.stdout
+    start = time.perf_counter()
+    count = 0
+    errors = 0
     try:
-        result_doc_ids = evaluate_query(query, inverted_index, all_doc_ids)
-        print_search_results(result_doc_ids)
-    except Exception as e:
-        print(f"Ошибка: {str(e)}")
-        print("Пожалуйста, проверьте синтаксис запроса.") 
\ No newline at end of file
+        # Сообщения поиска (print) не должны попадать в строки результатов в stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            for result in search_batch(searcher, read_queries(source), workers, chunk_size):
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                count += 1
+                errors += 'error' in result
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+        else:
+            output.flush()
+    elapsed = time.perf_counter() - start
+    print(f"Выполнено запросов: {count}, с ошибкой: {errors}, за {elapsed:.2f} с "
+          f"({count / elapsed if elapsed > 0 else 0:.0f} запросов/с)", file=sys.stderr)
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description='Булев поиск по инвертированному индексу')
+    parser.add_argument('--build', action='store_true',
+                        help='построить индекс из HTML-файлов и сохранить его (иначе загружается готовый)')
+    parser.add_argument('--queries', help='файл запросов по одному в строке (- для stdin): пакетный поиск')
+    parser.add_argument('--output', help='файл результатов пакетного поиска (по умолчанию stdout)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='процессов пакетного поиска')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='запросов в одной задаче процесса')
+    parser.add_argument('--index-path', default=INDEX_FILE)
+    parser.add_argument('--pages-dir', default=DATA_DIR)
+    parser.add_argument('--tokens-path', default=TOKENS_FILE)
+    parser.add_argument('--crawl-index-path', default=CRAWL_INDEX_FILE)
+    args = parser.parse_args()
+
+    if args.build:
+        if not os.path.exists(args.pages_dir):
+            print(f"Ошибка: директория {args.pages_dir} не существует")
+            return 1
+        # Сообщения о построении не должны смешиваться с результатами пакетного поиска
+        with contextlib.redirect_stdout(sys.stderr if args.queries else sys.stdout):
+            searcher = BooleanSearcher.build(args.pages_dir, args.tokens_path, args.index_path,
+                                             args.crawl_index_path)
+        # Только построение индекса
+        if not args.queries:
+            return 0
+    else:
+        try:
+            searcher = BooleanSearcher.load(args.index_path, args.pages_dir, args.crawl_index_path)
+        except FileNotFoundError:
+            print(f"Индекс {args.index_path} не найден: постройте его командой python main.py --build",
+                  file=sys.stderr)
+            return 1
+        print(f"Загружен индекс {args.index_path}: {len(searcher.inverted_index)} токенов, "
+              f"{len(searcher.doc_ids)} документов", file=sys.stderr)
+
+    if args.queries:
+        return 1 if batch_search(searcher, args.queries, args.output, args.workers, args.chunk_size) else 0
+    interactive_search(searcher)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,55 +3,40 @@
 
 import os
 import re
+import sys
 import json
 import math
+import time
 from bs4 import BeautifulSoup
 from collections import Counter, defaultdict
 from tqdm import tqdm
 
-# Пути к файлам
-TOKENS_PATH = "../Задание2/tokens.txt"
-LEMMAS_PATH = "../Задание2/lemmas.txt"
-PAGES_DIR = "../Задание_1/crawler/data/pages"
-INVERTED_INDEX_PATH = "../Задание3/inverted_index.json"
-OUTPUT_DIR = "./results"
+# Общий словарь терминов находится в Задании 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Задание2'))
+from term_dictionary import Lexicon
+from impact_index import ImpactIndex, bm25_impact, bm25f_impact
+from text_tokenizer import words
+
+# Пути к файлам (можно переопределить переменными окружения, см. benchmarks/README.md)
+TOKENS_PATH = os.environ.get("OIP_TOKENS_PATH", "../Задание2/tokens.txt")
+LEMMAS_PATH = os.environ.get("OIP_LEMMAS_PATH", "../Задание2/lemmas.txt")
+PAGES_DIR = os.environ.get("OIP_PAGES_DIR", "../Задание_1/crawler/data/pages")
+INVERTED_INDEX_PATH = os.environ.get("OIP_INDEX_PATH", "../Задание3/inverted_index.json")
+OUTPUT_DIR = os.environ.get("OIP_TF_IDF_DIR", "./results")
+# Компактный словарь токенов и лемм, общий с поисковой системой (Задание 5)
+VOCABULARY_DIR = os.path.join(OUTPUT_DIR, "vocabulary")
+# Квантованные вклады терминов для ранжирования BM25 и BM25F
+IMPACTS_DIR = os.path.join(OUTPUT_DIR, "impacts")
+# Манифест записывается последним: по нему Задание 5 проверяет, что снимок индекса
+# не устарел, не обходя все файлы результатов
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "manifest.json")
 
 # Создаем директорию для результатов, если её нет
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def read_tokens():
-    """Чтение списка токенов из файла"""
-    with open(TOKENS_PATH, 'r', encoding='utf-8') as f:
-        return [line.strip() for line in f if line.strip()]
-
-def read_lemmas():
-    """Чтение словаря лемм из файла"""
-    lemmas_dict = {}  # словарь вида {word_form: lemma}
-    lemma_to_forms = {}  # словарь вида {lemma: [word_forms]}
-    
-    with open(LEMMAS_PATH, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-                
-            parts = line.split(':')
-            if len(parts) != 2:
-                continue
-                
-            lemma = parts[0].strip()
-            forms = parts[1].strip().split()
-            
-            lemma_to_forms[lemma] = forms
-            
-            # Добавляем саму лемму как форму
-            lemmas_dict[lemma] = lemma
-            
-            # Каждой форме соответствует лемма
-            for form in forms:
-                lemmas_dict[form] = lemma
-    
-    return lemmas_dict, lemma_to_forms
+def read_lexicon():
+    """Чтение словаря токенов и лемм из файлов Задания 2"""
+    return Lexicon.from_files(TOKENS_PATH, LEMMAS_PATH)
 
 def read_inverted_index():
     """Чтение инвертированного индекса из файла"""
@@ -62,8 +47,8 @@ def get_page_files():
     """Получение списка файлов страниц"""
     return [f for f in os.listdir(PAGES_DIR) if f.endswith('.html')]
 
-def extract_text_from_html(file_path):
-    """Извлечение текста из HTML-файла"""
+def extract_document(file_path):
+    """Извлечение текста и заголовка из HTML-файла"""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             html_content = f.read()
@@ -73,16 +58,22 @@ def extract_text_from_html(file_path):
         # Удаляем скрипты и стили
         for script in soup(["script", "style"]):
             script.extract()
+        
+        title = soup.title.get_text(separator=' ') if soup.title else ''
             
         # Получаем текст
         text = soup.get_text(separator=' ')
         
         # Чистка текста
         text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        return text, title
     except Exception as e:
         print(f"Ошибка при чтении {file_path}: {e}")
-        return ""
+        return "", ""
+
+def extract_text_from_html(file_path):
+    """Извлечение текста из HTML-файла"""
+    return extract_document(file_path)[0]
 
 def calculate_tf(term, text_tokens):
     """Расчет TF для термина"""
@@ -96,11 +87,54 @@ def calculate_idf(term, total_docs, term_docs):
         return 0
     return math.log10(total_docs / term_docs[term])
 
+def build_impact_indexes(doc_stats, token_docs, total_docs):
+    """
+    Расчет вкладов BM25 и BM25F для каждого вхождения токена и их квантование
+    
+    :param doc_stats: список (page_id, длина текста, длина заголовка, {токен: (tf, tf в заголовке)})
+    :param token_docs: количество документов с каждым токеном
+    :param total_docs: общее количество документов
+    :return: {'bm25': ImpactIndex, 'bm25f': ImpactIndex}
+    """
+    if not doc_stats:
+        return {}
+    avg_length = sum(length for _, length, _, _ in doc_stats) / len(doc_stats)
+    avg_field_lengths = {
+        'body': avg_length,
+        'title': sum(title_length for _, _, title_length, _ in doc_stats) / len(doc_stats),
+    }
+    
+    bm25_postings = defaultdict(list)
+    bm25f_postings = defaultdict(list)
+    for page_id, length, title_length, counts in doc_stats:
+        field_lengths = {'body': length, 'title': title_length}
+        for token, (tf, title_tf) in counts.items():
+            df = token_docs.get(token, 0)
+            if df == 0:
+                continue
+            bm25_postings[token].append(
+                (page_id, bm25_impact(tf, length, avg_length, df, total_docs)))
+            bm25f_postings[token].append(
+                (page_id, bm25f_impact({'body': tf, 'title': title_tf}, field_lengths,
+                                       avg_field_lengths, df, total_docs)))
+    
+    return {
+        'bm25': ImpactIndex.quantize(bm25_postings),
+        'bm25f': ImpactIndex.quantize(bm25f_postings),
+    }
+
+def write_manifest(total_docs):
+    """Запись манифеста результатов (через временный файл, чтобы не оставить недописанный)"""
+    temp_path = f"{MANIFEST_PATH}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'documents': total_docs, 'built_at': time.time()}, f)
+    os.replace(temp_path, MANIFEST_PATH)
+
 def process_documents():
     """Обработка документов и подсчет TF-IDF"""
     print("Чтение данных...")
-    tokens = read_tokens()
-    lemmas_dict, lemma_to_forms = read_lemmas()
+    lexicon = read_lexicon()
+    lemmas_dict = lexicon.lemmas_dict
     inverted_index = read_inverted_index()
     page_files = get_page_files()
     
@@ -122,16 +156,19 @@ def process_documents():
     
     print(f"Обработка {total_docs} документов...")
     
+    # Статистика документов для BM25/BM25F
+    doc_stats = []
+    
     # Обработка каждого документа
     for page_file in tqdm(page_files):
         file_path = os.path.join(PAGES_DIR, page_file)
         page_id = int(page_file.split('_')[1].split('.')[0])  # Извлекаем ID страницы
         
-        # Извлекаем текст из HTML
-        text = extract_text_from_html(file_path)
+        # Извлекаем текст и заголовок из HTML
+        text, title = extract_document(file_path)
         
-        # Токенизация текста (простой подход - разбиение по пробелам)
-        text_tokens = text.lower().split()
+        # Токенизация текста общим токенизатором (знаки препинания не попадают в токены)
+        text_tokens = words(text)
         
         # Подсчитываем частоту каждого токена в документе
         token_counts = Counter(text_tokens)
@@ -146,12 +183,20 @@ def process_documents():
                 lemma = lemmas_dict[token]
                 lemma_counts[lemma] += count
         
+        # Частоты токенов в тексте и в заголовке для BM25/BM25F
+        title_tokens = words(title)
+        title_counts = Counter(title_tokens)
+        doc_stats.append((page_id, total_tokens, len(title_tokens), {
+            token: (count, title_counts.get(token, 0))
+            for token, count in token_counts.items() if token in lexicon.tokens
+        }))
+        
         # Результаты TF-IDF для токенов
         token_results = []
         
-        # Вычисляем TF-IDF для каждого токена из списка
-        for token in tokens:
-            if token in token_counts:
+        # Вычисляем TF-IDF для каждого токена документа, входящего в список
+        for token in token_counts:
+            if token in lexicon.tokens:
                 tf = token_counts[token] / total_tokens
                 idf = calculate_idf(token, total_docs, token_docs)
                 tf_idf = tf * idf
@@ -161,8 +206,8 @@ def process_documents():
         lemma_results = []
         
         # Вычисляем TF-IDF для каждой леммы
-        for lemma in lemma_to_forms:
-            if lemma in lemma_counts:
+        for lemma in lemma_counts:
+            if lemma in lexicon.lemma_to_forms:
                 tf = lemma_counts[lemma] / total_tokens
                 idf = calculate_idf(lemma, total_docs, lemma_docs)
                 tf_idf = tf * idf
@@ -181,6 +226,15 @@ def process_documents():
             for lemma, idf, tf_idf in lemma_results:
                 f.write(f"{lemma} {idf:.6f} {tf_idf:.6f}\n")
     
+    # Сохраняем словарь для поисковой системы (загружается через mmap)
+    lexicon.save(VOCABULARY_DIR)
+    
+    # Вклады терминов для ранжирования BM25 и BM25F
+    for name, impact_index in build_impact_indexes(doc_stats, token_docs, total_docs).items():
+        impact_index.save(os.path.join(IMPACTS_DIR, name))
+    
+    write_manifest(total_docs)
+    
     print("Обработка завершена.")
     print(f"Результаты сохранены в директории: {OUTPUT_DIR}")
 
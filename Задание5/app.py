@@ -1,69 +1,407 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Flask, render_template, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, g, render_template, request, jsonify, stream_with_context
 from search_engine import SearchEngine
+from metrics import MetricsRegistry, SearchProfile
+from reloader import DEFAULT_RELOAD_INTERVAL, IndexReloader, generation_kwargs
+from suggest_index import SUGGEST_TOP_K
+from pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor
+from query_log import QueryLog
+import json
+import os
+import threading
 import time
 
-app = Flask(__name__)
+bp = Blueprint('search', __name__)
 
-# Инициализация поисковой системы
-search_engine = None
+# Ограничения размера страницы /api/search и внутренней страницы потоковой выдачи
+MAX_PAGE_SIZE = 100
+MAX_STREAM_PAGE_SIZE = 10000
 
-@app.route('/')
+
+def get_search_engine() -> SearchEngine:
+    """Возвращает поисковую систему (поколение индекса, закрепленное за запросом)"""
+    generation = g.get('generation')
+    if generation is not None:
+        return generation.engine
+    return current_app.extensions['search_engine']
+
+
+def log_query(started: float, status: int, results: list = None):
+    """
+    Запись запроса в журнал запросов (если журнал включен)
+    
+    :param started: момент начала обработки (time.perf_counter)
+    :param status: HTTP-статус ответа
+    :param results: результаты поиска (None - запрос завершился ошибкой)
+    """
+    query_log = current_app.extensions.get('query_log')
+    if query_log is None:
+        return
+    results = results or []
+    query_log.log({
+        'ts': time.time(),
+        'endpoint': request.path,
+        'q': request.args.get('q', ''),
+        'ranking': request.args.get('ranking', 'tfidf'),
+        # Все параметры строки запроса: по ним replay.py повторяет запрос
+        'params': request.args.to_dict(flat=False),
+        'status': status,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+        'count': len(results),
+        'ids': [result['id'] for result in results]
+    })
+
+
+@bp.before_request
+def require_ready():
+    """Пока индекс загружается в фоне, поисковые маршруты отвечают 503"""
+    if request.endpoint in ('search.health', 'search.ready', 'search.metrics'):
+        return None
+    if current_app.extensions.get('search_engine') is None:
+        return jsonify({'error': 'Index is loading'}), 503
+    # Запрос дорабатывает на поколении индекса, с которым начался
+    reloader = current_app.extensions.get('reloader')
+    if reloader is not None:
+        reloader.start()
+        g.generation = reloader.acquire()
+    return None
+
+
+@bp.teardown_app_request
+def release_generation(exception=None):
+    """
+    Освобождение поколения индекса после завершения запроса
+    
+    Потоковые ответы освобождают поколение сами (см. stream_response): teardown
+    выполняется до того, как тело ответа прочитано.
+    """
+    generation = g.pop('generation', None)
+    if generation is not None:
+        generation.release()
+
+
+def stream_response(lines) -> Response:
+    """
+    Потоковый ответ NDJSON, удерживающий поколение индекса до конца выдачи
+    
+    :param lines: генератор строк ответа
+    :return: ответ; поколение освобождается при его закрытии сервером
+             (после последней строки или при разрыве соединения)
+    """
+    response = Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    generation = g.pop('generation', None)
+    if generation is not None:
+        response.call_on_close(generation.release)
+    return response
+
+
+@bp.route('/')
 def index():
     """Главная страница с формой поиска"""
     return render_template('index.html')
 
-@app.route('/search')
+@bp.route('/search')
 def search():
     """Обработка поискового запроса"""
     # Получаем поисковый запрос из параметров
     query = request.args.get('q', '')
+    ranking = request.args.get('ranking', 'tfidf')
     
     if not query:
         return render_template('search_results.html', query='', results=[], time=0)
     
     # Замеряем время выполнения поиска
     start_time = time.time()
+    started = time.perf_counter()
     
     # Выполняем поиск
-    results = search_engine.search(query)
+    try:
+        results = get_search_engine().search(query, ranking=ranking)
+    except ValueError as e:
+        # Страница поиска показывает ошибку на странице, JSON - только у маршрутов /api/*
+        log_query(started, 400)
+        return render_template('search_results.html', query=query, results=[], time=0,
+                               error=str(e)), 400
     
     # Вычисляем время выполнения
     search_time = time.time() - start_time
+    log_query(started, 200, results)
     
     # Возвращаем шаблон с результатами поиска
-    return render_template('search_results.html', 
-                          query=query, 
-                          results=results, 
+    return render_template('search_results.html',
+                          query=query,
+                          results=results,
                           time=search_time)
 
-@app.route('/api/search')
+def page_args(default_limit: int, max_limit: int):
+    """
+    Параметры страницы результатов из строки запроса: limit, offset, cursor
+    
+    :return: (limit, offset, курсор или None)
+    :raises ValueError: если параметры некорректны
+    """
+    try:
+        limit = int(request.args.get('limit', default_limit))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        raise ValueError('limit and offset must be integers')
+    if not 1 <= limit <= max_limit:
+        raise ValueError(f'limit must be between 1 and {max_limit}')
+    cursor = request.args.get('cursor')
+    return limit, offset, decode_cursor(cursor) if cursor else None
+
+@bp.route('/api/search')
 def api_search():
     """API для поискового запроса"""
     # Получаем поисковый запрос из параметров
     query = request.args.get('q', '')
+    ranking = request.args.get('ranking', 'tfidf')
     
     if not query:
         return jsonify({'error': 'Query is empty'})
     
+    # Профиль запроса: разбивка времени по этапам (?debug=timings) и признак
+    # частичного результата шардированного поиска
+    profile = SearchProfile()
+    started = time.perf_counter()
+    
     # Выполняем поиск
-    results = search_engine.search(query)
+    try:
+        limit, offset, after = page_args(10, MAX_PAGE_SIZE)
+        results = get_search_engine().search(query, top_n=limit, ranking=ranking, profile=profile,
+                                             offset=offset, after=after,
+                                             filters=request.args.getlist('filter'))
+    except ValueError as e:
+        log_query(started, 400)
+        return jsonify({'error': str(e)}), 400
+    log_query(started, 200, results)
     
     # Возвращаем результаты в формате JSON
-    return jsonify({
+    response = {
         'query': query,
+        'ranking': ranking,
         'results': results
-    })
+    }
+    # Курсор следующей страницы (search-after) для лексических ранжирований
+    if len(results) == limit and ranking not in SearchEngine.SEMANTIC_RANKINGS:
+        response['next_cursor'] = encode_cursor(results[-1]['score'], results[-1]['id'])
+    if profile.counters.get('shard_timeouts'):
+        response['partial'] = True
+    if request.args.get('debug') == 'timings':
+        response['timings'] = profile.to_dict()
+    return jsonify(response)
+
+@bp.route('/api/search/stream')
+def api_search_stream():
+    """
+    API потоковой выдачи всех результатов запроса (для выгрузок)
+    
+    Параметры: q, ranking (tfidf, bm25, bm25f), cursor - продолжение выдачи,
+    limit - размер внутренней страницы, with_metadata=1 - заголовок и фрагмент,
+    filter - условие фильтра (параметр можно повторять)
+    Ответ: NDJSON, по одной строке {"id": ..., "score": ..., "cursor": ...} на документ
+    """
+    query = request.args.get('q', '')
+    ranking = request.args.get('ranking', 'tfidf')
+    with_metadata = request.args.get('with_metadata') in ('1', 'true')
+    
+    try:
+        page_size, _, after = page_args(DEFAULT_PAGE_SIZE, MAX_STREAM_PAGE_SIZE)
+        results = get_search_engine().iter_search(query, ranking, page_size, with_metadata, after,
+                                                  filters=request.args.getlist('filter'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        # Курсор каждой строки позволяет продолжить прерванную выгрузку
+        for result in results:
+            result['cursor'] = encode_cursor(result['score'], result['id'])
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+    
+    return stream_response(generate())
 
-def init_search_engine():
-    """Инициализация поисковой системы"""
-    global search_engine
-    search_engine = SearchEngine()
+@bp.route('/api/suggest')
+def api_suggest():
+    """
+    API подсказок запроса (автодополнение последнего слова)
+    
+    Параметры: prefix - начало запроса, limit - количество подсказок
+    """
+    prefix = request.args.get('prefix', '')
+    try:
+        limit = int(request.args.get('limit', SUGGEST_TOP_K))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    return jsonify({'prefix': prefix, 'suggestions': get_search_engine().suggest(prefix, limit)})
+
+@bp.route('/api/search/batch', methods=['POST'])
+def api_search_batch():
+    """
+    API для пакетного поиска
+    
+    Тело запроса: {"queries": [...], "top_n": 10, "with_metadata": false, "ranking": "tfidf",
+    "filters": ["site:habr.com"]}; условия фильтра в тексте запросов тоже учитываются
+    Ответ: NDJSON, по одной строке {"query": ..., "results": [...]} на запрос
+    """
+    payload = request.get_json(silent=True) or {}
+    queries = payload.get('queries')
+    
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return jsonify({'error': 'queries must be a list of strings'}), 400
+    
+    try:
+        top_n = int(payload.get('top_n', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_n must be an integer'}), 400
+    if not 1 <= top_n <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'top_n must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    filters = payload.get('filters', [])
+    if not isinstance(filters, list) or not all(isinstance(f, str) for f in filters):
+        return jsonify({'error': 'filters must be a list of strings'}), 400
+    with_metadata = bool(payload.get('with_metadata', False))
+    ranking = payload.get('ranking', 'tfidf')
+    search_engine = get_search_engine()
+    
+    # Некорректные условия фильтра отклоняются до начала потоковой выдачи
+    try:
+        search_engine.validate_ranking(ranking)
+        for query in queries:
+            search_engine.parse_filters(query, filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        for query, results in search_engine.iter_search_batch(queries, top_n, with_metadata,
+                                                              ranking=ranking, filters=filters):
+            yield json.dumps({'query': query, 'results': results}, ensure_ascii=False) + '\n'
+    
+    return stream_response(generate())
+
+@bp.route('/api/documents', methods=['POST'])
+def api_add_document():
+    """
+    Добавление документа без перестроения индекса
+    
+    Тело запроса: {"html": "<html>...</html>", "id": 123} (id необязателен)
+    Ответ: {"id": ...}; документ сразу доступен для поиска
+    """
+    payload = request.get_json(silent=True) or {}
+    html_content = payload.get('html')
+    doc_id = payload.get('id')
+    
+    if not isinstance(html_content, str) or not html_content.strip():
+        return jsonify({'error': 'html must be a non-empty string'}), 400
+    if doc_id is not None and (not isinstance(doc_id, int) or isinstance(doc_id, bool) or doc_id < 0):
+        return jsonify({'error': 'id must be a non-negative integer'}), 400
+    
+    doc_id = get_search_engine().add_document(html_content, doc_id)
+    return jsonify({'id': doc_id}), 201
+
+@bp.route('/api/documents/<int:doc_id>', methods=['DELETE'])
+def api_delete_document(doc_id: int):
+    """Удаление документа из результатов поиска"""
+    if not get_search_engine().delete_document(doc_id):
+        return jsonify({'error': 'Document not found'}), 404
+    return jsonify({'id': doc_id, 'deleted': True})
+
+@bp.route('/health')
+def health():
+    """Проверка живости процесса (liveness)"""
+    return jsonify({'status': 'ok'})
+
+@bp.route('/metrics')
+def metrics():
+    """Метрики поиска в текстовом формате Prometheus (по процессу-воркеру)"""
+    return Response(current_app.extensions['metrics'].render(),
+                    mimetype='text/plain; version=0.0.4')
+
+@bp.route('/ready')
+def ready():
+    """Проверка готовности (readiness): 200 только после загрузки индекса"""
+    if current_app.extensions.get('search_engine') is None:
+        return jsonify({'status': 'loading'}), 503
+    return jsonify({'status': 'ready'})
+
+def create_app(search_engine: SearchEngine = None,
+               load_in_background: bool = False,
+               generation_pointer: str = None,
+               reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+               query_log: QueryLog = None,
+               metrics_dir: str = None,
+               **engine_kwargs) -> Flask:
+    """
+    Фабрика приложения
+    
+    Индекс загружается один раз при создании приложения. Под gunicorn с
+    preload_app это происходит в мастер-процессе до fork, поэтому все
+    воркеры разделяют загруженные структуры через copy-on-write.
+    
+    :param search_engine: готовая поисковая система (если None - создается новая)
+    :param load_in_background: загружать индекс в фоновом потоке, сразу принимая соединения
+    :param generation_pointer: файл-указатель поколения индекса (см. reloader.py); при его
+                               изменении новое поколение загружается и подменяет текущее
+    :param reload_interval: период проверки указателя в секундах
+    :param query_log: журнал запросов /search и /api/search (None - журнал выключен)
+    :param metrics_dir: общая директория метрик воркеров gunicorn (см. metrics.py); /metrics
+                        отдает сумму по всем воркерам
+    :param engine_kwargs: параметры конструктора SearchEngine
+    :return: приложение Flask
+    """
+    app = Flask(__name__)
+    app.extensions['search_engine'] = None
+    app.extensions['metrics'] = MetricsRegistry(multiprocess_dir=metrics_dir)
+    app.extensions['query_log'] = query_log
+    app.register_blueprint(bp)
+    
+    def load_generation(target):
+        kwargs = dict(engine_kwargs, **generation_kwargs(target))
+        return SearchEngine(metrics=app.extensions['metrics'], **kwargs)
+    
+    def swap(generation):
+        app.extensions['search_engine'] = generation.engine
+    
+    def load():
+        if generation_pointer:
+            reloader = IndexReloader(generation_pointer, load_generation, app.extensions['metrics'],
+                                     interval=reload_interval, on_swap=swap)
+            reloader.load_current()
+            app.extensions['reloader'] = reloader
+            return
+        
+        engine = search_engine
+        if engine is None:
+            print("Инициализация поисковой системы...")
+            engine = SearchEngine(**engine_kwargs)
+        # Поиск записывает время этапов в реестр приложения
+        if engine.metrics is None:
+            engine.metrics = app.extensions['metrics']
+        app.extensions['metrics'] = engine.metrics
+        # Флаг готовности переключается только после полной загрузки индекса
+        app.extensions['search_engine'] = engine
+    
+    if load_in_background:
+        threading.Thread(target=load, name='index-loader', daemon=True).start()
+    else:
+        load()
+    return app
 
 if __name__ == '__main__':
-    print("Инициализация поисковой системы...")
-    init_search_engine()
+    # Локальный запуск без отладчика и перезагрузчика (иначе индекс грузится дважды).
+    # Для продакшена используйте gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+    query_log_dir = os.environ.get('SEARCH_QUERY_LOG')
+    app = create_app(snapshot_path=os.environ.get('SEARCH_SNAPSHOT', 'index.snapshot'),
+                     generation_pointer=os.environ.get('SEARCH_GENERATION_POINTER'),
+                     query_log=QueryLog(query_log_dir) if query_log_dir else None,
+                     shards_dir=os.environ.get('SEARCH_SHARDS'),
+                     shard_timeout=float(os.environ.get('SEARCH_SHARD_TIMEOUT', 1.0)),
+                     documents_log=os.environ.get('SEARCH_DOCUMENTS_LOG', 'live_documents.jsonl'),
+                     suggest_queries=os.environ.get('SEARCH_SUGGEST_QUERIES'))
     print("Запуск веб-сервера...")
-    app.run(debug=True) 
\ No newline at end of file
+    app.run(host=os.environ.get('HOST', '127.0.0.1'),
+            port=int(os.environ.get('PORT', 5000)),
+            debug=False,
+            use_reloader=False,
+            threaded=True)
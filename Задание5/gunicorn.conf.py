@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+# Конфигурация gunicorn для поисковой системы.
+# Все параметры можно переопределить переменными окружения.
+
+import glob
+import multiprocessing
+import os
+import sys
+import tempfile
+
+# Рабочая директория - папка приложения (пути к индексам в SearchEngine относительные)
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+
+# Загружаем приложение (и индекс) в мастер-процессе до fork. С указателем поколения
+# (SEARCH_GENERATION_POINTER) каждый воркер загружает текущее поколение сам: мастер не
+# следит за указателем, и поколение, загруженное в нем, занимало бы память до остановки
+# сервиса. Снимок читается через mmap, поэтому его страницы все равно общие для воркеров
+preload_app = not os.environ.get('SEARCH_GENERATION_POINTER')
+
+workers = int(os.environ.get('WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('THREADS', 4))
+worker_class = 'gthread'
+
+timeout = int(os.environ.get('TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Перезапуск воркеров для защиты от утечек памяти
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = 500
+
+accesslog = os.environ.get('ACCESS_LOG', None)
+errorlog = '-'
+
+# Метрики воркеров сохраняются в общую директорию, /metrics отдает их сумму (см. metrics.py).
+# Директория очищается при запуске сервиса: значения прошлого запуска не должны попасть в суммы
+metrics_dir = os.environ.setdefault('SEARCH_METRICS_DIR',
+                                    os.path.join(tempfile.gettempdir(), f"search-metrics-{os.getpid()}"))
+
+
+def on_starting(server):
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    # Счетчики завершившегося воркера (в том числе после max_requests) сохраняются в archive.json
+    sys.path.insert(0, chdir)
+    from metrics import mark_process_dead
+    mark_process_dead(metrics_dir, worker.pid)
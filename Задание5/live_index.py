@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Добавление и удаление документов без перестроения индекса
+
+Новые документы записываются в небольшие неизменяемые сегменты в памяти и
+становятся доступны для поиска сразу после добавления. Удаление оставляет
+надгробие (tombstone) с номером операции: документ скрыт во всех сегментах и
+в основном индексе, если его версия старше надгробия. Фоновый поток сливает
+сегменты одного размерного уровня (по MERGE_FACTOR штук) в один, отбрасывая
+удаленные документы.
+
+Операции можно записывать в журнал (JSON Lines): каждый процесс-воркер
+перед поиском применяет новые записи журнала, поэтому все воркеры видят одни
+и те же документы, а после перезапуска документы восстанавливаются из журнала.
+"""
+
+import fcntl
+import json
+import math
+import os
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from pagination import Cursor, after_mask, top_order
+from term_dictionary import TermDictionary
+from text_tokenizer import words
+
+# Количество сегментов одного уровня, после которого они сливаются
+MERGE_FACTOR = 10
+
+
+class LiveDocument:
+    """
+    Документ, добавленный после построения индекса
+    """
+    __slots__ = ('doc_id', 'sequence', 'title', 'text', 'vector')
+
+    def __init__(self, doc_id: int, sequence: int, title: str, text: str, vector: Dict[str, float]):
+        """
+        :param doc_id: ID документа
+        :param sequence: номер операции добавления
+        :param title: заголовок
+        :param text: текст (для фрагментов)
+        :param vector: нормированный вектор TF-IDF {термин: вес}
+        """
+        self.doc_id = doc_id
+        self.sequence = sequence
+        self.title = title
+        self.text = text
+        self.vector = vector
+
+
+class Segment:
+    """
+    Неизменяемый сегмент: матрица термин × документ в формате CSR
+    """
+    def __init__(self, documents: List[LiveDocument]):
+        """
+        :param documents: документы сегмента
+        """
+        self.documents = documents
+        self.doc_ids = np.array([document.doc_id for document in documents], dtype=np.int64)
+        self.sequences = np.array([document.sequence for document in documents], dtype=np.int64)
+
+        term_postings = defaultdict(list)
+        for position, document in enumerate(documents):
+            for term, weight in document.vector.items():
+                term_postings[term].append((position, weight))
+
+        self.terms = TermDictionary.from_terms(term_postings)
+        offsets = [0]
+        docs = []
+        weights = []
+        for term in self.terms:
+            postings = term_postings[term]
+            docs.extend(position for position, _ in postings)
+            weights.extend(weight for _, weight in postings)
+            offsets.append(len(docs))
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.docs = np.array(docs, dtype=np.int32)
+        self.weights = np.array(weights, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def document_frequency(self, term: str) -> int:
+        """Количество документов сегмента с термином (с учетом удаленных)"""
+        term_id = self.terms.get(term)
+        return 0 if term_id is None else int(self.offsets[term_id + 1] - self.offsets[term_id])
+
+    def score(self, query_vector: Dict[str, float]) -> Tuple[np.ndarray, int]:
+        """
+        Оценки документов сегмента
+
+        :param query_vector: нормированный вектор запроса
+        :return: (оценки в порядке документов сегмента, количество просмотренных вхождений)
+        """
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        scanned = 0
+        for term, weight in query_vector.items():
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.docs[start:end]] += np.float32(weight) * self.weights[start:end]
+            scanned += int(end - start)
+        return scores, scanned
+
+
+class DocumentLog:
+    """
+    Журнал операций с документами в формате JSON Lines
+
+    Запись выполняется под файловой блокировкой, поэтому журнал можно делить
+    между процессами; каждый читатель помнит, до какого места он дочитал.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: путь к файлу журнала
+        """
+        self.path = path
+        self._offset = 0
+        self._size = -1
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Монопольная блокировка журнала между процессами"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append(self, entry: Dict):
+        """Добавление записи (вызывается под блокировкой locked)"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def changed(self) -> bool:
+        """Журнал изменился с последнего чтения"""
+        try:
+            return os.path.getsize(self.path) != self._size
+        except OSError:
+            return False
+
+    def read_new(self) -> List[Dict]:
+        """Записи, добавленные с последнего чтения (незавершенная строка не читается)"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return []
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        self._size = self._offset if end == len(data) else -1
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError as e:
+                print(f"Ошибка в журнале документов {self.path}: {e}")
+        return entries
+
+
+class LiveIndex:
+    """
+    Сегменты добавленных документов и надгробия удаленных
+    """
+    def __init__(self, base_doc_ids: np.ndarray,
+                 vectorize: Callable[[str, 'LiveIndex'], Tuple[str, str, Dict[str, float]]],
+                 log_path: Optional[str] = None):
+        """
+        :param base_doc_ids: отсортированные ID документов основного индекса
+        :param vectorize: функция (HTML, индекс) -> (заголовок, текст, вектор TF-IDF)
+        :param log_path: путь к журналу операций (None - документы только в памяти процесса)
+        """
+        self.base_doc_ids = base_doc_ids
+        self.vectorize = vectorize
+        self.log = DocumentLog(log_path) if log_path else None
+        self._lock = threading.RLock()
+        self._merge_condition = threading.Condition(self._lock)
+        self._merge_pid = None
+        self._closed = False
+        # Состояние заменяется целиком (копирование при записи), поэтому
+        # поиск читает его без блокировки
+        self.segments: Tuple[Segment, ...] = ()
+        self.base_deleted: Optional[np.ndarray] = None
+        self._tombstones: Dict[int, int] = {}
+        self._documents: Dict[int, LiveDocument] = {}
+        self._sequence = 0
+        self.sync()
+
+    def __len__(self) -> int:
+        """Количество добавленных документов, доступных для поиска"""
+        return len(self._documents)
+
+    @property
+    def active(self) -> bool:
+        """Есть добавленные или удаленные документы"""
+        return bool(self.segments) or self.base_deleted is not None
+
+    def _base_position(self, doc_id: int) -> Optional[int]:
+        """Позиция документа в основном индексе"""
+        position = int(np.searchsorted(self.base_doc_ids, doc_id))
+        if position < len(self.base_doc_ids) and self.base_doc_ids[position] == doc_id:
+            return position
+        return None
+
+    def contains(self, doc_id: int) -> bool:
+        """Документ доступен для поиска"""
+        if doc_id in self._documents:
+            return True
+        position = self._base_position(doc_id)
+        return position is not None and (self.base_deleted is None or not self.base_deleted[position])
+
+    def document(self, doc_id: int) -> Optional[LiveDocument]:
+        """Добавленный документ (None для документов основного индекса)"""
+        return self._documents.get(doc_id)
+
+    def document_frequency(self, term: str) -> int:
+        """Количество добавленных документов с термином"""
+        return sum(segment.document_frequency(term) for segment in self.segments)
+
+    def next_doc_id(self) -> int:
+        """Следующий свободный ID документа"""
+        base_max = int(self.base_doc_ids[-1]) if len(self.base_doc_ids) else 0
+        return max([base_max, *self._documents, *self._tombstones]) + 1
+
+    def add(self, html: str, doc_id: Optional[int] = None) -> int:
+        """
+        Добавление документа (существующий документ с тем же ID заменяется)
+
+        :param html: HTML-код документа
+        :param doc_id: ID документа (None - следующий свободный)
+        :return: ID документа
+        """
+        with self._lock, self._log_lock():
+            self.sync()
+            doc_id = self.next_doc_id() if doc_id is None else int(doc_id)
+            self._commit({'op': 'add', 'id': doc_id, 'html': html})
+        return doc_id
+
+    def delete(self, doc_id: int) -> bool:
+        """
+        Удаление документа
+
+        :param doc_id: ID документа
+        :return: True, если документ был доступен для поиска
+        """
+        with self._lock, self._log_lock():
+            self.sync()
+            if not self.contains(doc_id):
+                return False
+            self._commit({'op': 'delete', 'id': int(doc_id)})
+        return True
+
+    @contextmanager
+    def _log_lock(self) -> Iterator[None]:
+        """Блокировка журнала (если он есть)"""
+        if self.log is None:
+            yield
+        else:
+            with self.log.locked():
+                yield
+
+    def _commit(self, entry: Dict):
+        """Запись операции в журнал и применение ее к индексу"""
+        if self.log is not None:
+            self.log.append(entry)
+            self.sync()
+        else:
+            self._apply(entry)
+
+    def sync(self):
+        """Применение новых записей журнала (вызывается перед поиском)"""
+        if self.log is None or not self.log.changed():
+            return
+        with self._lock:
+            for entry in self.log.read_new():
+                self._apply(entry)
+
+    def _apply(self, entry: Dict):
+        """Применение операции (вызывается под блокировкой)"""
+        doc_id = int(entry['id'])
+        self._sequence += 1
+        self._tombstones[doc_id] = self._sequence
+        self._documents.pop(doc_id, None)
+        position = self._base_position(doc_id)
+        if position is not None and (self.base_deleted is None or not self.base_deleted[position]):
+            base_deleted = (np.zeros(len(self.base_doc_ids), dtype=bool) if self.base_deleted is None
+                            else self.base_deleted.copy())
+            base_deleted[position] = True
+            self.base_deleted = base_deleted
+        if entry['op'] != 'add':
+            return
+
+        self._sequence += 1
+        title, text, vector = self.vectorize(entry['html'], self)
+        document = LiveDocument(doc_id, self._sequence, title, text, vector)
+        self._documents[doc_id] = document
+        self.segments = self.segments + (Segment([document]),)
+        self._start_merger()
+        self._merge_condition.notify()
+
+    def _is_deleted(self, segment: Segment, positions: np.ndarray) -> np.ndarray:
+        """Маска удаленных документов сегмента (версия старше надгробия)"""
+        tombstones = self._tombstones
+        return np.array([tombstones.get(int(segment.doc_ids[position]), -1) >= segment.sequences[position]
+                         for position in positions], dtype=bool)
+
+    def search(self, query_vector: Dict[str, float], top_n: int,
+               after: Optional[Cursor] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Top_n добавленных документов по косинусному сходству
+
+        :param query_vector: нормированный вектор запроса TF-IDF
+        :param top_n: количество результатов
+        :param after: курсор (оценка, ID документа): только документы после него в выдаче
+        :return: (ID документов, оценки по убыванию, количество просмотренных вхождений)
+        """
+        doc_ids = []
+        scores = []
+        scanned = 0
+        for segment in self.segments:
+            segment_scores, segment_scanned = segment.score(query_vector)
+            scanned += segment_scanned
+            matched = np.flatnonzero(segment_scores > 0)
+            if len(matched):
+                matched = matched[~self._is_deleted(segment, matched)]
+            if after is not None:
+                matched = matched[after_mask(segment_scores[matched], segment.doc_ids[matched], after)]
+            doc_ids.append(segment.doc_ids[matched])
+            scores.append(segment_scores[matched])
+        if not doc_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), scanned
+
+        doc_ids = np.concatenate(doc_ids)
+        scores = np.concatenate(scores)
+        order = top_order(scores, doc_ids, top_n)
+        return doc_ids[order], scores[order], scanned
+
+    def _start_merger(self):
+        """Запуск потока слияния в текущем процессе (после fork поток нужно запускать заново)"""
+        if self._merge_pid == os.getpid():
+            return
+        self._merge_pid = os.getpid()
+        threading.Thread(target=self._merge_loop, name='segment-merger', daemon=True).start()
+
+    def _merge_candidates(self) -> List[Segment]:
+        """Сегменты уровня, в котором набралось MERGE_FACTOR сегментов"""
+        tiers = defaultdict(list)
+        for segment in self.segments:
+            tiers[int(math.log(max(len(segment), 1), MERGE_FACTOR))].append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= MERGE_FACTOR:
+                return tiers[tier][:MERGE_FACTOR]
+        return []
+
+    def _merge_loop(self):
+        """Фоновое слияние сегментов"""
+        while True:
+            with self._merge_condition:
+                self._merge_condition.wait_for(lambda: self._closed or bool(self._merge_candidates()))
+                if self._closed:
+                    return
+                candidates = self._merge_candidates()
+                tombstones = dict(self._tombstones)
+
+            # Слияние выполняется без блокировки: поиск и добавление продолжаются
+            documents = [document for segment in candidates for document in segment.documents
+                         if tombstones.get(document.doc_id, -1) < document.sequence]
+            merged = Segment(documents)
+
+            with self._lock:
+                merged_ids = {id(segment) for segment in candidates}
+                remaining = tuple(segment for segment in self.segments if id(segment) not in merged_ids)
+                self.segments = (merged,) + remaining if len(merged) else remaining
+
+    def close(self):
+        """Остановка потока слияния (индекс больше не используется)"""
+        with self._merge_condition:
+            self._closed = True
+            self._merge_condition.notify_all()
+
+
+def document_vector(text: str, idf: Callable[[str], Optional[float]]) -> Dict[str, float]:
+    """
+    Нормированный вектор TF-IDF документа (как в Задании 4: TF = частота / длина текста)
+
+    :param text: текст документа
+    :param idf: функция термин -> IDF (None - термин не индексируется)
+    :return: {термин: вес}, длина вектора равна 1
+    """
+    text_tokens = words(text)
+    vector = {}
+    for token, count in Counter(text_tokens).items():
+        token_idf = idf(token)
+        if token_idf:
+            vector[token] = count / len(text_tokens) * token_idf
+    length = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {token: weight / length for token, weight in vector.items()} if length > 0 else {}
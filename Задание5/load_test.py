@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Нагрузочный тест поискового API
+
+Пример:
+    python load_test.py --url http://127.0.0.1:8000 --concurrency 16 --requests 2000
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+DEFAULT_QUERIES = [
+    'поисковая система',
+    'информационный поиск',
+    'язык программирования python',
+    'протокол http',
+    'векторная модель',
+    'инвертированный индекс',
+    'html разметка',
+    'википедия',
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Перцентиль по методу ближайшего ранга
+    
+    :param values: отсортированный список значений
+    :param p: перцентиль (0-100)
+    :return: значение перцентиля
+    """
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(p / 100 * len(values))) - 1))
+    return values[rank]
+
+
+def wait_until_ready(base_url: str, timeout: float) -> bool:
+    """Ожидание, пока /ready не вернет 200"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def load_queries(path: str) -> List[str]:
+    """Загрузка запросов из файла (по одному на строку)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def run(base_url: str, queries: List[str], total_requests: int, concurrency: int) -> dict:
+    """
+    Выполнение нагрузочного теста
+    
+    :param base_url: адрес сервиса
+    :param queries: список запросов
+    :param total_requests: общее количество запросов
+    :param concurrency: количество параллельных клиентов
+    :return: отчет с QPS и перцентилями задержки
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    rng = random.Random(42)
+    plan = [rng.choice(queries) for _ in range(total_requests)]
+    
+    def worker(query: str):
+        nonlocal errors
+        url = f"{base_url}/api/search?q={urllib.parse.quote(query)}"
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        except Exception:
+            with lock:
+                errors += 1
+    
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, plan))
+    wall_time = time.perf_counter() - start_time
+    
+    latencies.sort()
+    return {
+        'requests': total_requests,
+        'errors': errors,
+        'concurrency': concurrency,
+        'wall_time_s': round(wall_time, 3),
+        'qps': round(len(latencies) / wall_time, 1) if wall_time > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест /api/search')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='адрес сервиса')
+    parser.add_argument('--requests', type=int, default=1000, help='общее количество запросов')
+    parser.add_argument('--concurrency', type=int, default=8, help='параллельные клиенты')
+    parser.add_argument('--queries', help='файл с запросами (по одному на строку)')
+    parser.add_argument('--ready-timeout', type=float, default=120, help='ожидание готовности, сек')
+    args = parser.parse_args()
+    
+    base_url = args.url.rstrip('/')
+    if not wait_until_ready(base_url, args.ready_timeout):
+        print(f"Сервис {base_url} не готов")
+        return 1
+    
+    queries = load_queries(args.queries) if args.queries else DEFAULT_QUERIES
+    report = run(base_url, queries, args.requests, args.concurrency)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Метрики поискового пути: время этапов и счетчики
+
+Профиль запроса (SearchProfile) хранится в переменной контекста, поэтому
+этапы и счетчики отмечаются в любом месте SearchEngine функциями stage() и
+increment() без передачи профиля через параметры. Вне профилирования эти функции
+сводятся к одному чтению ContextVar.
+
+MetricsRegistry накапливает профили в гистограммы и счетчики и отдает их
+в текстовом формате Prometheus (без зависимости от prometheus_client).
+
+Под gunicorn каждый воркер считает метрики сам, а запрос /metrics попадает в
+случайный воркер. В многопроцессном режиме (multiprocess_dir, как multiprocess
+mode prometheus_client) каждый процесс периодически сохраняет свое состояние в
+файл metrics_<pid>.json общей директории, а /metrics суммирует файлы всех
+процессов: счетчики и гистограммы складываются, значения (gauge) получают метку
+pid. Состояние завершившегося воркера переносится в archive.json функцией
+mark_process_dead (хук child_exit в gunicorn.conf.py), поэтому суммы не убывают.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Счетчики поиска
+COUNTERS = ('postings_scanned', 'documents_scored', 'html_files_opened', 'shard_timeouts',
+            'tier1_hits', 'tier1_fallbacks')
+# Границы корзин гистограмм задержки (секунды)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Границы корзин гистограммы времени перезагрузки индекса (секунды)
+RELOAD_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Период сохранения состояния процесса в многопроцессном режиме (секунды)
+DEFAULT_WRITE_INTERVAL = 1.0
+# Накопленное состояние завершившихся процессов
+ARCHIVE_FILE = 'archive.json'
+
+_current_profile: ContextVar[Optional['SearchProfile']] = ContextVar('search_profile', default=None)
+
+
+class SearchProfile:
+    """
+    Время этапов и счетчики одного поискового запроса
+    """
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.total = 0.0
+
+    def add_time(self, stage_name: str, seconds: float):
+        """Добавление времени этапа (этап может выполняться несколько раз)"""
+        self.timings[stage_name] = self.timings.get(stage_name, 0.0) + seconds
+
+    def count(self, counter: str, value: int = 1):
+        """Увеличение счетчика"""
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self) -> Dict[str, object]:
+        """Разбивка для ответа API (время в миллисекундах)"""
+        return {
+            'total_ms': round(self.total * 1000, 3),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in self.timings.items()},
+            'counters': dict(self.counters),
+        }
+
+
+@contextmanager
+def stage(stage_name: str) -> Iterator[None]:
+    """
+    Замер этапа в текущем профиле (ничего не делает вне профилирования)
+
+    :param stage_name: имя этапа
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_time(stage_name, time.perf_counter() - start)
+
+
+def increment(counter: str, value: int = 1):
+    """
+    Увеличение счетчика текущего профиля (ничего не делает вне профилирования)
+
+    :param counter: имя счетчика
+    :param value: приращение
+    """
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.count(counter, value)
+
+
+@contextmanager
+def profiling(registry: Optional['MetricsRegistry'] = None,
+              profile: Optional[SearchProfile] = None,
+              **labels: str) -> Iterator[Optional[SearchProfile]]:
+    """
+    Профилирование поискового запроса
+
+    Если нет ни реестра, ни профиля, профилирование выключено.
+
+    :param registry: реестр, в который записывается профиль по завершении
+    :param profile: профиль для заполнения (например, для ответа ?debug=timings)
+    :param labels: метки запроса (например, ranking)
+    :return: профиль или None
+    """
+    if registry is None and profile is None:
+        yield None
+        return
+    profile = profile if profile is not None else SearchProfile()
+    token = _current_profile.set(profile)
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.total += time.perf_counter() - start
+        _current_profile.reset(token)
+        if registry is not None:
+            registry.record(profile, **labels)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """Метки в формате Prometheus: {name="value",...}"""
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Число в формате Prometheus"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Гистограмма с метками (кумулятивные корзины, как в Prometheus)
+    """
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # метки -> (количество по корзинам, сумма, количество)
+        self._series: Dict[Tuple[Tuple[str, str], ...], List] = {}
+
+    def observe(self, value: float, labels: Tuple[Tuple[str, str], ...] = ()):
+        """Добавление наблюдения (вызывается под блокировкой реестра)"""
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def reset(self):
+        """Удаление всех серий (вызывается под блокировкой реестра)"""
+        self._series.clear()
+
+    def state(self) -> List:
+        """Серии для сохранения в файл процесса: [метки, корзины, сумма, количество]"""
+        return [[list(labels), list(bucket_counts), total, observations]
+                for labels, (bucket_counts, total, observations) in self._series.items()]
+
+    def merge(self, state: List):
+        """Добавление серий из файла процесса"""
+        for labels, bucket_counts, total, observations in state:
+            labels = tuple(tuple(label) for label in labels)
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bucket_count in enumerate(bucket_counts[:len(self.buckets)]):
+                series[0][i] += bucket_count
+            series[1] += total
+            series[2] += observations
+
+    def render(self) -> List[str]:
+        """Строки текстового формата Prometheus"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (bucket_counts, total, observations) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (('le', _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {observations}")
+        return lines
+
+
+class CounterMetric:
+    """
+    Монотонный счетчик с метками
+    """
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Tuple[Tuple[str, str], ...], int] = {}
+
+    def inc(self, value: int = 1, labels: Tuple[Tuple[str, str], ...] = ()):
+        """Увеличение счетчика (вызывается под блокировкой реестра)"""
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def reset(self):
+        """Удаление всех серий (вызывается под блокировкой реестра)"""
+        self._values.clear()
+
+    def state(self) -> List:
+        """Серии для сохранения в файл процесса: [метки, значение]"""
+        return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, state: List):
+        """Добавление серий из файла процесса"""
+        for labels, value in state:
+            self.inc(value, tuple(tuple(label) for label in labels))
+
+    def render(self) -> List[str]:
+        """Строки текстового формата Prometheus"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """
+    Текущее значение с метками
+    """
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def set(self, value: float, labels: Tuple[Tuple[str, str], ...] = ()):
+        """Установка значения (вызывается под блокировкой реестра)"""
+        self._values[labels] = value
+
+    def remove(self, labels: Tuple[Tuple[str, str], ...] = ()):
+        """Удаление серии (вызывается под блокировкой реестра)"""
+        self._values.pop(labels, None)
+
+    def state(self) -> List:
+        """Серии для сохранения в файл процесса: [метки, значение]"""
+        return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, state: List, pid: str):
+        """Серии из файла процесса с меткой pid (значения процессов не складываются)"""
+        for labels, value in state:
+            self.set(value, tuple(tuple(label) for label in labels) + (('pid', pid),))
+
+    def render(self) -> List[str]:
+        """Строки текстового формата Prometheus"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+def _read_state(path: str) -> Optional[Dict]:
+    """Состояние процесса из файла (None, если файл удален или недописан)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(path: str, state: Dict):
+    """Атомарная запись состояния (через временный файл)"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+def mark_process_dead(directory: str, pid: int, prefix: str = 'search'):
+    """
+    Перенос счетчиков и гистограмм завершившегося процесса в archive.json
+
+    Вызывается в мастер-процессе gunicorn (хук child_exit); значения (gauge)
+    процесса отбрасываются.
+
+    :param directory: директория многопроцессного режима
+    :param pid: идентификатор завершившегося процесса
+    :param prefix: префикс имен метрик
+    """
+    path = os.path.join(directory, f"metrics_{pid}.json")
+    state = _read_state(path)
+    if state is None:
+        return
+    archive = MetricsRegistry(prefix)
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archived = _read_state(archive_path)
+    if archived is not None:
+        archive.merge(archived)
+    archive.merge(dict(state, gauges={}))
+    _write_state(archive_path, archive.state())
+    os.remove(path)
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик поиска одного процесса
+    """
+    def __init__(self, prefix: str = 'search', multiprocess_dir: Optional[str] = None,
+                 write_interval: float = DEFAULT_WRITE_INTERVAL):
+        """
+        :param prefix: префикс имен метрик
+        :param multiprocess_dir: общая директория процессов сервиса (None - метрики только
+                                 этого процесса)
+        :param write_interval: период сохранения состояния процесса в секундах
+        """
+        self._lock = threading.Lock()
+        self.prefix = prefix
+        self.multiprocess_dir = multiprocess_dir
+        self.write_interval = write_interval
+        self._writer_pid = None
+        self.request_latency = Histogram(f"{prefix}_request_duration_seconds",
+                                         'Search request latency')
+        self.stage_latency = Histogram(f"{prefix}_stage_duration_seconds",
+                                       'Search stage latency')
+        self.requests = CounterMetric(f"{prefix}_requests_total", 'Search requests')
+        self.counters = {name: CounterMetric(f"{prefix}_{name}_total", f"Search {name.replace('_', ' ')}")
+                         for name in COUNTERS}
+        self.reload_latency = Histogram(f"{prefix}_index_reload_duration_seconds",
+                                        'Index generation load time', RELOAD_BUCKETS)
+        self.reloads = CounterMetric(f"{prefix}_index_reloads_total", 'Index generation loads')
+        self.generation_bytes = Gauge(f"{prefix}_index_generation_bytes",
+                                      'Memory of loaded index generations')
+
+    def record(self, profile: SearchProfile, **labels: str):
+        """
+        Запись профиля запроса
+
+        :param profile: профиль
+        :param labels: метки запроса
+        """
+        label_items = tuple(sorted(labels.items()))
+        self._start_writer()
+        with self._lock:
+            self.requests.inc(1, label_items)
+            self.request_latency.observe(profile.total, label_items)
+            for stage_name, seconds in profile.timings.items():
+                self.stage_latency.observe(seconds, (('stage', stage_name),))
+            for counter, value in profile.counters.items():
+                if counter not in self.counters:
+                    self.counters[counter] = CounterMetric(f"{self.prefix}_{counter}_total", counter)
+                self.counters[counter].inc(value)
+
+    def record_reload(self, seconds: float, success: bool):
+        """
+        Запись загрузки поколения индекса
+
+        :param seconds: время загрузки
+        :param success: загрузка завершилась успешно
+        """
+        self._start_writer()
+        with self._lock:
+            self.reloads.inc(1, (('result', 'success' if success else 'failure'),))
+            if success:
+                self.reload_latency.observe(seconds)
+
+    def set_generation_bytes(self, generation: str, nbytes: Optional[int]):
+        """
+        Память поколения индекса
+
+        :param generation: имя поколения
+        :param nbytes: размер в байтах (None - поколение выгружено)
+        """
+        labels = (('generation', generation),)
+        self._start_writer()
+        with self._lock:
+            if nbytes is None:
+                self.generation_bytes.remove(labels)
+            else:
+                self.generation_bytes.set(nbytes, labels)
+
+    def _metrics(self) -> Dict[str, object]:
+        """Все метрики реестра по именам"""
+        metrics = [self.requests, self.request_latency, self.stage_latency, self.reloads,
+                   self.reload_latency, self.generation_bytes] + list(self.counters.values())
+        return {metric.name: metric for metric in metrics}
+
+    def state(self) -> Dict[str, Dict[str, List]]:
+        """Состояние реестра для файла процесса"""
+        state = {'counters': {}, 'histograms': {}, 'gauges': {}}
+        with self._lock:
+            for name, metric in self._metrics().items():
+                kind = ('histograms' if isinstance(metric, Histogram) else
+                        'gauges' if isinstance(metric, Gauge) else 'counters')
+                state[kind][name] = metric.state()
+        return state
+
+    def merge(self, state: Dict[str, Dict[str, List]], pid: str = ''):
+        """
+        Добавление состояния другого процесса
+
+        :param state: состояние (см. state)
+        :param pid: процесс, которому принадлежат значения (gauge)
+        """
+        with self._lock:
+            metrics = self._metrics()
+            for name, series in state.get('counters', {}).items():
+                if name not in metrics:
+                    counter = name[len(self.prefix) + 1:-len('_total')]
+                    metrics[name] = self.counters[counter] = CounterMetric(name, counter)
+                metrics[name].merge(series)
+            for name, series in state.get('histograms', {}).items():
+                if name in metrics:
+                    metrics[name].merge(series)
+            for name, series in state.get('gauges', {}).items():
+                if name in metrics:
+                    metrics[name].merge(series, pid)
+
+    def _start_writer(self):
+        """
+        Запуск потока сохранения состояния в текущем процессе (многопроцессный режим)
+
+        Значения, унаследованные через fork, принадлежат родительскому процессу и
+        сбрасываются, иначе они были бы учтены в сумме один раз на каждый воркер.
+        """
+        if self.multiprocess_dir is None or self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            if self._writer_pid is not None:
+                self._reset()
+            self._writer_pid = os.getpid()
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+        threading.Thread(target=self._write_loop, name='metrics-writer', daemon=True).start()
+
+    def _reset(self):
+        """Сброс счетчиков и гистограмм (вызывается под блокировкой реестра)"""
+        for metric in self._metrics().values():
+            if not isinstance(metric, Gauge):
+                metric.reset()
+
+    def _write_loop(self):
+        """Периодическое сохранение состояния процесса"""
+        while True:
+            time.sleep(self.write_interval)
+            try:
+                self.write_state()
+            except Exception as e:
+                print(f"Ошибка при сохранении метрик: {e}")
+
+    def write_state(self):
+        """Сохранение состояния процесса в файл metrics_<pid>.json"""
+        _write_state(os.path.join(self.multiprocess_dir, f"metrics_{os.getpid()}.json"), self.state())
+
+    def render(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus
+
+        В многопроцессном режиме - сумма состояний всех процессов сервиса
+        (состояние текущего процесса сохраняется перед чтением).
+        """
+        if self.multiprocess_dir is None:
+            return self._render()
+        self._start_writer()
+        self.write_state()
+        total = MetricsRegistry(self.prefix)
+        for file_name in sorted(os.listdir(self.multiprocess_dir)):
+            if not file_name.endswith('.json'):
+                continue
+            state = _read_state(os.path.join(self.multiprocess_dir, file_name))
+            if state is not None:
+                pid = file_name[len('metrics_'):-len('.json')] if file_name.startswith('metrics_') else ''
+                total.merge(state, pid)
+        return total._render()
+
+    def _render(self) -> str:
+        """Метрики реестра в текстовом формате Prometheus"""
+        with self._lock:
+            lines = self.requests.render()
+            lines += self.request_latency.render()
+            lines += self.stage_latency.render()
+            for counter in self.counters.values():
+                lines += counter.render()
+            lines += self.reloads.render()
+            lines += self.reload_latency.render()
+            lines += self.generation_bytes.render()
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Постраничная выдача результатов поиска (search-after)
+
+Результаты упорядочены по убыванию оценки, при равных оценках - по
+возрастанию ID документа; это полный порядок, поэтому следующая страница
+однозначно задается последним результатом предыдущей: курсор (оценка, ID).
+Страница выбирается частичной сортировкой документов после курсора
+(O(n + k log k)), а не полной сортировкой всех предыдущих страниц, поэтому
+страница 500 стоит столько же, сколько первая.
+
+Курсор передается клиенту непрозрачной строкой (base64url).
+"""
+
+import base64
+import binascii
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Курсор: (оценка последнего результата, ID его документа)
+Cursor = Tuple[float, int]
+
+# Размер страницы потоковой выдачи по умолчанию
+DEFAULT_PAGE_SIZE = 1000
+
+
+def encode_cursor(score: float, doc_id: int) -> str:
+    """
+    Курсор следующей страницы после результата
+
+    :param score: оценка результата (float32 и float64 представляются в float без потерь)
+    :param doc_id: ID документа
+    :return: непрозрачная строка курсора
+    """
+    return base64.urlsafe_b64encode(f"{float(score)!r}:{int(doc_id)}".encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """
+    Разбор строки курсора
+
+    :param cursor: строка, полученная от encode_cursor
+    :return: (оценка, ID документа)
+    :raises ValueError: если строка не является курсором
+    """
+    try:
+        score, doc_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split(':')
+        return float(score), int(doc_id)
+    except (ValueError, UnicodeError, binascii.Error):
+        raise ValueError(f"Некорректный курсор: {cursor}")
+
+
+def after_mask(scores: np.ndarray, doc_keys: np.ndarray, after: Cursor) -> np.ndarray:
+    """
+    Документы, идущие в выдаче после курсора
+
+    :param scores: оценки документов
+    :param doc_keys: ID документов (или ключи, упорядоченные так же, как ID)
+    :param after: курсор (оценка, ключ документа)
+    :return: булева маска
+    """
+    # Оценка курсора приводится к типу оценок (float32 или float64) без потерь
+    score = scores.dtype.type(after[0])
+    return (scores < score) | ((scores == score) & (doc_keys > after[1]))
+
+
+def top_order(scores: np.ndarray, doc_keys: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    Позиции top_n документов в порядке выдачи (оценка по убыванию, ключ по возрастанию)
+
+    Документы с оценкой, равной оценке top_n-го, отбираются по ключу, поэтому
+    граница страницы не зависит от порядка работы частичной сортировки.
+
+    :param scores: оценки документов
+    :param doc_keys: ID документов (или ключи, упорядоченные так же, как ID)
+    :param top_n: количество результатов
+    :return: позиции в scores
+    """
+    if top_n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.arange(len(scores))
+    if len(scores) > top_n:
+        threshold = -np.partition(-scores, top_n - 1)[top_n - 1]
+        candidates = np.flatnonzero(scores >= threshold)
+    order = np.lexsort((doc_keys[candidates], -scores[candidates]))
+    return candidates[order[:top_n]]
+
+
+def doc_index_cursor(after: Optional[Cursor], doc_ids: np.ndarray) -> Optional[Cursor]:
+    """
+    Курсор по позициям в отсортированном doc_ids вместо ID документов
+
+    Позиции упорядочены так же, как ID, поэтому условие «ID > d» равносильно
+    «позиция > p», где p - позиция последнего ID, не превосходящего d (ID
+    курсора может и отсутствовать в doc_ids, например у добавленного документа).
+
+    :param after: курсор (оценка, ID документа)
+    :param doc_ids: отсортированные ID документов основного индекса
+    :return: курсор (оценка, позиция)
+    """
+    if after is None:
+        return None
+    return after[0], int(np.searchsorted(doc_ids, after[1], side='right')) - 1
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Лемматизация слов запроса, которых нет в словаре лемм
+
+Словарь лемм (lemmas.txt, Задание 2) содержит только формы слов корпуса, поэтому
+другие формы слов запроса лемматизируются во время поиска. Запуск Mystem на
+каждый запрос (как в tokenizer.py) стоит сотни миллисекунд, поэтому
+лемматизатор работает постоянно:
+
+- pymorphy3 / pymorphy2 (если установлен) - анализатор на Python в процессе
+  поиска, без межпроцессного обмена;
+- иначе пул процессов mystem (pymystem3): каждый поток пула владеет своим
+  процессом и забирает из очереди все ожидающие запросы, так что слова
+  параллельных запросов лемматизируются одним обращением к mystem.
+
+Результаты (в том числе «лемма совпадает со словом») хранятся в ограниченном
+LRU-кеше, поэтому повторные слова не доходят до анализатора. Потоки и процессы
+mystem запускаются при первом обращении в каждом процессе: после fork воркера
+gunicorn родительские процессы mystem недоступны.
+"""
+
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+from typing import Dict, Iterable, List, Tuple
+
+from text_tokenizer import normalize
+
+BACKENDS = ('auto', 'pymorphy', 'mystem')
+# Ограничение кеша (число различных слов)
+DEFAULT_CACHE_SIZE = 100_000
+# Процессов mystem в пуле
+DEFAULT_WORKERS = 2
+# Максимум слов в одном обращении к mystem
+MAX_BATCH = 256
+# Время ожидания лемматизации (секунды): по истечении слова остаются как есть
+DEFAULT_TIMEOUT = 0.05
+
+
+class LemmaCache:
+    """
+    Ограниченный LRU-кеш {слово: лемма}, безопасный для потоков
+    """
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        """
+        :param max_size: максимум слов в кеше (самые давно использованные вытесняются)
+        """
+        self.max_size = max_size
+        self._lemmas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lemmas)
+
+    def lookup(self, words: Iterable[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Поиск слов в кеше
+
+        :param words: слова
+        :return: ({слово: лемма} найденных слов, ненайденные слова без повторов)
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for word in words:
+                if word in found or word in missing:
+                    continue
+                lemma = self._lemmas.get(word)
+                if lemma is None:
+                    missing.append(word)
+                else:
+                    self._lemmas.move_to_end(word)
+                    found[word] = lemma
+        return found, missing
+
+    def store(self, lemmas: Dict[str, str]):
+        """Добавление лемм с вытеснением самых давно использованных слов"""
+        with self._lock:
+            self._lemmas.update(lemmas)
+            for word in lemmas:
+                self._lemmas.move_to_end(word)
+            while len(self._lemmas) > self.max_size:
+                self._lemmas.popitem(last=False)
+
+
+def create_morph_analyzer():
+    """Анализатор pymorphy3 или pymorphy2 (None, если ни один не установлен)"""
+    for module_name in ('pymorphy3', 'pymorphy2'):
+        try:
+            module = __import__(module_name)
+        except ImportError:
+            continue
+        return module.MorphAnalyzer()
+    return None
+
+
+def mystem_lemmas(mystem, words: Iterable[str]) -> Dict[str, str]:
+    """
+    Леммы слов одним обращением к процессу mystem
+
+    Слова передаются по одному на строку; результат сопоставляется по тексту
+    слова, а не по позиции (mystem может разбить слово из латиницы и кириллицы).
+
+    :param mystem: экземпляр pymystem3.Mystem
+    :param words: нормализованные слова
+    :return: {слово: лемма} слов, которые mystem разобрал
+    """
+    words = set(words)
+    lemmas = {}
+    for item in mystem.analyze('\n'.join(words)):
+        text = normalize(item.get('text', '').strip())
+        analysis = item.get('analysis')
+        if text in words and analysis:
+            lemmas[text] = normalize(analysis[0]['lex'])
+    return lemmas
+
+
+class QueryLemmatizer:
+    """
+    Постоянно работающий лемматизатор слов запроса с кешем
+    """
+    def __init__(self, backend: str = 'auto',
+                 workers: int = DEFAULT_WORKERS,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 max_batch: int = MAX_BATCH,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """
+        :param backend: auto (pymorphy, если установлен, иначе mystem), pymorphy или mystem
+        :param workers: процессов mystem в пуле
+        :param cache_size: максимум слов в LRU-кеше
+        :param max_batch: максимум слов в одном обращении к mystem
+        :param timeout: время ожидания лемматизации в секундах
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Неизвестный лемматизатор: {backend}")
+        self.backend = backend
+        self.workers = workers
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.cache = LemmaCache(cache_size)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._morph = None
+        self._queue = None
+        self._available = True
+
+    def lemmatize(self, words: Iterable[str]) -> Dict[str, str]:
+        """
+        Леммы слов
+
+        :param words: нормализованные слова
+        :return: {слово: лемма}; слов, которые не удалось разобрать за timeout
+                 (или без установленного анализатора), в результате нет
+        """
+        lemmas, missing = self.cache.lookup(words)
+        if not missing or not self._start():
+            return lemmas
+        if self._morph is not None:
+            analyzed = {word: normalize(self._morph.parse(word)[0].normal_form) for word in missing}
+        else:
+            request = (missing, Future())
+            self._queue.put(request)
+            try:
+                analyzed = request[1].result(self.timeout)
+            except TimeoutError:
+                # Поток пула допишет результат в кеш, следующий запрос его получит
+                return lemmas
+            except Exception as e:
+                print(f"Ошибка лемматизации запроса: {e}")
+                return lemmas
+        self.cache.store(analyzed)
+        lemmas.update(analyzed)
+        return lemmas
+
+    def _start(self) -> bool:
+        """
+        Запуск анализатора в текущем процессе
+
+        :return: True, если анализатор доступен
+        """
+        if self._pid == os.getpid():
+            return self._available
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._available
+            if self.backend in ('auto', 'pymorphy'):
+                self._morph = create_morph_analyzer()
+            if self._morph is None and self.backend in ('auto', 'mystem'):
+                try:
+                    import pymystem3  # noqa: F401 (проверка установки до запуска пула)
+                except ImportError:
+                    pass
+                else:
+                    self._queue = queue.Queue()
+                    for index in range(self.workers):
+                        threading.Thread(target=self._worker, args=(self._queue,),
+                                         name=f"mystem-{index}", daemon=True).start()
+            self._available = self._morph is not None or self._queue is not None
+            if not self._available:
+                print(f"Лемматизатор запросов ({self.backend}) не установлен: "
+                      f"слова вне словаря лемм не лемматизируются")
+            self._pid = os.getpid()
+            return self._available
+
+    def _worker(self, requests: queue.Queue):
+        """Поток пула: свой процесс mystem, обработка ожидающих запросов пачками"""
+        from pymystem3 import Mystem
+        try:
+            mystem = Mystem(entire_input=False)
+        except Exception as e:
+            print(f"Ошибка запуска mystem: {e}")
+            mystem = None
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            batch = [request]
+            words = set(request[0])
+            while len(words) < self.max_batch:
+                try:
+                    request = requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    requests.put(None)
+                    break
+                batch.append(request)
+                words.update(request[0])
+            try:
+                lemmas = mystem_lemmas(mystem, words) if mystem is not None else {}
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            # Неразобранные слова кешируются как есть, чтобы не обращаться к mystem повторно
+            analyzed = {word: lemmas.get(word, word) for word in words}
+            self.cache.store(analyzed)
+            for batch_words, future in batch:
+                future.set_result({word: analyzed[word] for word in batch_words})
+        if mystem is not None:
+            mystem.close()
+
+    def close(self):
+        """Остановка потоков и процессов mystem текущего процесса"""
+        if self._queue is not None and self._pid == os.getpid():
+            for _ in range(self.workers):
+                self._queue.put(None)
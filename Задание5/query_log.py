@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Журнал поисковых запросов
+
+Для каждого запроса к /search и /api/search записываются текст запроса,
+параметры, время ответа, количество результатов и ID найденных документов
+(по ним replay.py сравнивает выдачу двух версий индекса). Журнал включается
+только явно (переменная SEARCH_QUERY_LOG - директория журнала).
+
+Обработчик запроса только кладет запись в ограниченный буфер в памяти; запись
+на диск выполняет фоновый поток пачками. Если диск не успевает и буфер
+заполнен, записи отбрасываются (счетчик dropped), а не задерживают ответ.
+
+Каждый процесс (воркер gunicorn) пишет свой файл queries-<pid>.jsonl, поэтому
+процессам не нужно согласовывать запись и ротацию. Файл длиннее max_bytes
+переименовывается в queries-<pid>.jsonl.1 (старые копии сдвигаются, хранится
+не более backup_count копий).
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Размер файла, после которого он ротируется (байты)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+# Максимум записей в буфере, ожидающих записи на диск
+DEFAULT_BUFFER_SIZE = 10000
+# Период записи буфера на диск (секунды)
+DEFAULT_FLUSH_INTERVAL = 1.0
+LOG_FILE_PREFIX = 'queries-'
+LOG_FILE_SUFFIX = '.jsonl'
+
+
+class QueryLog:
+    """
+    Асинхронная запись журнала запросов в ротируемые файлы
+    """
+    def __init__(self, directory: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 backup_count: int = DEFAULT_BACKUP_COUNT,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        """
+        :param directory: директория файлов журнала
+        :param max_bytes: размер файла, после которого он ротируется
+        :param backup_count: количество хранимых старых файлов каждого процесса
+        :param buffer_size: максимум записей в буфере (лишние отбрасываются)
+        :param flush_interval: период записи буфера на диск в секундах
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        # deque с maxlen потокобезопасна для append/popleft и не блокирует обработчик
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._writer_pid = None
+        self._file = None
+        self._file_pid = None
+        self.written = 0
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self) -> str:
+        """Файл журнала текущего процесса"""
+        return os.path.join(self.directory, f"{LOG_FILE_PREFIX}{os.getpid()}{LOG_FILE_SUFFIX}")
+
+    def log(self, record: Dict[str, Any]):
+        """
+        Запись запроса (не блокирует вызывающий поток)
+
+        :param record: поля запроса; время ts добавляется, если его нет
+        """
+        self._start_writer()
+        record.setdefault('ts', time.time())
+        if len(self._buffer) == self._buffer.maxlen:
+            # Самая старая запись будет вытеснена
+            self.dropped += 1
+        self._buffer.append(record)
+
+    def _start_writer(self):
+        """Запуск потока записи в текущем процессе (после fork поток нужно запускать заново)"""
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            # Записи, попавшие в буфер до fork, принадлежат родительскому процессу. Буфер
+            # очищается до публикации _writer_pid: иначе другой поток мог бы добавить запись,
+            # не заходя под блокировку, и она была бы удалена вместе с записями родителя
+            self._buffer.clear()
+            self._writer_pid = os.getpid()
+        threading.Thread(target=self._write_loop, name='query-log-writer', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _write_loop(self):
+        """Периодическая запись буфера на диск"""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Ошибка при записи журнала запросов: {e}")
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        """Все записи буфера"""
+        records = []
+        try:
+            while True:
+                records.append(self._buffer.popleft())
+        except IndexError:
+            pass
+        return records
+
+    def flush(self):
+        """Запись накопленных записей на диск"""
+        with self._lock:
+            records = self._drain()
+            if not records:
+                return
+            data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+            f = self._open()
+            f.write(data)
+            f.flush()
+            self.written += len(records)
+            if f.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _open(self):
+        """Файл журнала текущего процесса (открывается при первой записи)"""
+        if self._file is None or self._file_pid != os.getpid():
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._file_pid = os.getpid()
+        return self._file
+
+    def _rotate(self):
+        """Ротация файла текущего процесса: .1 -> .2 -> ... , старейшая копия удаляется"""
+        self._file.close()
+        self._file = None
+        path = self.path
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+    def close(self):
+        """Запись оставшихся записей и закрытие файла"""
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def log_files(paths: List[str]) -> List[str]:
+    """
+    Файлы журнала: указанные файлы и все файлы журнала в указанных директориях
+
+    :param paths: файлы и директории
+    :return: пути к файлам
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            if name.startswith(LOG_FILE_PREFIX) and LOG_FILE_SUFFIX in name:
+                files.append(os.path.join(path, name))
+    return files
+
+
+def read_log(paths: List[str], endpoints: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Чтение записей журнала из файлов и директорий, упорядоченных по времени
+
+    :param paths: файлы и директории журнала (включая ротированные файлы)
+    :param endpoints: оставить только записи этих маршрутов (None - все)
+    :return: записи по возрастанию ts
+    """
+    records = []
+    for path in log_files(paths):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Последняя строка файла может быть недописана
+                        continue
+                    if endpoints is None or record.get('endpoint') in endpoints:
+                        records.append(record)
+        except OSError as e:
+            print(f"Ошибка при чтении журнала {path}: {e}")
+    records.sort(key=lambda record: record.get('ts', 0))
+    return records
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Перезагрузка индекса без остановки сервиса
+
+Поколение индекса - файл снимка (snapshot.py) или директория шардированного
+индекса (sharding.py). Файл-указатель содержит путь к текущему поколению
+(относительно директории указателя). Фоновый поток каждого процесса следит
+за указателем; при его изменении новое поколение загружается в фоне и
+атомарно подменяет текущее. Запросы, начатые на старом поколении, дорабатывают
+на нем, после чего старое поколение закрывается и его память освобождается.
+
+Публикация нового поколения:
+    python snapshot.py --output generations/index-0002.snapshot
+    python reloader.py generations/index-0002.snapshot --pointer CURRENT
+"""
+
+import argparse
+import gc
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from metrics import MetricsRegistry
+
+# Период проверки файла-указателя (секунды)
+DEFAULT_RELOAD_INTERVAL = 1.0
+# Сколько ждать завершения запросов на старом поколении перед его закрытием
+DEFAULT_DRAIN_TIMEOUT = 60.0
+
+
+def generation_kwargs(target: Optional[str]) -> Dict[str, str]:
+    """
+    Параметры SearchEngine для поколения индекса
+
+    :param target: путь к поколению (None - параметры по умолчанию)
+    :return: snapshot_path для файла снимка или shards_dir для шардированного индекса
+    """
+    if target is None:
+        return {}
+    if os.path.isdir(target):
+        return {'shards_dir': target}
+    return {'snapshot_path': target}
+
+
+def publish_generation(pointer_path: str, target: str):
+    """
+    Атомарная запись указателя на поколение индекса
+
+    :param pointer_path: путь к файлу-указателю
+    :param target: путь к поколению (сохраняется относительно директории указателя)
+    """
+    pointer_dir = os.path.dirname(os.path.abspath(pointer_path))
+    tmp_path = f"{pointer_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(os.path.relpath(os.path.abspath(target), pointer_dir) + '\n')
+    os.replace(tmp_path, pointer_path)
+
+
+class Generation:
+    """
+    Загруженное поколение индекса и счетчик запросов, которые его используют
+    """
+    def __init__(self, name: str, target: Optional[str], engine):
+        """
+        :param name: имя поколения (для метрик)
+        :param target: путь к поколению
+        :param engine: поисковая система
+        """
+        self.name = name
+        self.target = target
+        self.engine = engine
+        self._active = 0
+        self._idle = threading.Condition()
+
+    def acquire(self):
+        """Начало запроса на этом поколении"""
+        with self._idle:
+            self._active += 1
+
+    def release(self):
+        """Завершение запроса"""
+        with self._idle:
+            self._active -= 1
+            if self._active == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Ожидание завершения всех запросов; False, если время вышло"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, timeout)
+
+
+class IndexReloader:
+    """
+    Слежение за указателем поколения и подмена индекса
+    """
+    def __init__(self, pointer_path: str, load_engine: Callable[[Optional[str]], object],
+                 metrics: Optional[MetricsRegistry] = None,
+                 interval: float = DEFAULT_RELOAD_INTERVAL,
+                 drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+                 on_swap: Optional[Callable[[Generation], None]] = None):
+        """
+        :param pointer_path: путь к файлу-указателю
+        :param load_engine: функция путь к поколению -> SearchEngine
+        :param metrics: реестр метрик (время загрузки и память поколений)
+        :param interval: период проверки указателя в секундах
+        :param drain_timeout: время ожидания запросов на старом поколении
+        :param on_swap: вызывается после подмены поколения
+        """
+        self.pointer_path = pointer_path
+        self.load_engine = load_engine
+        self.metrics = metrics
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+        self.on_swap = on_swap
+        self.current: Optional[Generation] = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._watcher_pid = None
+        # Поколение, которое не удалось загрузить (повторно не загружается)
+        self._failed_target = None
+
+    def read_pointer(self) -> Optional[str]:
+        """Путь к поколению из указателя (None, если указателя нет или он пуст)"""
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                target = f.read().strip()
+        except OSError:
+            return None
+        if not target:
+            return None
+        return os.path.join(os.path.dirname(os.path.abspath(self.pointer_path)), target)
+
+    def load_current(self) -> Generation:
+        """Синхронная загрузка поколения из указателя (при старте)"""
+        target = self.read_pointer()
+        if target is None:
+            print(f"Указатель поколения {self.pointer_path} не найден, загрузка индекса по умолчанию")
+        generation = self._load(target)
+        if generation is None:
+            raise RuntimeError(f"Не удалось загрузить поколение индекса {target}")
+        self._swap(generation)
+        return generation
+
+    def check(self) -> bool:
+        """
+        Проверка указателя и загрузка нового поколения
+
+        :return: True, если поколение подменено
+        """
+        target = self.read_pointer()
+        current = self.current
+        if target is None or target == self._failed_target or \
+                (current is not None and current.target == target):
+            return False
+        generation = self._load(target)
+        if generation is None:
+            self._failed_target = target
+            return False
+        self._swap(generation)
+        return True
+
+    def _load(self, target: Optional[str]) -> Optional[Generation]:
+        """Загрузка поколения с записью времени и памяти в метрики"""
+        name = os.path.basename(target.rstrip(os.sep)) if target else 'default'
+        print(f"Загрузка поколения индекса {name}...")
+        start_time = time.perf_counter()
+        try:
+            if target is not None and not os.path.exists(target):
+                raise FileNotFoundError(f"поколение не найдено: {target}")
+            engine = self.load_engine(target)
+        except Exception as e:
+            print(f"Ошибка при загрузке поколения {name}: {e}")
+            if self.metrics is not None:
+                self.metrics.record_reload(time.perf_counter() - start_time, False)
+            return None
+        seconds = time.perf_counter() - start_time
+        if self.metrics is not None:
+            self.metrics.record_reload(seconds, True)
+            self.metrics.set_generation_bytes(name, engine.nbytes)
+        print(f"Поколение {name} загружено за {seconds:.2f} с")
+        return Generation(name, target, engine)
+
+    def _swap(self, generation: Generation):
+        """Подмена текущего поколения; старое закрывается в фоне после завершения его запросов"""
+        with self._lock:
+            old, self.current = self.current, generation
+        if self.on_swap is not None:
+            self.on_swap(generation)
+        if old is not None:
+            threading.Thread(target=self._retire, args=(old,), name='generation-retire',
+                             daemon=True).start()
+
+    def _retire(self, generation: Generation):
+        """Закрытие старого поколения"""
+        if not generation.wait_idle(self.drain_timeout):
+            print(f"Поколение {generation.name}: запросы не завершились за {self.drain_timeout} с")
+        generation.engine.close()
+        generation.engine = None
+        if self.metrics is not None and (self.current is None or self.current.name != generation.name):
+            self.metrics.set_generation_bytes(generation.name, None)
+        # Поисковая система содержит циклические ссылки (индекс сегментов ссылается на нее)
+        gc.collect()
+        print(f"Поколение {generation.name} выгружено")
+
+    def acquire(self) -> Generation:
+        """Текущее поколение, закрепленное за запросом (освобождается методом release)"""
+        with self._lock:
+            generation = self.current
+            generation.acquire()
+        return generation
+
+    def start(self):
+        """
+        Запуск потока слежения в текущем процессе (после fork поток нужно запускать заново)
+
+        Процесс, созданный fork, мог унаследовать устаревшее поколение (например, воркер,
+        перезапущенный gunicorn после публикации нового поколения), поэтому указатель
+        сначала проверяется синхронно: запросы процесса ждут загрузки нового поколения,
+        а не отвечают по старому.
+        """
+        if self._watcher_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Ошибка при проверке поколения индекса: {e}")
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name='generation-watcher', daemon=True).start()
+
+    def _watch(self):
+        """Периодическая проверка указателя"""
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Ошибка при проверке поколения индекса: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Публикация нового поколения индекса')
+    parser.add_argument('target', help='файл снимка или директория шардированного индекса')
+    parser.add_argument('--pointer', default='CURRENT', help='файл-указатель поколения')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.target):
+        parser.error(f"поколение не найдено: {args.target}")
+    publish_generation(args.pointer, args.target)
+    print(f"Указатель {args.pointer} -> {args.target}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Воспроизведение журнала запросов (см. query_log.py) на запущенном сервисе
+
+Запросы отправляются в /api/search с параметрами из журнала в исходном темпе
+(--speed 1), ускоренном (--speed 4 - в четыре раза быстрее) или без пауз
+(--speed 0). Отчет содержит пропускную способность, перцентили задержки и
+отставание от расписания (если клиентов не хватает для заданного темпа).
+
+Выдача сравнивается с другой версией индекса: со вторым сервисом
+(--compare-url) или, если он не задан, с ID документов, записанными в журнал.
+
+Пример:
+    python replay.py query_log/ --url http://127.0.0.1:8000 --speed 2 --concurrency 16 \\
+        --compare-url http://127.0.0.1:8001 --diff-output diff.jsonl
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from load_test import percentile, wait_until_ready
+from query_log import read_log
+
+# Параметры, которые не влияют на выдачу и не повторяются
+IGNORED_PARAMS = ('debug',)
+# Количество наиболее изменившихся запросов в отчете
+DEFAULT_TOP_DIFFS = 10
+
+
+def request_url(base_url: str, record: Dict[str, Any]) -> str:
+    """
+    Адрес /api/search для записи журнала
+
+    Запросы страницы /search тоже отправляются в /api/search: у них те же
+    параметры и размер выдачи, но ответ содержит ID документов.
+    """
+    params = record.get('params') or {'q': [record.get('q', '')], 'ranking': [record.get('ranking', 'tfidf')]}
+    params = {key: value for key, value in params.items() if key not in IGNORED_PARAMS}
+    return f"{base_url}/api/search?{urllib.parse.urlencode(params, doseq=True)}"
+
+
+def fetch_ids(url: str, timeout: float) -> List[int]:
+    """
+    Выполнение запроса к /api/search
+
+    :return: ID найденных документов
+    :raises Exception: при ошибке соединения или HTTP-статусе ошибки
+    """
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        payload = json.loads(response.read())
+    return [result['id'] for result in payload.get('results', [])]
+
+
+def result_diff(expected: List[int], actual: List[int]) -> Dict[str, Any]:
+    """
+    Сравнение двух выдач одного запроса
+
+    :param expected: ID документов эталонной выдачи
+    :param actual: ID документов проверяемой выдачи
+    :return: совпадение порядка, смена первого результата и доля общих документов
+    """
+    size = max(len(expected), len(actual))
+    overlap = len(set(expected) & set(actual)) / size if size else 1.0
+    return {
+        'identical': expected == actual,
+        'top1_changed': expected[:1] != actual[:1],
+        'overlap': overlap,
+        'added': [doc_id for doc_id in actual if doc_id not in expected],
+        'removed': [doc_id for doc_id in expected if doc_id not in actual]
+    }
+
+
+def replay(records: List[Dict[str, Any]], base_url: str, concurrency: int, speed: float,
+           compare_url: Optional[str] = None, timeout: float = 30) -> Dict[str, Any]:
+    """
+    Воспроизведение записей журнала
+
+    :param records: записи журнала по возрастанию времени
+    :param base_url: адрес проверяемого сервиса
+    :param concurrency: количество параллельных клиентов
+    :param speed: множитель темпа (1 - исходный, 0 - без пауз)
+    :param compare_url: адрес сервиса с другой версией индекса (None - сравнение с журналом)
+    :param timeout: время ожидания ответа в секундах
+    :return: задержки, отставания от расписания, количество ошибок и сравнения выдачи
+    """
+    latencies = []
+    lags = []
+    diffs = []
+    errors = 0
+    lock = threading.Lock()
+    first_ts = records[0].get('ts', 0) if records else 0
+
+    def worker(record: Dict[str, Any], due: float):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ids = fetch_ids(request_url(base_url, record), timeout)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - start
+        # Эталон: выдача второго сервиса или ID из журнала (только для успешных запросов)
+        expected = None
+        if compare_url:
+            try:
+                expected = fetch_ids(request_url(compare_url, record), timeout)
+            except Exception:
+                pass
+        elif record.get('status') == 200 and 'ids' in record:
+            expected = record['ids']
+        with lock:
+            latencies.append(elapsed)
+            lags.append(max(0.0, start - due))
+            if expected is not None:
+                diff = result_diff(expected, ids)
+                diff['q'] = record.get('q', '')
+                diff['params'] = record.get('params')
+                diffs.append(diff)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            due = start_time
+            if speed > 0:
+                due += (record.get('ts', first_ts) - first_ts) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(worker, record, due)
+    wall_time = time.perf_counter() - start_time
+    return {'latencies': latencies, 'lags': lags, 'diffs': diffs,
+            'errors': errors, 'wall_time': wall_time}
+
+
+def build_report(result: Dict[str, Any], requests: int, concurrency: int, speed: float,
+                 top_diffs: int = DEFAULT_TOP_DIFFS) -> Dict[str, Any]:
+    """
+    Отчет о воспроизведении
+
+    :param result: результат replay()
+    :param requests: количество отправленных запросов
+    :param concurrency: количество параллельных клиентов
+    :param speed: множитель темпа
+    :param top_diffs: количество наиболее изменившихся запросов в отчете
+    :return: отчет
+    """
+    latencies = sorted(result['latencies'])
+    lags = sorted(result['lags'])
+    wall_time = result['wall_time']
+    report = {
+        'requests': requests,
+        'errors': result['errors'],
+        'concurrency': concurrency,
+        'speed': speed,
+        'wall_time_s': round(wall_time, 3),
+        'qps': round(len(latencies) / wall_time, 1) if wall_time > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        # Отставание от расписания: клиентов не хватает для заданного темпа
+        'lag_p50_ms': round(percentile(lags, 50) * 1000, 2),
+        'lag_p99_ms': round(percentile(lags, 99) * 1000, 2),
+    }
+    diffs = result['diffs']
+    if diffs:
+        changed = sorted((diff for diff in diffs if not diff['identical']),
+                         key=lambda diff: (diff['overlap'], not diff['top1_changed']))
+        report['diff'] = {
+            'compared': len(diffs),
+            'identical': len(diffs) - len(changed),
+            'top1_changed': sum(diff['top1_changed'] for diff in diffs),
+            'mean_overlap': round(sum(diff['overlap'] for diff in diffs) / len(diffs), 4),
+            'most_changed': [{'q': diff['q'], 'overlap': round(diff['overlap'], 4),
+                              'top1_changed': diff['top1_changed']}
+                             for diff in changed[:top_diffs]]
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение журнала запросов на /api/search')
+    parser.add_argument('logs', nargs='+', help='файлы или директории журнала запросов')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='адрес сервиса')
+    parser.add_argument('--compare-url', help='адрес сервиса с другой версией индекса')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='множитель темпа: 1 - исходный, 2 - вдвое быстрее, 0 - без пауз')
+    parser.add_argument('--concurrency', type=int, default=8, help='параллельные клиенты')
+    parser.add_argument('--limit', type=int, help='воспроизвести только первые N запросов')
+    parser.add_argument('--endpoint', action='append',
+                        help='воспроизводить запросы только этого маршрута (/search, /api/search)')
+    parser.add_argument('--timeout', type=float, default=30, help='ожидание ответа, сек')
+    parser.add_argument('--diff-output', help='файл JSONL с различиями выдачи по запросам')
+    parser.add_argument('--ready-timeout', type=float, default=120, help='ожидание готовности, сек')
+    args = parser.parse_args()
+
+    records = [record for record in read_log(args.logs, args.endpoint) if record.get('q')]
+    if args.limit is not None:
+        records = records[:args.limit]
+    if not records:
+        print("В журнале нет запросов")
+        return 1
+
+    base_url = args.url.rstrip('/')
+    compare_url = args.compare_url.rstrip('/') if args.compare_url else None
+    for url in filter(None, (base_url, compare_url)):
+        if not wait_until_ready(url, args.ready_timeout):
+            print(f"Сервис {url} не готов")
+            return 1
+
+    result = replay(records, base_url, args.concurrency, args.speed, compare_url, args.timeout)
+    report = build_report(result, len(records), args.concurrency, args.speed)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.diff_output:
+        with open(args.diff_output, 'w', encoding='utf-8') as f:
+            for diff in result['diffs']:
+                if not diff['identical']:
+                    f.write(json.dumps(diff, ensure_ascii=False) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
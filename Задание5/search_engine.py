@@ -2,24 +2,62 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import json
 import math
 import re
 from collections import Counter, defaultdict
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Iterable, Iterator, Optional, Sequence
 import numpy as np
 from bs4 import BeautifulSoup
 
+# Общий словарь терминов находится в Задании 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Задание2'))
+from term_dictionary import Lexicon, TermDictionary
+from document_filters import DocumentFilter, FilterClause, FilterIndex, parse_filters
+from term_expansion import TermExpander
+from impact_index import ImpactIndex
+from semantic_index import SemanticIndex
+from tiered_index import DEFAULT_TIER_SIZE, TieredIndex
+from live_index import LiveIndex, document_vector
+from query_lemmatizer import QueryLemmatizer
+from suggest_index import SUGGEST_TOP_K, SuggestIndex, read_queries, suggestion_scores
+from text_tokenizer import is_indexable, is_pattern, normalize, strip_wildcards, tokenize_query
+from metrics import MetricsRegistry, SearchProfile, increment, profiling, stage
+from pagination import DEFAULT_PAGE_SIZE, Cursor, after_mask, doc_index_cursor, top_order
+
 class SearchEngine:
     """
     Векторная поисковая система на основе TF-IDF
     """
+    # Функции ранжирования: косинус TF-IDF, квантованные вклады BM25/BM25F,
+    # семантическая близость LSA и их гибрид
+    RANKINGS = ('tfidf', 'bm25', 'bm25f', 'semantic', 'hybrid')
+    IMPACT_RANKINGS = ('bm25', 'bm25f')
+    SEMANTIC_RANKINGS = ('semantic', 'hybrid')
+    # Параметры гибридного ранжирования (Reciprocal Rank Fusion)
+    HYBRID_CANDIDATES = 100
+    RRF_K = 60
+    # Запас при сравнении точных оценок с верхней границей первого уровня:
+    # оценки накапливаются во float32, граница - во float64
+    TIER_EPSILON = 1e-6
+    
     def __init__(self, 
                  index_path: str = '../Задание3/inverted_index.json',
                  tokens_path: str = '../Задание2/tokens.txt',
                  lemmas_path: str = '../Задание2/lemmas.txt',
                  pages_dir: str = '../Задание_1/crawler/data/pages',
-                 tf_idf_dir: str = '../Задание4/results'):
+                 tf_idf_dir: str = '../Задание4/results',
+                 snapshot_path: Optional[str] = None,
+                 semantic_dir: Optional[str] = 'semantic_index',
+                 metrics: Optional[MetricsRegistry] = None,
+                 shards_dir: Optional[str] = None,
+                 shard_timeout: float = 1.0,
+                 documents_log: Optional[str] = None,
+                 suggest_queries: Optional[str] = None,
+                 crawl_index_path: Optional[str] = '../Задание_1/crawler/data/index.txt',
+                 tier_size: Optional[int] = DEFAULT_TIER_SIZE,
+                 query_lemmatizer: Optional[str] = 'auto'):
         """
         Инициализация поисковой системы
         
@@ -28,23 +66,119 @@ class SearchEngine:
         :param lemmas_path: путь к файлу с леммами
         :param pages_dir: директория с HTML-страницами
         :param tf_idf_dir: директория с TF-IDF метриками
+        :param snapshot_path: путь к снимку индекса (см. snapshot.py); если снимок
+                              отсутствует или устарел, данные читаются из исходных файлов
+        :param semantic_dir: директория семантического индекса (см. semantic_index.py);
+                             None - без семантического поиска
+        :param metrics: реестр метрик этапов поиска (None - профилирование выключено)
+        :param shards_dir: директория шардированного индекса (см. sharding.py); с ним
+                           поисковая система работает координатором: веса документов
+                           не загружаются, а TF-IDF поиск рассылается процессам шардов
+        :param shard_timeout: время ожидания ответа шарда в секундах (по истечении
+                              результат собирается из ответивших шардов)
+        :param documents_log: журнал добавленных и удаленных документов (см. live_index.py);
+                              None - добавленные документы хранятся только в памяти процесса
+        :param suggest_queries: файл с запросами (по одному на строку) для учета популярности
+                                терминов в подсказках; None - подсказки по документной частоте
+        :param crawl_index_path: индексный файл краулера с URL и метаданными страниц для
+                                 фильтров (см. document_filters.py в Задании 2)
+        :param tier_size: вхождений термина в первом уровне индекса TF-IDF (см. tiered_index.py);
+                          None - поиск всегда по полным спискам вхождений
+        :param query_lemmatizer: лемматизатор слов запроса, которых нет в словаре лемм
+                                 (auto, pymorphy или mystem, см. query_lemmatizer.py);
+                                 None - такие слова остаются как есть
         """
         self.index_path = index_path
         self.tokens_path = tokens_path
         self.lemmas_path = lemmas_path
         self.pages_dir = pages_dir
         self.tf_idf_dir = tf_idf_dir
+        self.snapshot_path = snapshot_path
+        self.semantic_dir = semantic_dir
+        self.metrics = metrics
+        self.shards_dir = shards_dir
+        self.shard_timeout = shard_timeout
+        self.suggest_queries = suggest_queries
+        self.crawl_index_path = crawl_index_path
+        self.tier_size = tier_size
+        self.shard_pool = None
+        self.query_lemmatizer = QueryLemmatizer(query_lemmatizer) if query_lemmatizer else None
+        
+        # Исходные структуры загружаются лениво (при работе со снимком они не нужны)
+        self._inverted_index = None
+        self._documents_tf_idf = None
+        self._snapshot = None
         
         # Загрузка данных
         print("Загрузка данных...")
-        self.inverted_index = self._load_inverted_index()
-        self.tokens = self._load_tokens()
-        self.lemmas_dict, self.lemma_to_forms = self._load_lemmas()
+        if not (shards_dir and self._load_shards(shards_dir)) and \
+                not (snapshot_path and self._load_snapshot(snapshot_path)):
+            self._load_sources()
+        
+        # Документы, добавленные и удаленные после построения индекса
+        self.live = LiveIndex(self.doc_ids, self._vectorize_document, documents_log)
+        
+        print(f"Загружено {self.documents_count} документов")
+        print(f"Загружено {len(self.tokens)} токенов")
+        print(f"Загружено {len(self.lemmas_dict)} лемматизированных форм")
+        if len(self.live):
+            print(f"Добавлено после построения индекса: {len(self.live)} документов")
+        if self.semantic_index is not None:
+            print(f"Семантический индекс: {len(self.semantic_index)} векторов, "
+                  f"{self.semantic_index.bytes_per_vector} байт на вектор")
+    
+    @property
+    def nbytes(self) -> int:
+        """Объем памяти структур поиска (для снимка - отображенных в память массивов)"""
+        arrays = (self.doc_ids, self.doc_norms, self.term_df,
+                  self.postings_offsets, self.postings_docs, self.postings_weights)
+        total = sum(array.nbytes for array in arrays if array is not None)
+        total += self.terms.nbytes + self.lexicon.nbytes + self.suggest_index.nbytes + self.filter_index.nbytes
+        if self.tiered_index is not None:
+            total += self.tiered_index.nbytes
+        total += sum(impact_index.nbytes for impact_index in self.impact_indexes.values())
+        if self.semantic_index is not None:
+            total += self.semantic_index.nbytes
+        return total
+    
+    def close(self):
+        """Освобождение ресурсов: процессы шардов, поток слияния сегментов и лемматизатор"""
+        if self.shard_pool is not None:
+            self.shard_pool.close()
+        if self.query_lemmatizer is not None:
+            self.query_lemmatizer.close()
+        self.live.close()
+    
+    @property
+    def inverted_index(self) -> Dict[str, List[int]]:
+        """Инвертированный индекс (загружается при первом обращении)"""
+        if self._inverted_index is None:
+            self._inverted_index = self._load_inverted_index()
+        return self._inverted_index
+    
+    @property
+    def documents_tf_idf(self) -> Dict[int, Dict[str, float]]:
+        """TF-IDF значения документов (загружаются при первом обращении)"""
+        if self._documents_tf_idf is None:
+            self._documents_tf_idf = self._load_documents_tf_idf()
+        return self._documents_tf_idf
+    
+    def _load_sources(self):
+        """Загрузка данных из исходных файлов заданий 2-4"""
+        self._set_lexicon(self._load_lexicon())
         self.page_files = self._get_page_files()
         self.documents_count = len(self.page_files)
         
-        # Загрузка TF-IDF значений для документов
-        self.documents_tf_idf = self._load_documents_tf_idf()
+        # Матрица термин × документ из TF-IDF значений и ее первый уровень
+        self._build_postings()
+        self.tiered_index = self._build_tiered_index()
+        self.suggest_index = self._build_suggest_index()
+        
+        # Квантованные вклады BM25/BM25F из Задания 4
+        self.impact_indexes = self._load_impact_indexes()
+        
+        # Эмбеддинги LSA и индекс IVF-PQ (строятся отдельно: python semantic_index.py)
+        self.semantic_index = self._load_semantic_index()
         
         # Словарь для быстрого доступа к документам по ID
         self.document_id_to_path = {
@@ -52,9 +186,172 @@ class SearchEngine:
             for f in self.page_files
         }
         
-        print(f"Загружено {self.documents_count} документов")
-        print(f"Загружено {len(self.tokens)} токенов")
-        print(f"Загружено {len(self.lemmas_dict)} лемматизированных форм")
+        # Битовые карты хостов и языков, столбцы дат и размеров страниц
+        self.filter_index = self._build_filter_index()
+    
+    def _open_snapshot(self, snapshot_path: str, ignore_sources: Tuple[str, ...] = ()):
+        """
+        Открытие снимка с проверкой актуальности
+        
+        :param snapshot_path: путь к снимку
+        :param ignore_sources: исходные файлы, не влияющие на содержимое снимка
+        :return: снимок или None, если его нет или он устарел
+        """
+        from snapshot import load_snapshot, source_signature
+        
+        snapshot = load_snapshot(snapshot_path)
+        if snapshot is None:
+            return None
+        signature = source_signature(self)
+        stored = snapshot.meta.get('sources') or {}
+        # Устаревший журнал запросов перестраивает только подсказки (см. _load_dictionaries)
+        if any(stored.get(name) != value for name, value in signature.items()
+               if name not in ignore_sources and name != 'suggest_queries'):
+            print(f"Снимок {snapshot_path} устарел, загрузка из исходных файлов")
+            return None
+        return snapshot
+    
+    def _load_dictionaries(self, snapshot):
+        """Загрузка словарей и списка документов из снимка"""
+        self.terms = TermDictionary.from_arrays(snapshot.arrays('terms.'))
+        self.term_df = snapshot.array('term_df')
+        self.expander = TermExpander(self.terms, weights=self.term_df,
+                                     deletion_index=snapshot.arrays('expansion.') or None,
+                                     reverse_index=snapshot.arrays('reverse.') or None)
+        # Снимок старой версии без этих структур: строим их сразу, а не в первом запросе
+        self.expander.prepare()
+        self._set_lexicon(Lexicon.from_arrays(snapshot.arrays('lexicon.')))
+        self.suggest_index = self._load_suggest_index(snapshot)
+        
+        self.page_files = snapshot.strings('page_files')
+        self.documents_count = snapshot.meta['documents_count']
+        self.document_id_to_path = {
+            int(f.split('_')[1].split('.')[0]): os.path.join(self.pages_dir, f)
+            for f in self.page_files
+        }
+        
+        self.doc_ids = snapshot.array('doc_ids')
+        self.doc_norms = snapshot.array('doc_norms')
+        self.filter_index = (FilterIndex.from_arrays(snapshot.arrays('filters.'))
+                             if 'filters.dates' in snapshot.sections else self._build_filter_index())
+    
+    def _load_snapshot(self, snapshot_path: str) -> bool:
+        """
+        Загрузка данных из снимка индекса
+        
+        :param snapshot_path: путь к снимку
+        :return: True, если снимок актуален и загружен
+        """
+        snapshot = self._open_snapshot(snapshot_path)
+        if snapshot is None:
+            return False
+        
+        self._load_dictionaries(snapshot)
+        self.postings_offsets = snapshot.array('postings_offsets')
+        self.postings_docs = snapshot.array('postings_docs')
+        self.postings_weights = snapshot.array('postings_weights')
+        self.tiered_index = self._load_tiered_index(snapshot)
+        self.impact_indexes = {
+            ranking: ImpactIndex.from_arrays(snapshot.arrays(f"impacts.{ranking}."))
+            for ranking in self.IMPACT_RANKINGS if f"impacts.{ranking}.offsets" in snapshot.sections
+        }
+        self.semantic_index = (SemanticIndex.from_arrays(snapshot.arrays('semantic.'))
+                               if 'semantic.codes' in snapshot.sections else None)
+        
+        # Массивы ссылаются на отображенный в память файл
+        self._snapshot = snapshot
+        print(f"Индекс загружен из снимка {snapshot_path}")
+        return True
+    
+    def _load_shards(self, shards_dir: str) -> bool:
+        """
+        Загрузка глобальной части шардированного индекса
+        
+        Веса документов остаются в файлах шардов: их читают процессы шардов,
+        которые запускаются при первом поиске.
+        
+        :param shards_dir: директория шардированного индекса
+        :return: True, если индекс актуален и загружен
+        """
+        from sharding import GLOBAL_FILE, ShardPool, shard_path
+        
+        snapshot = self._open_snapshot(os.path.join(shards_dir, GLOBAL_FILE),
+                                       ignore_sources=('semantic',))
+        if snapshot is None:
+            return False
+        
+        self._load_dictionaries(snapshot)
+        self.postings_offsets = self.postings_docs = self.postings_weights = None
+        self.tiered_index = None
+        self.impact_indexes = {}
+        self.semantic_index = None
+        shards = snapshot.meta['shards']
+        self.shard_pool = ShardPool([shard_path(shards_dir, shard) for shard in range(shards)],
+                                    timeout=self.shard_timeout)
+        
+        self._snapshot = snapshot
+        print(f"Шардированный индекс {shards_dir}: {shards} шардов")
+        return True
+    
+    def _load_suggest_index(self, snapshot) -> SuggestIndex:
+        """Индекс подсказок из снимка (перестраивается, если журнал запросов изменился)"""
+        from snapshot import suggest_signature
+        
+        stored = (snapshot.meta.get('sources') or {}).get('suggest_queries')
+        if 'suggest.completions' in snapshot.sections and stored == suggest_signature(self):
+            return SuggestIndex.from_arrays(snapshot.arrays('suggest.'), self.terms)
+        return self._build_suggest_index()
+    
+    def _build_suggest_index(self) -> SuggestIndex:
+        """Построение индекса подсказок по документным частотам и журналу запросов"""
+        queries = read_queries(self.suggest_queries) if self.suggest_queries else None
+        return SuggestIndex.build(self.terms, suggestion_scores(self.terms, self.term_df, queries))
+    
+    def _build_filter_index(self) -> FilterIndex:
+        """Построение индекса фильтров по индексному файлу краулера и файлам страниц"""
+        return FilterIndex.build(self.doc_ids, self.crawl_index_path, self.document_id_to_path)
+    
+    def _build_tiered_index(self) -> Optional[TieredIndex]:
+        """Построение первого уровня индекса TF-IDF (None, если уровни выключены)"""
+        if not self.tier_size:
+            return None
+        return TieredIndex.build(self.postings_offsets, self.postings_docs, self.postings_weights,
+                                 self.tier_size)
+    
+    def _load_tiered_index(self, snapshot) -> Optional[TieredIndex]:
+        """Первый уровень из снимка (перестраивается, если в снимке другой размер уровня)"""
+        if 'tiers.bounds' in snapshot.sections:
+            tiered_index = TieredIndex.from_arrays(snapshot.arrays('tiers.'))
+            if tiered_index.tier_size == self.tier_size:
+                return tiered_index
+        return self._build_tiered_index()
+    
+    def _load_impact_indexes(self) -> Dict[str, ImpactIndex]:
+        """Загрузка индексов вкладов BM25/BM25F (документы заменяются на позиции в doc_ids)"""
+        impact_indexes = {}
+        for ranking in self.IMPACT_RANKINGS:
+            directory = os.path.join(self.tf_idf_dir, 'impacts', ranking)
+            if not os.path.isdir(directory):
+                continue
+            try:
+                impact_indexes[ranking] = ImpactIndex.load(directory).remap_docs(self.doc_ids)
+            except Exception as e:
+                print(f"Ошибка при загрузке индекса {ranking}: {e}")
+        return impact_indexes
+    
+    def _load_semantic_index(self) -> Optional[SemanticIndex]:
+        """Загрузка семантического индекса (None, если он не построен или не соответствует словарю)"""
+        if not self.semantic_dir or not os.path.isdir(self.semantic_dir):
+            return None
+        try:
+            semantic_index = SemanticIndex.load(self.semantic_dir)
+        except Exception as e:
+            print(f"Ошибка при загрузке семантического индекса: {e}")
+            return None
+        if len(semantic_index.term_projection) != len(self.terms) or len(semantic_index) != len(self.doc_ids):
+            print(f"Семантический индекс {self.semantic_dir} устарел, перестройте его: python semantic_index.py")
+            return None
+        return semantic_index
     
     def _load_inverted_index(self) -> Dict[str, List[int]]:
         """Загрузка инвертированного индекса из JSON файла"""
@@ -65,46 +362,33 @@ class SearchEngine:
             print(f"Ошибка при загрузке инвертированного индекса: {e}")
             return {}
     
-    def _load_tokens(self) -> List[str]:
-        """Загрузка списка токенов из файла"""
-        try:
-            with open(self.tokens_path, 'r', encoding='utf-8') as f:
-                return [line.strip() for line in f if line.strip()]
-        except Exception as e:
-            print(f"Ошибка при загрузке токенов: {e}")
-            return []
-    
-    def _load_lemmas(self) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
-        """Загрузка словаря лемм и их форм"""
-        lemmas_dict = {}  # словарь вида {word_form: lemma}
-        lemma_to_forms = {}  # словарь вида {lemma: [word_forms]}
+    def _load_lexicon(self) -> Lexicon:
+        """
+        Загрузка словаря токенов и лемм
         
+        Если Задание 4 сохранило словарь в results/vocabulary и он новее исходных
+        файлов, словарь отображается в память; иначе строится из tokens.txt и lemmas.txt.
+        Сравнивается время изменения самих файлов .npy: Lexicon.save перезаписывает их
+        на месте, и время изменения директории при этом не меняется.
+        """
+        vocabulary_dir = os.path.join(self.tf_idf_dir, 'vocabulary')
         try:
-            with open(self.lemmas_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                        
-                    parts = line.split(':')
-                    if len(parts) != 2:
-                        continue
-                        
-                    lemma = parts[0].strip()
-                    forms = parts[1].strip().split()
-                    
-                    lemma_to_forms[lemma] = forms
-                    
-                    # Добавляем саму лемму как форму
-                    lemmas_dict[lemma] = lemma
-                    
-                    # Каждой форме соответствует лемма
-                    for form in forms:
-                        lemmas_dict[form] = lemma
-        except Exception as e:
-            print(f"Ошибка при загрузке лемм: {e}")
-        
-        return lemmas_dict, lemma_to_forms
+            # Самый старый файл словаря: все массивы должны быть записаны после исходных файлов
+            vocabulary_mtime = min(entry.stat().st_mtime for entry in os.scandir(vocabulary_dir)
+                                   if entry.name.endswith('.npy'))
+            if all(os.path.getmtime(path) <= vocabulary_mtime
+                   for path in (self.tokens_path, self.lemmas_path)):
+                return Lexicon.load(vocabulary_dir)
+        except Exception:
+            pass
+        return Lexicon.from_files(self.tokens_path, self.lemmas_path)
+    
+    def _set_lexicon(self, lexicon: Lexicon):
+        """Установка словаря токенов и лемм"""
+        self.lexicon = lexicon
+        self.tokens = lexicon.tokens
+        self.lemmas_dict = lexicon.lemmas_dict
+        self.lemma_to_forms = lexicon.lemma_to_forms
     
     def _get_page_files(self) -> List[str]:
         """Получение списка файлов страниц"""
@@ -146,28 +430,128 @@ class SearchEngine:
         
         return documents_tf_idf
     
+    def _build_postings(self):
+        """
+        Построение словаря терминов и матрицы термин × документ в формате CSR (строка - термин)
+        
+        Веса документов делятся на длину вектора документа, поэтому скалярное
+        произведение с нормированным вектором запроса дает косинусное сходство.
+        """
+        self.doc_ids = np.array(sorted(self.documents_tf_idf), dtype=np.int32)
+        doc_norms = []
+        term_postings = defaultdict(list)
+        
+        for doc_index, doc_id in enumerate(self.doc_ids):
+            doc_vector = self.documents_tf_idf[int(doc_id)]
+            doc_length = math.sqrt(sum(w * w for w in doc_vector.values()))
+            doc_norms.append(doc_length)
+            if doc_length == 0:
+                continue
+            for token, weight in doc_vector.items():
+                if weight > 0:
+                    term_postings[token].append((doc_index, weight / doc_length))
+        
+        # Словарь терминов: термины инвертированного индекса и TF-IDF файлов
+        self.terms = TermDictionary.from_terms(set(self.inverted_index) | set(term_postings))
+        self.term_df = np.array([len(self.inverted_index.get(term, ())) for term in self.terms],
+                                dtype=np.int32)
+        # Расширение шаблонов и опечаток: индекс удалений и словарь перевернутых терминов
+        # строятся при загрузке, до fork воркеров gunicorn, и разделяются ими
+        self.expander = TermExpander(self.terms, weights=self.term_df)
+        self.expander.prepare()
+        
+        offsets = [0]
+        docs = []
+        weights = []
+        for term in self.terms:
+            postings = term_postings.get(term, ())
+            docs.extend(doc_index for doc_index, _ in postings)
+            weights.extend(weight for _, weight in postings)
+            offsets.append(len(docs))
+        
+        self.doc_norms = np.array(doc_norms, dtype=np.float32)
+        self.postings_offsets = np.array(offsets, dtype=np.int64)
+        self.postings_docs = np.array(docs, dtype=np.int32)
+        self.postings_weights = np.array(weights, dtype=np.float32)
+    
+    def get_postings(self, token: str, ranking: str = 'tfidf') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Список вхождений термина
+        
+        :param token: термин
+        :param ranking: функция ранжирования
+        :return: (индексы документов в doc_ids, нормированные веса TF-IDF
+                  или квантованные вклады BM25/BM25F)
+        """
+        if ranking != 'tfidf':
+            return self._impact_index(ranking).postings(token)
+        term_id = self.terms.get(token)
+        if term_id is None:
+            return self.postings_docs[:0], self.postings_weights[:0]
+        start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+        return self.postings_docs[start:end], self.postings_weights[start:end]
+    
+    def validate_ranking(self, ranking: str):
+        """
+        Проверка доступности функции ранжирования
+        
+        :param ranking: функция ранжирования
+        :raises ValueError: если функция неизвестна или ее индекс не построен
+        """
+        if self.shard_pool is not None and ranking != 'tfidf':
+            raise ValueError("Шардированный индекс поддерживает только ранжирование tfidf")
+        if ranking in self.SEMANTIC_RANKINGS:
+            if self.semantic_index is None:
+                raise ValueError("Семантический индекс не построен (запустите semantic_index.py)")
+        elif ranking != 'tfidf':
+            self._impact_index(ranking)
+    
+    def _impact_index(self, ranking: str) -> ImpactIndex:
+        """Индекс вкладов для функции ранжирования"""
+        if ranking not in self.IMPACT_RANKINGS:
+            raise ValueError(f"Неизвестная функция ранжирования: {ranking}")
+        if ranking not in self.impact_indexes:
+            raise ValueError(f"Индекс {ranking} не построен (запустите Задание 4)")
+        return self.impact_indexes[ranking]
+    
     def extract_text_from_html(self, file_path: str) -> str:
         """Извлечение текста из HTML-файла"""
+        increment('html_files_opened')
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 html_content = f.read()
-            
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Удаляем скрипты и стили
-            for script in soup(["script", "style"]):
-                script.extract()
-                
-            # Получаем текст
-            text = soup.get_text(separator=' ')
-            
-            # Чистка текста
-            text = re.sub(r'\s+', ' ', text).strip()
-            return text
+            return self.parse_html(html_content)[0]
         except Exception as e:
             print(f"Ошибка при чтении {file_path}: {e}")
             return ""
     
+    def parse_html(self, html_content: str) -> Tuple[str, str]:
+        """
+        Текст и заголовок HTML-документа
+        
+        :param html_content: HTML-код
+        :return: (текст без скриптов и стилей, заголовок или пустая строка)
+        """
+        soup = BeautifulSoup(html_content, 'html.parser')
+        
+        # Заголовок: title, иначе первый h1
+        title = ''
+        if soup.title and soup.title.string:
+            title = soup.title.string.strip()
+        elif soup.find('h1'):
+            title = soup.find('h1').get_text().strip()
+        
+        # Удаляем скрипты и стили
+        for script in soup(["script", "style"]):
+            script.extract()
+            
+        # Получаем текст
+        text = soup.get_text(separator=' ')
+        
+        # Чистка текста
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text, title
+    
     def get_document_snippet(self, doc_id: int, query_terms: List[str], 
                              max_snippet_length: int = 200) -> str:
         """
@@ -178,19 +562,21 @@ class SearchEngine:
         :param max_snippet_length: максимальная длина фрагмента
         :return: фрагмент документа с выделенными терминами
         """
-        if doc_id not in self.document_id_to_path:
+        # Получаем текст документа (добавленные документы хранятся в памяти)
+        live_document = self.live.document(doc_id)
+        if live_document is not None:
+            text = live_document.text
+        elif doc_id in self.document_id_to_path:
+            text = self.extract_text_from_html(self.document_id_to_path[doc_id])
+        else:
             return ""
         
-        # Получаем текст документа
-        file_path = self.document_id_to_path[doc_id]
-        text = self.extract_text_from_html(file_path)
-        
         # Находим первое вхождение любого из терминов запроса
         best_pos = -1
+        normalized_text = normalize(text)
         
         for term in query_terms:
-            term_lower = term.lower()
-            pos = text.lower().find(term_lower)
+            pos = normalized_text.find(normalize(term))
             if pos != -1 and (best_pos == -1 or pos < best_pos):
                 best_pos = pos
         
@@ -234,11 +620,16 @@ class SearchEngine:
         :param doc_id: ID документа
         :return: заголовок документа
         """
+        live_document = self.live.document(doc_id)
+        if live_document is not None:
+            return live_document.title or f"Документ {doc_id}"
+        
         if doc_id not in self.document_id_to_path:
             return f"Документ {doc_id}"
         
         # Получаем текст документа
         file_path = self.document_id_to_path[doc_id]
+        increment('html_files_opened')
         
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -262,20 +653,34 @@ class SearchEngine:
             print(f"Ошибка при чтении заголовка {file_path}: {e}")
             return f"Документ {doc_id}"
     
+    def suggest(self, prefix: str, limit: int = SUGGEST_TOP_K) -> List[str]:
+        """
+        Подсказки для вводимого запроса
+
+        :param prefix: начало запроса (дополняется последнее слово)
+        :param limit: максимальное количество подсказок
+        :return: дополненные запросы по убыванию популярности термина
+        """
+        return self.suggest_index.suggest(prefix, limit)
+    
     def tokenize_query(self, query: str) -> List[str]:
         """
         Токенизация запроса
         
         :param query: текст запроса
-        :return: список токенов
+        :return: список токенов (символы `*` и `?` сохраняются как шаблон)
         """
-        # Преобразуем в нижний регистр и разбиваем на слова
-        return [word.lower() for word in re.findall(r'\b\w+\b', query.lower())]
+        # Общий токенизатор: нормализация, стоп-слова и короткие слова отбрасываются
+        return tokenize_query(query)
     
     def lemmatize_query(self, query_tokens: List[str]) -> List[str]:
         """
         Лемматизация токенов запроса
         
+        Слова, которых нет ни в словаре лемм, ни в словаре терминов (другие формы
+        слов корпуса), лемматизируются лемматизатором запросов; его лемма
+        используется, только если она есть в индексе.
+        
         :param query_tokens: токены запроса
         :return: лемматизированные токены
         """
@@ -288,8 +693,20 @@ class SearchEngine:
             else:
                 lemmatized_tokens.append(token)
         
+        unknown = [token for token in lemmatized_tokens
+                   if token not in self.lemmas_dict and not is_pattern(token) and self.terms.get(token) is None]
+        if unknown and self.query_lemmatizer is not None:
+            lemmas = self.query_lemmatizer.lemmatize(unknown)
+            lemmatized_tokens = [lemmas[token] if self._is_known_term(lemmas.get(token)) else token
+                                 for token in lemmatized_tokens]
+        
         return lemmatized_tokens
     
+    def _is_known_term(self, term: Optional[str]) -> bool:
+        """Термин есть в основном индексе или в добавленных документах"""
+        return term is not None and (self.terms.get(term) is not None or
+                                     bool(self.live.document_frequency(term)))
+    
     def compute_query_vector(self, query_tokens: List[str]) -> Dict[str, float]:
         """
         Вычисление вектора запроса
@@ -313,9 +730,23 @@ class SearchEngine:
             tf = count / query_length
             
             # Если токен есть в инвертированном индексе, учитываем его IDF
-            if token in self.inverted_index:
-                idf = math.log10(self.documents_count / len(self.inverted_index[token]))
-                query_vector[token] = tf * idf
+            term_id = self.terms.get(token)
+            if term_id is not None and self.term_df[term_id] > 0:
+                query_vector[token] = query_vector.get(token, 0.0) + tf * self._idf(term_id)
+                continue
+            
+            # Термин есть только в добавленных документах
+            live_df = self.live.document_frequency(token)
+            if live_df:
+                query_vector[token] = query_vector.get(token, 0.0) + tf * self._live_idf(live_df, len(self.live))
+                continue
+            
+            # Шаблон или опечатка: вес токена делится между терминами-расширениями
+            expansions = self.expander.expand(token)
+            if expansions:
+                for term in expansions:
+                    weight = tf / len(expansions) * self._idf(self.terms[term])
+                    query_vector[term] = query_vector.get(term, 0.0) + weight
             else:
                 # Если токена нет в индексе, даем ему небольшой вес
                 query_vector[token] = tf * 0.1
@@ -329,6 +760,84 @@ class SearchEngine:
         
         return query_vector
     
+    def compute_query_weights(self, query_tokens: List[str], ranking: str = 'tfidf') -> Dict[str, float]:
+        """
+        Веса терминов запроса для выбранной функции ранжирования
+        
+        Для TF-IDF - нормированный вектор запроса. Для BM25/BM25F - целые
+        частоты терминов в запросе: оценка документа считается целочисленным
+        накоплением квантованных вкладов. Шаблон и слово с опечаткой раскрываются
+        в те же термины, что и для TF-IDF (TermExpander.expand).
+        
+        :param query_tokens: лемматизированные токены запроса
+        :param ranking: функция ранжирования
+        :return: словарь {термин: вес}
+        """
+        if ranking == 'tfidf':
+            return self.compute_query_vector(query_tokens)
+        
+        impact_index = self._impact_index(ranking)
+        weights = Counter()
+        for token, count in Counter(query_tokens).items():
+            if token in impact_index.terms:
+                weights[token] += count
+                continue
+            # Те же расширения, что и в compute_query_vector
+            for term in self.expander.expand(token):
+                if term in impact_index.terms:
+                    weights[term] += count
+        return dict(weights)
+    
+    def score_documents(self, query_weights: Dict[str, float], ranking: str = 'tfidf',
+                        doc_filter: Optional[DocumentFilter] = None) -> np.ndarray:
+        """
+        Оценки всех документов накоплением по спискам вхождений терминов запроса
+        
+        :param query_weights: веса терминов запроса (см. compute_query_weights)
+        :param ranking: функция ранжирования
+        :param doc_filter: фильтр документов: вхождения остальных документов не накапливаются
+        :return: массив оценок в порядке doc_ids (0 у документов, не прошедших фильтр)
+        """
+        if ranking == 'tfidf':
+            scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+            for token, weight in query_weights.items():
+                docs, weights = self._filtered_postings(self.get_postings(token), doc_filter)
+                scores[docs] += weight * weights
+            return scores
+        
+        # BM25/BM25F: целочисленная сумма вкладов, перевод в оценку одним умножением
+        impact_index = self._impact_index(ranking)
+        accumulator = np.zeros(len(self.doc_ids), dtype=np.int32)
+        for token, count in query_weights.items():
+            docs, impacts = self._filtered_postings(impact_index.postings(token), doc_filter)
+            accumulator[docs] += int(count) * impacts.astype(np.int32)
+        return accumulator * np.float32(impact_index.scale)
+    
+    @staticmethod
+    def _filtered_postings(postings: Tuple[np.ndarray, np.ndarray],
+                           doc_filter: Optional[DocumentFilter]) -> Tuple[np.ndarray, np.ndarray]:
+        """Вхождения документов, прошедших фильтр (с учетом просмотренных вхождений в метриках)"""
+        docs, values = postings
+        if doc_filter is None:
+            increment('postings_scanned', len(docs))
+            return docs, values
+        docs, values, examined = doc_filter.restrict(docs, values)
+        increment('postings_scanned', examined)
+        return docs, values
+    
+    def _idf(self, term_id: int) -> float:
+        """IDF термина по документной частоте из инвертированного индекса"""
+        return math.log10(self.documents_count / int(self.term_df[term_id]))
+    
+    def _live_idf(self, live_df: int, live_count: int) -> float:
+        """
+        IDF термина, который встречается только в добавленных документах
+        
+        :param live_df: количество добавленных документов с термином
+        :param live_count: количество добавленных документов
+        """
+        return math.log10((self.documents_count + live_count + 1) / (live_df + 1))
+    
     def compute_cosine_similarity(self, query_vector: Dict[str, float], doc_id: int) -> float:
         """
         Вычисление косинусного сходства между вектором запроса и документа
@@ -337,69 +846,640 @@ class SearchEngine:
         :param doc_id: ID документа
         :return: косинусное сходство
         """
-        if doc_id not in self.documents_tf_idf:
+        doc_index = int(np.searchsorted(self.doc_ids, doc_id))
+        if doc_index >= len(self.doc_ids) or self.doc_ids[doc_index] != doc_id:
             return 0.0
         
-        doc_vector = self.documents_tf_idf[doc_id]
+        # Веса в матрице уже поделены на длину вектора документа, а вектор
+        # запроса нормирован, поэтому скалярное произведение и есть косинус
+        dot_product = 0.0
+        for token, weight in query_vector.items():
+            docs, weights = self.get_postings(token)
+            pos = int(np.searchsorted(docs, doc_index))
+            if pos < len(docs) and docs[pos] == doc_index:
+                dot_product += weight * float(weights[pos])
+        
+        return dot_product
+    
+    def _top_documents(self, scores: np.ndarray, top_n: int,
+                       after: Optional[Cursor] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Документы с наибольшими положительными оценками по убыванию оценки
+        (при равных оценках - по возрастанию ID)
+        
+        :param scores: оценки документов в порядке doc_ids
+        :param top_n: количество результатов
+        :param after: курсор (оценка, позиция в doc_ids): только документы после него
+        :return: (индексы документов в doc_ids, оценки)
+        """
+        matched = np.flatnonzero(scores > 0)
+        if self.live.base_deleted is not None:
+            matched = matched[~self.live.base_deleted[matched]]
+        increment('documents_scored', len(matched))
+        if after is not None:
+            matched = matched[after_mask(scores[matched], matched, after)]
+        matched = matched[top_order(scores[matched], matched, top_n)]
+        return matched, scores[matched]
+    
+    def _rank_tiered(self, query_vector: Dict[str, float], top_n: int,
+                     doc_filter: Optional[DocumentFilter] = None) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Top_n TF-IDF по первому уровню индекса с проверкой точности
+        
+        Верхняя оценка документа - вклады первого уровня плюс вес запроса × граница
+        по терминам, в первом уровне которых документа нет. Кандидаты - документы
+        первого уровня, чья верхняя оценка не ниже top_n-го вклада; их точные оценки
+        считаются двоичным поиском в полных списках вхождений (в том же порядке
+        терминов и с той же точностью, что и score_documents). Результат точен,
+        если документ вне первого уровня (сумма границ) не может обогнать top_n-й.
+        
+        :param query_vector: нормированный вектор запроса TF-IDF
+        :param top_n: количество результатов
+        :param doc_filter: фильтр документов
+        :return: (индексы документов в doc_ids, оценки, признак гарантии): без
+                 гарантии результат приближенный и нужен поиск по полным спискам
+        """
+        docs_parts = []
+        contributions = []
+        covered = []
+        residual = 0.0
+        for token, weight in query_vector.items():
+            term_id = self.terms.get(token)
+            if term_id is None:
+                continue
+            bound = weight * float(self.tiered_index.bounds[term_id])
+            residual += bound
+            docs, weights = self._filtered_postings(self.tiered_index.postings(term_id), doc_filter)
+            docs_parts.append(docs)
+            contributions.append(weight * weights.astype(np.float64))
+            covered.append(np.full(len(docs), bound))
+        if not docs_parts:
+            return self.doc_ids[:0], np.zeros(0, dtype=np.float32), True
+        
+        # Вклады первого уровня и верхние оценки документов, найденных в нем
+        touched, inverse = np.unique(np.concatenate(docs_parts), return_inverse=True)
+        partial = np.bincount(inverse, np.concatenate(contributions), minlength=len(touched))
+        upper = partial + residual - np.bincount(inverse, np.concatenate(covered), minlength=len(touched))
+        if self.live.base_deleted is not None:
+            alive = ~self.live.base_deleted[touched]
+            touched, partial, upper = touched[alive], partial[alive], upper[alive]
+        
+        # Кандидаты: документы, верхняя оценка которых не ниже top_n-го вклада первого
+        # уровня (точная оценка не меньше вклада, поэтому остальные в top_n не попадут)
+        lower = -np.partition(-partial, top_n - 1)[top_n - 1] if len(partial) >= top_n else 0.0
+        candidates = touched[upper + self.TIER_EPSILON >= lower]
+        
+        # Точные оценки кандидатов по полным спискам вхождений
+        exact = np.zeros(len(candidates), dtype=np.float32)
+        for token, weight in query_vector.items():
+            docs, weights = self.get_postings(token)
+            if not len(docs):
+                continue
+            positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+            found = docs[positions] == candidates
+            exact[found] += weight * weights[positions[found]]
+        order = top_order(exact, candidates, top_n)
+        order = order[exact[order] > 0]
+        
+        # Документы, не найденные в первом уровне, набирают не больше суммы границ
+        if len(order) == top_n:
+            guaranteed = residual + self.TIER_EPSILON < float(exact[order[-1]])
+        else:
+            guaranteed = residual <= 0
+        
+        increment('tier1_hits' if guaranteed else 'tier1_fallbacks')
+        increment('documents_scored', len(candidates))
+        return candidates[order], exact[order], guaranteed
+    
+    def search_shards(self, query_vector: Dict[str, float], top_n: int = 10,
+                      after: Optional[Cursor] = None,
+                      doc_filter: Optional[DocumentFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск по шардам: рассылка вектора запроса и слияние top_n шардов
+        
+        Шарды, не ответившие за shard_timeout, пропускаются (счетчик shard_timeouts).
+        
+        :param query_vector: нормированный вектор запроса TF-IDF
+        :param top_n: количество результатов
+        :param after: курсор (оценка, ID документа): только документы после него
+        :param doc_filter: фильтр документов (шардам передается упакованная маска)
+        :return: (индексы документов в doc_ids, оценки) по убыванию оценки
+        """
+        term_ids = [self.terms.get(token) for token in query_vector]
+        weights = [weight for term_id, weight in zip(term_ids, query_vector.values()) if term_id is not None]
+        term_ids = [term_id for term_id in term_ids if term_id is not None]
+        if not term_ids:
+            return self.doc_ids[:0], np.zeros(0, dtype=np.float32)
         
-        # Вычисляем скалярное произведение векторов
-        dot_product = sum(query_vector.get(token, 0) * doc_vector.get(token, 0) 
-                          for token in query_vector)
+        # Удаленные документы отбрасываются после слияния, поэтому у шардов
+        # запрашивается на столько же больше результатов
+        deleted = self.live.base_deleted
+        extra = int(deleted.sum()) if deleted is not None else 0
+        result = self.shard_pool.search(term_ids, weights, top_n + extra,
+                                        doc_index_cursor(after, self.doc_ids),
+                                        doc_filter.packed() if doc_filter is not None else None)
+        increment('postings_scanned', result.scanned)
+        increment('documents_scored', len(result.docs))
+        if result.partial:
+            increment('shard_timeouts', len(result.timed_out) + len(result.failed))
+        keep = ~deleted[result.docs] if deleted is not None else slice(None)
+        return result.docs[keep][:top_n], result.scores[keep][:top_n]
+    
+    def semantic_search(self, query_vector: Dict[str, float], top_n: int = 10,
+                        doc_filter: Optional[DocumentFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск ближайших документов в пространстве LSA
         
-        # Длина вектора документа
-        doc_length = math.sqrt(sum(w * w for w in doc_vector.values()))
+        :param query_vector: нормированный вектор запроса TF-IDF
+        :param top_n: количество результатов
+        :param doc_filter: фильтр документов (применяется к кандидатам списков IVF
+                           до расчета расстояний)
+        :return: (индексы документов в doc_ids, косинусное сходство эмбеддингов)
+        """
+        term_ids = [self.terms.get(token) for token in query_vector]
+        weights = [weight for term_id, weight in zip(term_ids, query_vector.values()) if term_id is not None]
+        term_ids = [term_id for term_id in term_ids if term_id is not None]
+        if not term_ids:
+            return self.doc_ids[:0], np.zeros(0, dtype=np.float32)
         
-        # Длина вектора запроса (должна быть 1, так как мы уже нормализовали)
-        # query_length = math.sqrt(sum(w * w for w in query_vector.values()))
+        deleted = self.live.base_deleted
+        extra = int(deleted.sum()) if deleted is not None else 0
+        docs, scores = self.semantic_index.search(self.semantic_index.embed(term_ids, weights), top_n + extra,
+                                                  allowed=doc_filter.mask if doc_filter is not None else None)
+        increment('documents_scored', len(docs))
+        keep = scores > 0
+        if deleted is not None:
+            keep &= ~deleted[docs]
+        return docs[keep][:top_n], scores[keep][:top_n]
+    
+    def rank_documents(self, lemmatized_tokens: List[str], top_n: int = 10,
+                       ranking: str = 'tfidf',
+                       after: Optional[Cursor] = None,
+                       doc_filter: Optional[DocumentFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Отбор top_n документов для лемматизированного запроса
         
-        # Косинусное сходство = скалярное произведение / (длина вектора запроса * длина вектора документа)
-        if doc_length > 0:
-            return dot_product / doc_length
+        Гибридное ранжирование объединяет top лексического (TF-IDF) и
+        семантического поиска по сумме обратных рангов (Reciprocal Rank Fusion):
+        оценки двух систем несопоставимы, а ранги - сопоставимы.
         
-        return 0.0
+        Документы, добавленные после построения индекса, участвуют в ранжировании
+        TF-IDF (и в лексической части гибридного); удаленные документы исключаются
+        при любом ранжировании. Фильтр применяется до ранжирования: документы, не
+        прошедшие его, не оцениваются.
+        
+        :param lemmatized_tokens: лемматизированные токены запроса
+        :param top_n: количество результатов
+        :param ranking: функция ранжирования
+        :param after: курсор (оценка, ID документа) для лексических ранжирований:
+                      только документы после него в порядке выдачи
+        :param doc_filter: фильтр документов (см. compile_filters)
+        :return: (ID документов, оценки) по убыванию оценки, при равных оценках -
+                 по возрастанию ID
+        :raises ValueError: курсор с семантическим ранжированием
+        """
+        if ranking not in self.SEMANTIC_RANKINGS:
+            with stage('query_vector'):
+                query_weights = self.compute_query_weights(lemmatized_tokens, ranking)
+            if not query_weights:
+                return self.doc_ids[:0].astype(np.int64), np.zeros(0, dtype=np.float32)
+            return self._rank_lexical(query_weights, top_n, ranking, after, doc_filter=doc_filter)
+        
+        if after is not None:
+            raise ValueError(f"Курсор не поддерживается ранжированием {ranking}, используйте offset")
+        
+        with stage('query_vector'):
+            query_vector = self.compute_query_vector(lemmatized_tokens)
+        if ranking == 'semantic':
+            with stage('scoring'):
+                docs, scores = self.semantic_search(query_vector, top_n, doc_filter)
+            return self.doc_ids[docs].astype(np.int64), scores
+        
+        candidates = max(top_n, self.HYBRID_CANDIDATES)
+        lexical_docs, _ = self._rank_lexical(query_vector, candidates, doc_filter=doc_filter)
+        with stage('scoring'):
+            semantic_docs, _ = self.semantic_search(query_vector, candidates, doc_filter)
+        
+        with stage('sorting'):
+            fused = defaultdict(float)
+            for docs in (lexical_docs, self.doc_ids[semantic_docs]):
+                for rank, doc_id in enumerate(docs):
+                    fused[int(doc_id)] += 1.0 / (self.RRF_K + rank + 1)
+            ranked = sorted(fused.items(), key=lambda item: -item[1])[:top_n]
+        return (np.array([doc_id for doc_id, _ in ranked], dtype=np.int64),
+                np.array([score for _, score in ranked], dtype=np.float32))
     
-    def search(self, query: str, top_n: int = 10) -> List[Dict[str, Any]]:
+    def _rank_lexical(self, query_weights: Dict[str, float], top_n: int,
+                      ranking: str = 'tfidf', after: Optional[Cursor] = None,
+                      base_scores: Optional[np.ndarray] = None,
+                      doc_filter: Optional[DocumentFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top_n основного индекса (или шардов) и добавленных документов по спискам вхождений
+        
+        :param after: курсор (оценка, ID документа): только документы после него
+        :param base_scores: уже посчитанные оценки основного индекса (потоковая выдача
+                            считает их один раз для всех страниц)
+        :param doc_filter: фильтр документов; добавленные документы не имеют метаданных
+                           и проходят только фильтр из исключающих условий
+        """
+        with stage('scoring'):
+            if self.shard_pool is not None:
+                docs, scores = self.search_shards(query_weights, top_n, after, doc_filter)
+            else:
+                docs = None
+                # Первый уровень: только первая страница TF-IDF (курсор отбирает документы
+                # ниже top_n первого уровня, их оценки он не гарантирует)
+                if base_scores is None and ranking == 'tfidf' and after is None and \
+                        self.tiered_index is not None:
+                    tier_docs, tier_scores, guaranteed = self._rank_tiered(query_weights, top_n, doc_filter)
+                    if guaranteed:
+                        docs, scores = tier_docs, tier_scores
+                if docs is None and base_scores is None:
+                    base_scores = self.score_documents(query_weights, ranking, doc_filter)
+        
+        with stage('sorting'):
+            if docs is None:
+                docs, scores = self._top_documents(base_scores, top_n, doc_index_cursor(after, self.doc_ids))
+            doc_ids = self.doc_ids[docs].astype(np.int64)
+            if ranking != 'tfidf' or not self.live.segments or \
+                    (doc_filter is not None and not doc_filter.matches_unknown):
+                return doc_ids, scores
+            
+            # Слияние с top_n сегментов добавленных документов
+            live_ids, live_scores, scanned = self.live.search(query_weights, top_n, after)
+            increment('postings_scanned', scanned)
+            increment('documents_scored', len(live_ids))
+            doc_ids = np.concatenate([doc_ids, live_ids])
+            scores = np.concatenate([scores, live_scores])
+            order = top_order(scores, doc_ids, top_n)
+            return doc_ids[order], scores[order]
+    
+    def search(self, query: str, top_n: int = 10, ranking: str = 'tfidf',
+               profile: Optional[SearchProfile] = None, offset: int = 0,
+               after: Optional[Cursor] = None,
+               filters: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
         """
         Поиск документов по запросу
         
+        Глубокие страницы лучше запрашивать курсором after (оценка и ID последнего
+        результата предыдущей страницы): offset отбирает и отбрасывает все
+        предыдущие результаты, а курсор - только документы после него.
+        
+        Условия фильтра (`site:habr.com`, `-lang:en`, `date:>=2025-04-01`, см.
+        document_filters.py в Задании 2) задаются в тексте запроса или параметром filters.
+        
         :param query: текст запроса
         :param top_n: количество возвращаемых результатов
+        :param ranking: функция ранжирования (tfidf, bm25, bm25f, semantic, hybrid)
+        :param profile: профиль для заполнения временем этапов и счетчиками
+                        (заполняется и без реестра метрик)
+        :param offset: количество пропускаемых результатов
+        :param after: курсор search-after (см. pagination.py); только для tfidf, bm25, bm25f
+        :param filters: дополнительные условия фильтра
         :return: список найденных документов с метаданными
+        :raises ValueError: если функция ранжирования, параметры страницы или условия
+                            фильтра некорректны
+        """
+        self.validate_ranking(ranking)
+        self.validate_page(ranking, top_n, offset, after)
+        query, clauses = self.parse_filters(query, filters)
+        self.live.sync()
+        
+        with profiling(self.metrics, profile, ranking=ranking):
+            return self._search(query, top_n, ranking, offset, after, clauses)
+    
+    def parse_filters(self, query: str,
+                      filters: Optional[Sequence[str]] = None) -> Tuple[str, List[FilterClause]]:
+        """
+        Выделение условий фильтра из запроса и дополнительных условий
+        
+        :param query: текст запроса
+        :param filters: дополнительные условия вида `site:habr.com`
+        :return: (запрос без условий, все условия)
+        :raises ValueError: если условие некорректно
         """
+        query, clauses = parse_filters(query)
+        clauses.extend(FilterClause.parse(text) for text in filters or ())
+        return query, clauses
+    
+    def compile_filters(self, clauses: Sequence[FilterClause]) -> Optional[DocumentFilter]:
+        """
+        Маска документов основного индекса, удовлетворяющих условиям
+        
+        :param clauses: условия фильтра
+        :return: фильтр или None, если условий нет
+        """
+        with stage('filter'):
+            return self.filter_index.compile(clauses)
+    
+    def validate_page(self, ranking: str, top_n: int, offset: int = 0, after: Optional[Cursor] = None):
+        """
+        Проверка параметров страницы результатов
+        
+        :raises ValueError: если размер страницы или смещение некорректны, либо
+                            курсор используется с семантическим ранжированием
+        """
+        if top_n < 1:
+            raise ValueError("Размер страницы должен быть положительным")
+        if offset < 0:
+            raise ValueError("Смещение не может быть отрицательным")
+        if after is not None and ranking in self.SEMANTIC_RANKINGS:
+            raise ValueError(f"Курсор не поддерживается ранжированием {ranking}, используйте offset")
+    
+    def _search(self, query: str, top_n: int, ranking: str, offset: int = 0,
+                after: Optional[Cursor] = None,
+                clauses: Sequence[FilterClause] = ()) -> List[Dict[str, Any]]:
+        """Поиск документов по запросу (этапы отмечаются в текущем профиле)"""
         if not query.strip():
             return []
         
         # Токенизация запроса
-        query_tokens = self.tokenize_query(query)
+        with stage('tokenize'):
+            query_tokens = self.tokenize_query(query)
         
         if not query_tokens:
             return []
         
         # Лемматизация запроса
-        lemmatized_tokens = self.lemmatize_query(query_tokens)
+        with stage('lemmatize'):
+            lemmatized_tokens = self.lemmatize_query(query_tokens)
         
-        # Вычисление вектора запроса
-        query_vector = self.compute_query_vector(lemmatized_tokens)
+        # Маска документов, прошедших фильтр, вычисляется до ранжирования
+        doc_filter = self.compile_filters(clauses)
         
-        if not query_vector:
-            return []
+        # Отбор документов страницы выбранной функцией ранжирования
+        matched, scores = self.rank_documents(lemmatized_tokens, offset + top_n, ranking, after, doc_filter)
+        
+        # Заголовки и фрагменты извлекаются только для результатов страницы
+        snippet_terms = [strip_wildcards(token) for token in query_tokens]
+        with stage('metadata'):
+            return [self._document_result(doc_id, score, snippet_terms)
+                    for doc_id, score in zip(matched[offset:].tolist(), scores[offset:].tolist())]
+    
+    def _document_result(self, doc_id: int, score: float,
+                         snippet_terms: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Результат поиска
+        
+        :param snippet_terms: термины для фрагмента; None - без заголовка и фрагмента
+        """
+        result = {'id': doc_id, 'score': score}
+        if snippet_terms is not None:
+            result['title'] = self.get_document_title(doc_id)
+            result['snippet'] = self.get_document_snippet(doc_id, snippet_terms)
+        return result
+    
+    def iter_search(self, query: str, ranking: str = 'tfidf', page_size: int = DEFAULT_PAGE_SIZE,
+                    with_metadata: bool = False,
+                    after: Optional[Cursor] = None,
+                    filters: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Потоковая выдача всех результатов запроса (для выгрузок)
+        
+        Результаты отбираются страницами по page_size с курсором search-after:
+        оценки основного индекса считаются один раз, каждая страница выбирается
+        частичной сортировкой, и в памяти одновременно находится только одна
+        страница результатов, сколько бы документов ни нашлось.
+        
+        :param query: текст запроса
+        :param ranking: функция ранжирования (tfidf, bm25, bm25f)
+        :param page_size: количество результатов, отбираемых за один шаг
+        :param with_metadata: добавлять заголовок и фрагмент (требует чтения HTML)
+        :param after: курсор, с которого продолжается выдача
+        :param filters: дополнительные условия фильтра (условия в тексте запроса тоже учитываются)
+        :return: итератор результатов по убыванию оценки
+        :raises ValueError: для семантического ранжирования (оно возвращает
+                            приближенный top_n, а не все документы)
+        """
+        self.validate_ranking(ranking)
+        if ranking in self.SEMANTIC_RANKINGS:
+            raise ValueError(f"Потоковая выдача не поддерживается ранжированием {ranking}")
+        self.validate_page(ranking, page_size, 0, after)
+        query, clauses = self.parse_filters(query, filters)
+        self.live.sync()
+        
+        query_tokens = self.tokenize_query(query)
+        query_weights = self.compute_query_weights(self.lemmatize_query(query_tokens), ranking)
+        if not query_weights:
+            return iter(())
+        snippet_terms = [strip_wildcards(token) for token in query_tokens] if with_metadata else None
+        return self._iter_pages(query_weights, ranking, page_size, snippet_terms, after,
+                                self.compile_filters(clauses))
+    
+    def _iter_pages(self, query_weights: Dict[str, float], ranking: str, page_size: int,
+                    snippet_terms: Optional[List[str]], after: Optional[Cursor],
+                    doc_filter: Optional[DocumentFilter]) -> Iterator[Dict[str, Any]]:
+        """Страницы результатов с курсором search-after"""
+        base_scores = (self.score_documents(query_weights, ranking, doc_filter)
+                       if self.shard_pool is None else None)
+        while True:
+            doc_ids, scores = self._rank_lexical(query_weights, page_size, ranking, after, base_scores,
+                                                 doc_filter)
+            for doc_id, score in zip(doc_ids.tolist(), scores.tolist()):
+                yield self._document_result(doc_id, score, snippet_terms)
+            if len(doc_ids) < page_size:
+                return
+            after = (float(scores[-1]), int(doc_ids[-1]))
+    
+    def add_document(self, html_content: str, doc_id: Optional[int] = None) -> int:
+        """
+        Добавление документа без перестроения индекса
+        
+        Документ доступен для поиска сразу после возврата из метода. Документ с
+        тем же ID (в том числе из основного индекса) заменяется.
+        
+        :param html_content: HTML-код документа
+        :param doc_id: ID документа (None - следующий свободный)
+        :return: ID документа
+        """
+        return self.live.add(html_content, doc_id)
+    
+    def delete_document(self, doc_id: int) -> bool:
+        """
+        Удаление документа из результатов поиска
         
-        # Вычисление косинусного сходства для всех документов
-        document_scores = []
+        :param doc_id: ID документа
+        :return: True, если документ был найден
+        """
+        return self.live.delete(doc_id)
+    
+    def _vectorize_document(self, html_content: str, live: LiveIndex) -> Tuple[str, str, Dict[str, float]]:
+        """
+        Заголовок, текст и нормированный вектор TF-IDF добавляемого документа
         
-        for doc_id in self.documents_tf_idf:
-            similarity = self.compute_cosine_similarity(query_vector, doc_id)
+        IDF терминов основного индекса берется из него (веса сопоставимы с весами
+        основного индекса); новые слова получают IDF по добавленным документам.
+        """
+        text, title = self.parse_html(html_content)
+        
+        def idf(token: str) -> Optional[float]:
+            term_id = self.terms.get(token)
+            if term_id is not None and self.term_df[term_id] > 0:
+                return self._idf(term_id)
+            if token in self.tokens or is_indexable(token):
+                return self._live_idf(live.document_frequency(token), len(live))
+            return None
+        
+        return title, text, document_vector(text, idf)
+    
+    def iter_search_batch(self, queries: Iterable[str], top_n: int = 10,
+                          with_metadata: bool = False,
+                          max_score_cells: int = 4_000_000,
+                          ranking: str = 'tfidf',
+                          filters: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Пакетный поиск с выдачей результатов по мере готовности
+        
+        Запросы токенизируются и лемматизируются вместе (повторяющиеся токены
+        обрабатываются один раз), списки вхождений общих терминов читаются
+        один раз на пачку, а оценки считаются как произведение разреженной
+        матрицы запросов на матрицу документов. Условия фильтра в тексте запроса
+        и filters действуют так же, как в search.
+        
+        :param queries: тексты запросов
+        :param top_n: количество результатов на запрос
+        :param with_metadata: добавлять заголовок и фрагмент (требует чтения HTML)
+        :param max_score_cells: ограничение размера матрицы оценок (запросы × документы)
+        :param ranking: функция ранжирования (tfidf, bm25, bm25f, semantic, hybrid)
+        :param filters: условия фильтра для всех запросов пачки
+        :return: итератор пар (запрос, результаты) в исходном порядке
+        :raises ValueError: если условие фильтра некорректно
+        """
+        self.validate_ranking(ranking)
+        self.live.sync()
+        documents_count = len(self.doc_ids)
+        if ranking in self.SEMANTIC_RANKINGS or self.shard_pool is not None or documents_count == 0:
+            # Семантический поиск не накапливает оценки по спискам вхождений, а веса
+            # шардов находятся в других процессах: запросы обрабатываются по одному
+            yield from self._iter_ranked_batch(queries, top_n, with_metadata, ranking, filters)
+            return
+        
+        scale = self._impact_index(ranking).scale if ranking != 'tfidf' else 1.0
+        queries = list(queries)
+        # Добавленные документы не входят в матрицу весов: их top_n сливается с top_n
+        # основного индекса для каждого запроса, как в _rank_lexical
+        merge_live = ranking == 'tfidf' and bool(self.live.segments)
+        
+        chunk_size = max(1, max_score_cells // documents_count)
+        lemma_cache = {}
+        
+        for chunk_start in range(0, len(queries), chunk_size):
+            chunk = queries[chunk_start:chunk_start + chunk_size]
+            
+            # Одинаковые запросы внутри пачки считаем один раз
+            unique_queries = list(dict.fromkeys(chunk))
+            row_of_query = {query: row for row, query in enumerate(unique_queries)}
+            query_tokens = {}
+            # Фильтры запросов с условиями: {строка: фильтр}
+            row_filters = {}
+            # Веса запросов для поиска по добавленным документам
+            row_weights = {}
+            
+            # Разреженная матрица запросов, сгруппированная по терминам
+            term_rows = defaultdict(list)
+            term_values = defaultdict(list)
+            
+            for row, query in enumerate(unique_queries):
+                text, clauses = self.parse_filters(query, filters)
+                doc_filter = self.compile_filters(clauses)
+                if doc_filter is not None:
+                    row_filters[row] = doc_filter
+                tokens = self.tokenize_query(text)
+                query_tokens[query] = [strip_wildcards(token) for token in tokens]
+                lemmatized_tokens = []
+                for token in tokens:
+                    if token not in lemma_cache:
+                        lemma_cache[token] = self.lemmatize_query([token])[0]
+                    lemmatized_tokens.append(lemma_cache[token])
+                
+                query_weights = self.compute_query_weights(lemmatized_tokens, ranking)
+                if merge_live:
+                    row_weights[row] = query_weights
+                for token, weight in query_weights.items():
+                    term_rows[token].append(row)
+                    term_values[token].append(weight)
             
-            if similarity > 0:
-                document_scores.append({
-                    'id': doc_id,
-                    'score': similarity,
-                    'title': self.get_document_title(doc_id),
-                    'snippet': self.get_document_snippet(doc_id, query_tokens)
-                })
-        
-        # Сортировка результатов по релевантности (убыванию косинусного сходства)
-        document_scores.sort(key=lambda x: x['score'], reverse=True)
-        
-        # Возвращаем top_n результатов
-        return document_scores[:top_n] 
\ No newline at end of file
+            # Оценки: Q (запросы × термины) @ D (термины × документы)
+            scores = np.zeros((len(unique_queries), documents_count), dtype=np.float32)
+            for token, rows in term_rows.items():
+                docs, weights = self.get_postings(token, ranking)
+                if not len(docs):
+                    continue
+                values = np.array(term_values[token], dtype=np.float32)
+                scores[np.ix_(rows, docs)] += np.outer(values, weights.astype(np.float32))
+            if scale != 1.0:
+                scores *= np.float32(scale)
+            # Документы, не прошедшие фильтр запроса, и удаленные документы основного
+            # индекса не попадают в результаты
+            for row, doc_filter in row_filters.items():
+                scores[row, ~doc_filter.mask] = 0
+            if self.live.base_deleted is not None:
+                scores[:, self.live.base_deleted] = 0
+            
+            # Отбор top_n для каждого запроса в том же порядке, что и у search:
+            # оценка по убыванию, при равных оценках - ID по возрастанию
+            top_rows = {}
+            for query in chunk:
+                row = row_of_query[query]
+                if row not in top_rows:
+                    matched = np.flatnonzero(scores[row] > 0)
+                    matched = matched[top_order(scores[row, matched], matched, top_n)]
+                    doc_ids = self.doc_ids[matched].astype(np.int64)
+                    row_scores = scores[row, matched]
+                    doc_filter = row_filters.get(row)
+                    if merge_live and row_weights[row] and (doc_filter is None or doc_filter.matches_unknown):
+                        live_ids, live_scores, _ = self.live.search(row_weights[row], top_n)
+                        doc_ids = np.concatenate([doc_ids, live_ids])
+                        row_scores = np.concatenate([row_scores, live_scores])
+                        order = top_order(row_scores, doc_ids, top_n)
+                        doc_ids, row_scores = doc_ids[order], row_scores[order]
+                    top_rows[row] = (doc_ids, row_scores)
+                results = []
+                for doc_id, score in zip(*top_rows[row]):
+                    doc_id = int(doc_id)
+                    result = {'id': doc_id, 'score': float(score)}
+                    if with_metadata:
+                        result['title'] = self.get_document_title(doc_id)
+                        result['snippet'] = self.get_document_snippet(doc_id, query_tokens[query])
+                    results.append(result)
+                yield query, results
+    
+    def _iter_ranked_batch(self, queries: Iterable[str], top_n: int, with_metadata: bool,
+                           ranking: str, filters: Optional[Sequence[str]] = None
+                           ) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Пакетный поиск через rank_documents по одному запросу"""
+        lemma_cache = {}
+        for query in queries:
+            text, clauses = self.parse_filters(query, filters)
+            tokens = self.tokenize_query(text)
+            lemmatized_tokens = []
+            for token in tokens:
+                if token not in lemma_cache:
+                    lemma_cache[token] = self.lemmatize_query([token])[0]
+                lemmatized_tokens.append(lemma_cache[token])
+            
+            results = []
+            if lemmatized_tokens:
+                snippet_terms = [strip_wildcards(token) for token in tokens]
+                doc_filter = self.compile_filters(clauses)
+                for doc_id, score in zip(*self.rank_documents(lemmatized_tokens, top_n, ranking,
+                                                              doc_filter=doc_filter)):
+                    results.append(self._document_result(int(doc_id), float(score),
+                                                         snippet_terms if with_metadata else None))
+            yield query, results
+    
+    def search_batch(self, queries: Iterable[str], top_n: int = 10,
+                     with_metadata: bool = False, ranking: str = 'tfidf',
+                     filters: Optional[Sequence[str]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Пакетный поиск документов по множеству запросов
+        
+        :param queries: тексты запросов
+        :param top_n: количество результатов на запрос
+        :param with_metadata: добавлять заголовок и фрагмент документа
+        :param ranking: функция ранжирования (tfidf, bm25, bm25f, semantic, hybrid)
+        :param filters: условия фильтра для всех запросов пачки
+        :return: списки результатов в порядке запросов
+        """
+        return [results for _, results in self.iter_search_batch(queries, top_n, with_metadata,
+                                                                 ranking=ranking, filters=filters)]
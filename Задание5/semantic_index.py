@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Семантический индекс: латентно-семантический анализ (LSA) и приближенный
+поиск ближайших соседей (IVF-PQ)
+
+Матрица TF-IDF (термин × документ) раскладывается усеченным рандомизированным
+SVD: A ≈ U_k S_k V_k^T. Документ представляется проекцией A^T U_k, запрос -
+проекцией q^T U_k, близость - косинус между ними. Поэтому документы находятся
+и по терминам, которых в них нет, но которые встречаются в похожем контексте.
+
+Эмбеддинги документов не хранятся целиком. Они разбиваются k-means на
+списки (IVF), а остаток относительно центра списка кодируется произведением
+квантователей (PQ): m подпространств по 256 центроидов, 1 байт на подпространство.
+При поиске просматриваются nprobe ближайших списков, расстояния считаются
+по таблицам расстояний до центроидов (ADC) без восстановления векторов.
+
+Ошибка квантования PQ ограничивает полноту сверху при любом nprobe, поэтому
+ADC отбирает в REFINE_FACTOR раз больше кандидатов, а итоговый порядок
+считается по эмбеддингам, квантованным в int8 (k байт на документ).
+nprobe подбирается при построении как наименьшее значение, при котором
+полнота@10 относительно точного поиска не ниже target_recall, и хранится в
+индексе.
+
+Пример:
+    python semantic_index.py --output semantic_index --target-recall 0.9
+"""
+
+import argparse
+import math
+import os
+import time
+from collections.abc import Mapping
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 128
+DEFAULT_SUBVECTORS = 16
+# nprobe индексов, построенных без подбора
+DEFAULT_NPROBE = 16
+# Полнота@10, под которую подбирается nprobe при построении
+DEFAULT_TARGET_RECALL = 0.9
+# Во сколько раз больше кандидатов отбирается по PQ для уточнения по int8-эмбеддингам
+REFINE_FACTOR = 50
+PQ_CENTROIDS = 256
+KMEANS_ITERATIONS = 20
+# Центроиды обучаются на случайной выборке, а не на всех документах
+KMEANS_SAMPLE = 65536
+# Ограничение размера промежуточных матриц при умножениях и назначении центроидов
+CHUNK_CELLS = 8_000_000
+
+
+def csr_matmul(offsets: np.ndarray, columns: np.ndarray, values: np.ndarray,
+               dense: np.ndarray) -> np.ndarray:
+    """
+    Произведение разреженной матрицы CSR на плотную
+
+    :param offsets: смещения строк (длина - количество строк + 1)
+    :param columns: столбцы ненулевых элементов
+    :param values: значения ненулевых элементов
+    :param dense: плотная матрица (количество столбцов CSR × r)
+    :return: плотная матрица (количество строк CSR × r)
+    """
+    rows_count = len(offsets) - 1
+    result = np.zeros((rows_count, dense.shape[1]), dtype=np.float32)
+    row_lengths = np.diff(offsets)
+    row_of_value = np.repeat(np.arange(rows_count), row_lengths)
+    step = max(1, CHUNK_CELLS // max(1, dense.shape[1]))
+    for start in range(0, len(values), step):
+        end = min(start + step, len(values))
+        products = values[start:end, None] * dense[columns[start:end]]
+        _accumulate_rows(result, row_of_value[start:end], products)
+    return result
+
+
+def _accumulate_rows(result: np.ndarray, rows: np.ndarray, products: np.ndarray):
+    """Сложение строк products в строки result (rows отсортированы по возрастанию)"""
+    if not len(rows):
+        return
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    result[rows[starts]] += np.add.reduceat(products, starts, axis=0)
+
+
+def csr_transpose(offsets: np.ndarray, columns: np.ndarray, values: np.ndarray,
+                  columns_count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Транспонирование матрицы CSR
+
+    :return: (смещения, столбцы, значения) транспонированной матрицы
+    """
+    rows = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+    order = np.argsort(columns, kind='stable')
+    transposed_offsets = np.zeros(columns_count + 1, dtype=np.int64)
+    transposed_offsets[1:] = np.cumsum(np.bincount(columns, minlength=columns_count))
+    return transposed_offsets, rows[order], values[order]
+
+
+def truncated_svd(offsets: np.ndarray, columns: np.ndarray, values: np.ndarray,
+                  columns_count: int, k: int, oversampling: int = 10,
+                  power_iterations: int = 2, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Усеченное рандомизированное SVD разреженной матрицы (Halko, Martinsson, Tropp)
+
+    :param offsets: смещения строк CSR
+    :param columns: столбцы ненулевых элементов
+    :param values: значения ненулевых элементов
+    :param columns_count: количество столбцов
+    :param k: ранг разложения
+    :param oversampling: дополнительные случайные векторы для точности
+    :param power_iterations: количество степенных итераций
+    :param seed: зерно генератора случайных чисел
+    :return: (левые сингулярные векторы U_k, сингулярные числа S_k)
+    """
+    transposed = csr_transpose(offsets, columns, values, columns_count)
+    rng = np.random.default_rng(seed)
+    rank = min(k + oversampling, len(offsets) - 1, columns_count)
+
+    omega = rng.standard_normal((columns_count, rank)).astype(np.float32)
+    q, _ = np.linalg.qr(csr_matmul(offsets, columns, values, omega))
+    for _ in range(power_iterations):
+        z, _ = np.linalg.qr(csr_matmul(*transposed, q))
+        q, _ = np.linalg.qr(csr_matmul(offsets, columns, values, z))
+
+    # B = Q^T A (rank × столбцы) - малая плотная матрица
+    b = csr_matmul(*transposed, q).T
+    u_b, singular_values, _ = np.linalg.svd(b, full_matrices=False)
+    k = min(k, len(singular_values))
+    return (q @ u_b[:, :k]).astype(np.float32), singular_values[:k].astype(np.float32)
+
+
+def _squared_distances(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Квадраты евклидовых расстояний от точек до центроидов"""
+    return ((x * x).sum(1)[:, None] - 2 * x @ centroids.T + (centroids * centroids).sum(1)[None, :])
+
+
+def assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Ближайший центроид для каждой точки (по частям, чтобы ограничить память)"""
+    labels = np.empty(len(x), dtype=np.int32)
+    step = max(1, CHUNK_CELLS // max(1, len(centroids)))
+    for start in range(0, len(x), step):
+        labels[start:start + step] = _squared_distances(x[start:start + step], centroids).argmin(1)
+    return labels
+
+
+def kmeans(x: np.ndarray, clusters: int, iterations: int = KMEANS_ITERATIONS,
+           seed: int = 0) -> np.ndarray:
+    """
+    Кластеризация k-means на случайной выборке точек
+
+    :param x: точки (n × d)
+    :param clusters: количество кластеров
+    :param iterations: количество итераций Ллойда
+    :param seed: зерно генератора случайных чисел
+    :return: центроиды (clusters × d)
+    """
+    rng = np.random.default_rng(seed)
+    if len(x) > KMEANS_SAMPLE:
+        x = x[rng.choice(len(x), KMEANS_SAMPLE, replace=False)]
+    clusters = min(clusters, len(x))
+    centroids = x[rng.choice(len(x), clusters, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        labels = assign(x, centroids)
+        counts = np.bincount(labels, minlength=clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        # Пустые кластеры переносятся в случайные точки
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+def _subvectors_count(dimensions: int, subvectors: int) -> int:
+    """Наибольший делитель размерности, не превосходящий желаемое количество подпространств"""
+    for m in range(min(subvectors, dimensions), 0, -1):
+        if dimensions % m == 0:
+            return m
+    return 1
+
+
+def quantize_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Скалярное квантование эмбеддингов в int8 с масштабом по измерениям
+
+    :param embeddings: эмбеддинги (документы × k)
+    :return: (коды int8, масштаб float32 длины k): x ≈ коды × масштаб
+    """
+    scale = np.abs(embeddings).max(axis=0) / 127 if len(embeddings) else np.ones(embeddings.shape[1])
+    scale = np.maximum(scale, 1e-12).astype(np.float32)
+    return np.round(embeddings / scale).clip(-127, 127).astype(np.int8), scale
+
+
+class SemanticIndex:
+    """
+    Проекция LSA и индекс IVF-PQ эмбеддингов документов
+    """
+    def __init__(self, term_projection: np.ndarray, coarse_centroids: np.ndarray,
+                 codebooks: np.ndarray, list_offsets: np.ndarray, list_docs: np.ndarray,
+                 codes: np.ndarray, nprobe: int = DEFAULT_NPROBE,
+                 refine_vectors: Optional[np.ndarray] = None,
+                 refine_scale: Optional[np.ndarray] = None):
+        """
+        :param term_projection: проекция терминов U_k (термины × k, float32)
+        :param coarse_centroids: центры списков IVF (списки × k)
+        :param codebooks: центроиды PQ (m × 256 × k/m)
+        :param list_offsets: смещения списков (int64)
+        :param list_docs: документы в порядке списков (индексы в doc_ids, int32)
+        :param codes: коды PQ остатков документов в порядке списков (uint8, документы × m)
+        :param nprobe: количество просматриваемых списков IVF по умолчанию
+        :param refine_vectors: эмбеддинги, квантованные в int8, в порядке doc_ids
+                               (None - порядок по расстояниям PQ)
+        :param refine_scale: масштаб int8 по измерениям (float32, k)
+        """
+        self.term_projection = term_projection
+        self.coarse_centroids = coarse_centroids
+        self.codebooks = codebooks
+        self.list_offsets = list_offsets
+        self.list_docs = list_docs
+        self.codes = codes
+        self.nprobe = int(nprobe)
+        self.refine_vectors = refine_vectors
+        self.refine_scale = refine_scale
+        self.codebook_norms = (codebooks * codebooks).sum(2)
+
+    @property
+    def dimensions(self) -> int:
+        """Размерность эмбеддингов"""
+        return self.term_projection.shape[1]
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Память на один документ: код PQ, номер документа в списке и int8-эмбеддинг"""
+        refine = self.refine_vectors.shape[1] if self.refine_vectors is not None else 0
+        return self.codes.shape[1] * self.codes.itemsize + self.list_docs.itemsize + refine
+
+    @property
+    def nbytes(self) -> int:
+        """Суммарный размер массивов индекса в байтах"""
+        return sum(np.asarray(array).nbytes for array in self.to_arrays().values())
+
+    def __len__(self) -> int:
+        return len(self.list_docs)
+
+    @classmethod
+    def build(cls, offsets: np.ndarray, docs: np.ndarray, weights: np.ndarray,
+              documents_count: int, dimensions: int = DEFAULT_DIMENSIONS,
+              subvectors: int = DEFAULT_SUBVECTORS, lists: int = None,
+              refine: bool = True, seed: int = 0) -> Tuple['SemanticIndex', np.ndarray]:
+        """
+        Построение индекса по матрице термин × документ
+
+        :param offsets: смещения списков вхождений терминов (CSR)
+        :param docs: индексы документов вхождений
+        :param weights: веса вхождений (TF-IDF, нормированные по документу)
+        :param documents_count: количество документов
+        :param dimensions: размерность эмбеддингов
+        :param subvectors: количество подпространств PQ (байт на код)
+        :param lists: количество списков IVF (по умолчанию 4·√документов)
+        :param refine: хранить int8-эмбеддинги для уточнения порядка кандидатов
+        :param seed: зерно генератора случайных чисел
+        :return: (индекс, точные нормированные эмбеддинги документов для оценки полноты)
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        docs = np.asarray(docs, dtype=np.int32)
+        weights = np.asarray(weights, dtype=np.float32)
+
+        term_projection, _ = truncated_svd(offsets, docs, weights, documents_count,
+                                           dimensions, seed=seed)
+        embeddings = csr_matmul(*csr_transpose(offsets, docs, weights, documents_count),
+                                term_projection)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+
+        return cls.from_embeddings(term_projection, embeddings, subvectors, lists, refine, seed), embeddings
+
+    @classmethod
+    def from_embeddings(cls, term_projection: np.ndarray, embeddings: np.ndarray,
+                        subvectors: int = DEFAULT_SUBVECTORS, lists: int = None,
+                        refine: bool = True, seed: int = 0) -> 'SemanticIndex':
+        """
+        Построение индекса IVF-PQ по готовым эмбеддингам документов
+
+        :param term_projection: проекция терминов (термины × k)
+        :param embeddings: нормированные эмбеддинги документов (документы × k)
+        :param subvectors: количество подпространств PQ (байт на код)
+        :param lists: количество списков IVF (по умолчанию 4·√документов)
+        :param refine: хранить int8-эмбеддинги для уточнения порядка кандидатов
+        :param seed: зерно генератора случайных чисел
+        :return: индекс (nprobe по умолчанию, см. tune_nprobe)
+        """
+        dimensions = embeddings.shape[1]
+        m = _subvectors_count(dimensions, subvectors)
+        lists = lists or max(1, int(round(4 * math.sqrt(len(embeddings)))))
+
+        # IVF: разбиение на списки
+        coarse_centroids = kmeans(embeddings, lists, seed=seed)
+        labels = assign(embeddings, coarse_centroids)
+        residuals = (embeddings - coarse_centroids[labels]).reshape(len(embeddings), m, -1)
+
+        # PQ: отдельный квантователь остатков в каждом подпространстве
+        codebooks = np.zeros((m, PQ_CENTROIDS, dimensions // m), dtype=np.float32)
+        codes = np.zeros((len(embeddings), m), dtype=np.uint8)
+        for j in range(m):
+            centroids = kmeans(residuals[:, j], PQ_CENTROIDS, seed=seed + j + 1)
+            # Если документов меньше 256, лишние центроиды остаются нулевыми и не используются
+            codebooks[j, :len(centroids)] = centroids
+            codes[:, j] = assign(residuals[:, j], centroids)
+
+        order = np.argsort(labels, kind='stable')
+        list_offsets = np.zeros(len(coarse_centroids) + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(labels, minlength=len(coarse_centroids)))
+        refine_vectors, refine_scale = quantize_int8(embeddings) if refine else (None, None)
+        return cls(term_projection, coarse_centroids, codebooks, list_offsets,
+                   order.astype(np.int32), codes[order],
+                   refine_vectors=refine_vectors, refine_scale=refine_scale)
+
+    def embed(self, term_ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """
+        Эмбеддинг запроса (проекция вектора запроса на U_k)
+
+        :param term_ids: идентификаторы терминов запроса
+        :param weights: веса терминов запроса
+        :return: нормированный вектор (нулевой, если термины не найдены)
+        """
+        vector = np.asarray(weights, dtype=np.float32) @ self.term_projection[term_ids]
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def search(self, vector: np.ndarray, top_n: int = 10,
+               nprobe: Optional[int] = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Приближенный поиск ближайших документов
+
+        :param vector: нормированный эмбеддинг запроса
+        :param top_n: количество результатов
+        :param nprobe: количество просматриваемых списков IVF (None - сохраненное в индексе)
+        :param allowed: булева маска допустимых документов (кандидаты отбрасываются
+                        до расчета расстояний); None - все документы
+        :return: (индексы документов в doc_ids, косинусное сходство) по убыванию сходства
+        """
+        if not len(self.list_docs) or not np.any(vector):
+            return self.list_docs[:0], np.zeros(0, dtype=np.float32)
+
+        nprobe = min(nprobe or self.nprobe, len(self.coarse_centroids))
+        coarse = ((self.coarse_centroids - vector) ** 2).sum(1)
+        probes = np.argpartition(coarse, nprobe - 1)[:nprobe]
+
+        # Таблицы расстояний от остатков запроса до центроидов PQ (списки × m × 256):
+        # ||r - b||^2 = ||r||^2 - 2 r·b + ||b||^2, где сумма ||r_j||^2 по подпространствам -
+        # расстояние до центра списка
+        m = self.codebooks.shape[0]
+        residuals = (vector - self.coarse_centroids[probes]).reshape(len(probes), m, -1)
+        tables = (self.codebook_norms[None] - 2 * np.einsum('pmd,mkd->pmk', residuals, self.codebooks)
+                  + coarse[probes, None, None] / m)
+
+        starts, ends = self.list_offsets[probes], self.list_offsets[probes + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return self.list_docs[:0], np.zeros(0, dtype=np.float32)
+        positions = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        probe_of_candidate = np.repeat(np.arange(len(probes)), lengths)
+        if allowed is not None:
+            keep = allowed[self.list_docs[positions]]
+            positions, probe_of_candidate = positions[keep], probe_of_candidate[keep]
+        candidates = self.list_docs[positions]
+        distances = tables[probe_of_candidate[:, None], np.arange(m), self.codes[positions]].sum(1)
+
+        shortlist = top_n * REFINE_FACTOR if self.refine_vectors is not None else top_n
+        if len(candidates) > shortlist:
+            top = np.argpartition(distances, shortlist - 1)[:shortlist]
+            candidates, distances = candidates[top], distances[top]
+        if self.refine_vectors is not None:
+            # Точнее PQ: скалярное произведение с int8-эмбеддингами кандидатов
+            similarities = (self.refine_vectors[candidates] @ (vector * self.refine_scale)).astype(np.float32)
+            order = np.argsort(-similarities, kind='stable')[:top_n]
+            return candidates[order], similarities[order]
+        order = np.argsort(distances, kind='stable')
+        # Для единичных векторов ||q - x||^2 = 2 - 2 cos(q, x)
+        return candidates[order], (1 - distances[order] / 2).astype(np.float32)
+
+    def recall(self, embeddings: np.ndarray, queries: int = 200, top_n: int = 10,
+               nprobe: Optional[int] = None, seed: int = 0) -> float:
+        """
+        Полнота приближенного поиска относительно точного на выборке документов-запросов
+
+        :param embeddings: точные нормированные эмбеддинги (см. build)
+        :param queries: количество запросов
+        :param top_n: глубина сравнения
+        :param nprobe: количество просматриваемых списков IVF (None - сохраненное в индексе)
+        :param seed: зерно генератора случайных чисел
+        :return: доля точных top_n, найденных приближенным поиском
+        """
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(len(embeddings), min(queries, len(embeddings)), replace=False)
+        found = 0
+        total = 0
+        for doc_index in sample:
+            exact = np.argsort(-(embeddings @ embeddings[doc_index]), kind='stable')[:top_n]
+            approximate, _ = self.search(embeddings[doc_index], top_n, nprobe)
+            found += len(np.intersect1d(exact, approximate))
+            total += len(exact)
+        return found / total if total else 1.0
+
+    def tune_nprobe(self, embeddings: np.ndarray,
+                    target_recall: float = DEFAULT_TARGET_RECALL) -> Tuple[int, float]:
+        """
+        Подбор nprobe: наименьшая степень двойки с полнотой@10 не ниже target_recall
+
+        Если цель недостижима (ее ограничивает квантование), выбирается nprobe с
+        наибольшей полнотой. Результат сохраняется в self.nprobe.
+
+        :param embeddings: точные нормированные эмбеддинги (см. build)
+        :param target_recall: требуемая полнота@10
+        :return: (nprobe, полнота@10 при нем)
+        """
+        lists = len(self.coarse_centroids)
+        candidates = [1 << power for power in range(lists.bit_length()) if 1 << power < lists] + [lists]
+        best = (0.0, lists)
+        for nprobe in candidates:
+            recall = self.recall(embeddings, nprobe=nprobe)
+            if recall >= target_recall:
+                best = (recall, nprobe)
+                break
+            if recall > best[0]:
+                best = (recall, nprobe)
+        self.nprobe = best[1]
+        return best[1], best[0]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Массивы индекса для сохранения"""
+        arrays = {
+            'term_projection': self.term_projection,
+            'coarse_centroids': self.coarse_centroids,
+            'codebooks': self.codebooks,
+            'list_offsets': self.list_offsets,
+            'list_docs': self.list_docs,
+            'codes': self.codes,
+            'nprobe': np.array([self.nprobe], dtype=np.int64),
+        }
+        if self.refine_vectors is not None:
+            arrays['refine_vectors'] = self.refine_vectors
+            arrays['refine_scale'] = self.refine_scale
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping) -> 'SemanticIndex':
+        """Индекс из массивов, сохраненных методом to_arrays"""
+        # Массивы из снимка одномерны: формы восстанавливаются по размерностям
+        lists = len(arrays['list_offsets']) - 1
+        dimensions = arrays['coarse_centroids'].size // max(lists, 1)
+        m = arrays['codes'].size // len(arrays['list_docs']) if len(arrays['list_docs']) else 1
+        # Индексы, построенные до подбора nprobe и уточнения, их не содержат
+        nprobe = int(arrays['nprobe'][0]) if 'nprobe' in arrays else DEFAULT_NPROBE
+        refine_vectors = arrays['refine_vectors'].reshape(-1, dimensions) if 'refine_vectors' in arrays else None
+        return cls(arrays['term_projection'].reshape(-1, dimensions),
+                   arrays['coarse_centroids'].reshape(-1, dimensions),
+                   arrays['codebooks'].reshape(m, PQ_CENTROIDS, -1),
+                   arrays['list_offsets'], arrays['list_docs'],
+                   arrays['codes'].reshape(-1, m), nprobe,
+                   refine_vectors, arrays.get('refine_scale'))
+
+    def save(self, directory: str):
+        """Сохранение индекса в директорию (по одному .npy файлу на массив)"""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.to_arrays().items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'SemanticIndex':
+        """Загрузка индекса, сохраненного методом save"""
+        mmap_mode = 'r' if mmap else None
+        arrays = {}
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.npy'):
+                arrays[file_name[:-4]] = np.load(os.path.join(directory, file_name), mmap_mode=mmap_mode)
+        return cls.from_arrays(arrays)
+
+
+def main():
+    from search_engine import SearchEngine
+
+    parser = argparse.ArgumentParser(description='Построение семантического индекса (LSA + IVF-PQ)')
+    parser.add_argument('--output', default='semantic_index', help='директория индекса')
+    parser.add_argument('--dimensions', type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument('--subvectors', type=int, default=DEFAULT_SUBVECTORS)
+    parser.add_argument('--lists', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, default=None,
+                        help='просматриваемых списков IVF (по умолчанию подбирается под --target-recall)')
+    parser.add_argument('--target-recall', type=float, default=DEFAULT_TARGET_RECALL,
+                        help='полнота@10, под которую подбирается nprobe')
+    parser.add_argument('--no-refine', action='store_true',
+                        help='не хранить int8-эмбеддинги (порядок только по PQ, меньше памяти)')
+    # Пути те же, что у поисковой системы: индекс должен соответствовать ее словарю терминов
+    parser.add_argument('--index-path', default='../Задание3/inverted_index.json')
+    parser.add_argument('--tokens-path', default='../Задание2/tokens.txt')
+    parser.add_argument('--lemmas-path', default='../Задание2/lemmas.txt')
+    parser.add_argument('--pages-dir', default='../Задание_1/crawler/data/pages')
+    parser.add_argument('--tf-idf-dir', default='../Задание4/results')
+    args = parser.parse_args()
+
+    engine = SearchEngine(index_path=args.index_path,
+                          tokens_path=args.tokens_path,
+                          lemmas_path=args.lemmas_path,
+                          pages_dir=args.pages_dir,
+                          tf_idf_dir=args.tf_idf_dir,
+                          semantic_dir=None)
+
+    start_time = time.time()
+    index, embeddings = SemanticIndex.build(engine.postings_offsets, engine.postings_docs,
+                                            engine.postings_weights, len(engine.doc_ids),
+                                            dimensions=args.dimensions,
+                                            subvectors=args.subvectors, lists=args.lists,
+                                            refine=not args.no_refine)
+    build_time = time.time() - start_time
+    if args.nprobe is not None:
+        index.nprobe = args.nprobe
+        recall = index.recall(embeddings)
+    else:
+        _, recall = index.tune_nprobe(embeddings, args.target_recall)
+    index.save(args.output)
+
+    print(f"Семантический индекс сохранен в {args.output}")
+    print(f"Документов: {len(index)}, размерность: {index.dimensions}, "
+          f"списков IVF: {len(index.coarse_centroids)}, построение: {build_time:.1f} с")
+    print(f"Память на вектор: {index.bytes_per_vector} байт "
+          f"(float32 без сжатия: {index.dimensions * 4} байт), всего: {index.nbytes / 2**20:.1f} МБ")
+    print(f"Полнота@10 при nprobe={index.nprobe}: {recall:.3f}")
+    if args.nprobe is None and recall < args.target_recall:
+        print(f"Полнота {args.target_recall} недостижима при {args.subvectors} байтах PQ: "
+              f"увеличьте --subvectors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Шардированный индекс: разбиение документов на N шардов и поиск scatter-gather
+
+Документы распределяются по шардам по кругу (документ с позицией i в doc_ids
+попадает в шард i % N). Каждый шард хранит свою матрицу термин × документ с
+локальными документными частотами, а словари, список документов и глобальные
+документные частоты (по ним считается IDF) записываются один раз в глобальную
+часть индекса. Веса в шардах - те же нормированные TF-IDF с глобальным IDF,
+поэтому оценки документов из разных шардов сопоставимы.
+
+Структура директории:
+    <output>/global.snapshot     - словари, doc_ids, глобальные term_df
+    <output>/shard_NNN.snapshot  - матрица весов шарда и позиции его документов
+
+При поиске координатор (SearchEngine с параметром shards_dir) один раз строит
+вектор запроса и рассылает его процессам шардов через multiprocessing.Pipe.
+Каждый шард возвращает свой top_n, координатор сливает их в глобальный top_n.
+Шарды, не ответившие за timeout секунд, пропускаются: результат частичный.
+Фильтр документов передается шардам упакованной маской (бит на документ).
+
+Пример:
+    python sharding.py --shards 4 --output shards
+"""
+
+import argparse
+import heapq
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Фильтры документов находятся в Задании 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Задание2'))
+from document_filters import DocumentFilter
+from pagination import Cursor, after_mask, top_order
+from snapshot import Snapshot, dictionary_sections, source_signature, write_sections
+
+GLOBAL_FILE = 'global.snapshot'
+DEFAULT_SHARD_TIMEOUT = 1.0
+# Время на запуск процессов шардов (импорт NumPy и отображение файлов в память)
+STARTUP_TIMEOUT = 60.0
+
+
+def shard_path(shards_dir: str, shard: int) -> str:
+    """Путь к файлу шарда"""
+    return os.path.join(shards_dir, f"shard_{shard:03d}.snapshot")
+
+
+def partition_postings(offsets: np.ndarray, docs: np.ndarray, weights: np.ndarray,
+                       documents_count: int, shards: int, shard: int) -> Dict[str, np.ndarray]:
+    """
+    Матрица термин × документ одного шарда
+
+    :param offsets: смещения списков вхождений терминов (CSR)
+    :param docs: позиции документов в doc_ids
+    :param weights: веса вхождений
+    :param documents_count: количество документов
+    :param shards: количество шардов
+    :param shard: номер шарда
+    :return: секции шарда: offsets, docs (локальные позиции), weights,
+             term_df (локальные документные частоты), doc_indices (позиции в doc_ids)
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    docs = np.asarray(docs)
+    term_of_posting = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    mask = docs % shards == shard
+    term_df = np.bincount(term_of_posting[mask], minlength=len(offsets) - 1).astype(np.int32)
+    shard_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(term_df, out=shard_offsets[1:])
+    return {
+        'offsets': shard_offsets,
+        # При распределении по кругу локальная позиция - частное от деления на N
+        'docs': (docs[mask] // shards).astype(np.int32),
+        'weights': np.asarray(weights, dtype=np.float32)[mask],
+        'term_df': term_df,
+        'doc_indices': np.arange(shard, documents_count, shards, dtype=np.int32),
+    }
+
+
+def build_shards(engine, shards: int, output_dir: str):
+    """
+    Запись шардированного индекса поисковой системы
+
+    :param engine: загруженная поисковая система
+    :param shards: количество шардов
+    :param output_dir: директория индекса
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    meta = {
+        'documents_count': engine.documents_count,
+        'sources': source_signature(engine),
+        'shards': shards,
+    }
+    write_sections(os.path.join(output_dir, GLOBAL_FILE), dictionary_sections(engine), meta)
+
+    for shard in range(shards):
+        sections = partition_postings(engine.postings_offsets, engine.postings_docs,
+                                      engine.postings_weights, len(engine.doc_ids), shards, shard)
+        write_sections(shard_path(output_dir, shard), sections, {'shard': shard, 'shards': shards})
+        print(f"Шард {shard}: {len(sections['doc_indices'])} документов, "
+              f"{len(sections['docs'])} вхождений")
+
+
+class IndexShard:
+    """
+    Матрица весов одного шарда, отображенная в память
+    """
+    def __init__(self, path: str):
+        """
+        :param path: путь к файлу шарда
+        """
+        self._snapshot = Snapshot(path)
+        self.offsets = self._snapshot.array('offsets')
+        self.docs = self._snapshot.array('docs')
+        self.weights = self._snapshot.array('weights')
+        self.doc_indices = self._snapshot.array('doc_indices')
+
+    def search(self, term_ids: Sequence[int], weights: Sequence[float],
+               top_n: int, after: Optional[Cursor] = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Top_n документов шарда накоплением по спискам вхождений
+
+        :param term_ids: номера терминов запроса в глобальном словаре
+        :param weights: веса терминов запроса
+        :param top_n: количество результатов
+        :param after: курсор (оценка, позиция в глобальном doc_ids): только документы после него
+        :param allowed: упакованная маска документов фильтра по глобальным позициям
+                        (DocumentFilter.packed); None - без фильтра
+        :return: (позиции документов в глобальном doc_ids, оценки по убыванию,
+                  количество просмотренных вхождений)
+        """
+        doc_filter = DocumentFilter.unpack(allowed, self.doc_indices) if allowed is not None else None
+        scores = np.zeros(len(self.doc_indices), dtype=np.float32)
+        scanned = 0
+        for term_id, weight in zip(term_ids, weights):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, term_weights = self.docs[start:end], self.weights[start:end]
+            if doc_filter is not None:
+                docs, term_weights, examined = doc_filter.restrict(docs, term_weights)
+            else:
+                examined = len(docs)
+            scores[docs] += np.float32(weight) * term_weights
+            scanned += int(examined)
+
+        matched = np.flatnonzero(scores > 0)
+        doc_indices = self.doc_indices[matched].astype(np.int64)
+        if after is not None:
+            keep = after_mask(scores[matched], doc_indices, after)
+            matched, doc_indices = matched[keep], doc_indices[keep]
+        order = top_order(scores[matched], doc_indices, top_n)
+        return doc_indices[order], scores[matched[order]], scanned
+
+
+def _shard_worker(path: str, connection):
+    """
+    Цикл процесса шарда: запрос (id, термины, веса, top_n, курсор, фильтр) -> (id, результат)
+
+    Результат - кортеж search() или строка с текстом ошибки.
+    """
+    try:
+        shard = IndexShard(path)
+    except Exception as e:
+        connection.send((None, f"Ошибка при загрузке шарда {path}: {e}"))
+        return
+    connection.send((None, None))
+
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        request_id, term_ids, weights, top_n, after, allowed = message
+        try:
+            result = shard.search(term_ids, weights, top_n, after, allowed)
+        except Exception as e:
+            result = f"Ошибка поиска в шарде {path}: {e}"
+        try:
+            connection.send((request_id, result))
+        except (BrokenPipeError, OSError):
+            break
+
+
+class _Gather:
+    """
+    Ожидание ответов шардов на один запрос
+    """
+    def __init__(self, shards: int):
+        self._condition = threading.Condition()
+        self.results: List[Optional[tuple]] = [None] * shards
+        self.failed: List[int] = []
+        self._pending = shards
+
+    def deliver(self, shard: int, result):
+        """Ответ шарда (строка - ошибка)"""
+        with self._condition:
+            if isinstance(result, str):
+                self.failed.append(shard)
+            else:
+                self.results[shard] = result
+            self._pending -= 1
+            self._condition.notify()
+
+    def wait(self, timeout: float) -> bool:
+        """Ожидание всех ответов; False, если время вышло"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending <= 0, timeout)
+
+
+class ShardResult:
+    """
+    Слитый результат поиска по шардам
+    """
+    def __init__(self, docs: np.ndarray, scores: np.ndarray, scanned: int,
+                 timed_out: List[int], failed: List[int]):
+        self.docs = docs
+        self.scores = scores
+        self.scanned = scanned
+        self.timed_out = timed_out
+        self.failed = failed
+
+    @property
+    def partial(self) -> bool:
+        """Часть шардов не ответила"""
+        return bool(self.timed_out or self.failed)
+
+
+class ShardPool:
+    """
+    Процессы шардов и рассылка им запросов
+
+    Процессы запускаются при первом поиске в текущем процессе: под gunicorn с
+    preload_app индекс загружается в мастере, а каналы и потоки чтения не
+    переживают fork, поэтому каждый воркер запускает собственные процессы шардов
+    (данные шардов разделяются между ними через page cache).
+    """
+    def __init__(self, paths: List[str], timeout: float = DEFAULT_SHARD_TIMEOUT):
+        """
+        :param paths: пути к файлам шардов
+        :param timeout: время ожидания ответа шарда в секундах
+        """
+        self.paths = paths
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._processes = []
+        self._connections = []
+        self._send_locks = []
+        self._alive = []
+        self._pending: Dict[int, _Gather] = {}
+        self._request_ids = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def start(self):
+        """Запуск процессов шардов (повторный вызов в том же процессе ничего не делает)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # spawn: процесс шарда не наследует потоки и память координатора
+            context = multiprocessing.get_context('spawn')
+            self._processes, self._connections, self._send_locks, self._alive = [], [], [], []
+            self._pending = {}
+            for shard, path in enumerate(self.paths):
+                parent_connection, child_connection = context.Pipe()
+                process = context.Process(target=_shard_worker, args=(path, child_connection),
+                                          name=f"shard-{shard}", daemon=True)
+                process.start()
+                child_connection.close()
+                self._processes.append(process)
+                self._connections.append(parent_connection)
+                self._send_locks.append(threading.Lock())
+
+            for shard, connection in enumerate(self._connections):
+                alive = False
+                try:
+                    if connection.poll(STARTUP_TIMEOUT):
+                        _, error = connection.recv()
+                        alive = error is None
+                        if error:
+                            print(error)
+                    else:
+                        print(f"Шард {shard} не запустился за {STARTUP_TIMEOUT} с")
+                except (EOFError, OSError):
+                    print(f"Процесс шарда {shard} завершился при запуске")
+                self._alive.append(alive)
+            # Один поток читает ответы всех шардов
+            threading.Thread(target=self._read_responses, name='shard-reader', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _read_responses(self):
+        """Поток чтения ответов шардов (поздние ответы на истекшие запросы отбрасываются)"""
+        shard_of = {connection: shard for shard, connection in enumerate(self._connections)
+                    if self._alive[shard]}
+        while shard_of:
+            for connection in multiprocessing.connection.wait(list(shard_of)):
+                shard = shard_of[connection]
+                try:
+                    request_id, result = connection.recv()
+                except (EOFError, OSError):
+                    del shard_of[connection]
+                    self._shard_exited(shard)
+                    continue
+                with self._lock:
+                    gather = self._pending.get(request_id)
+                if gather is not None:
+                    gather.deliver(shard, result)
+
+    def _shard_exited(self, shard: int):
+        """Отметка завершившегося шарда: ожидающие запросы не ждут его ответа"""
+        print(f"Шард {shard} завершился")
+        with self._lock:
+            self._alive[shard] = False
+            pending = list(self._pending.values())
+        for gather in pending:
+            if gather.results[shard] is None and shard not in gather.failed:
+                gather.deliver(shard, 'shard exited')
+
+    def search(self, term_ids: Sequence[int], weights: Sequence[float], top_n: int,
+               after: Optional[Cursor] = None, allowed: Optional[np.ndarray] = None) -> ShardResult:
+        """
+        Поиск во всех шардах и слияние их top_n
+
+        :param term_ids: номера терминов запроса в глобальном словаре
+        :param weights: веса терминов запроса
+        :param top_n: количество результатов
+        :param after: курсор (оценка, позиция в глобальном doc_ids): только документы после него
+        :param allowed: упакованная маска документов фильтра (None - без фильтра)
+        :return: глобальный top_n и список шардов без ответа
+        """
+        self.start()
+        request_id = next(self._request_ids)
+        gather = _Gather(len(self.paths))
+        with self._lock:
+            self._pending[request_id] = gather
+        message = (request_id, list(term_ids), list(weights), top_n, after, allowed)
+
+        try:
+            for shard, connection in enumerate(self._connections):
+                if not self._alive[shard]:
+                    gather.deliver(shard, 'shard is down')
+                    continue
+                try:
+                    with self._send_locks[shard]:
+                        connection.send(message)
+                except (BrokenPipeError, OSError):
+                    gather.deliver(shard, 'send failed')
+            gather.wait(self.timeout)
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+        results = list(gather.results)
+        failed = list(gather.failed)
+        timed_out = [shard for shard, result in enumerate(results)
+                     if result is None and shard not in failed]
+
+        # Слияние отсортированных top_n шардов в глобальный top_n
+        candidates = itertools.chain.from_iterable(
+            zip(result[1].tolist(), result[0].tolist()) for result in results if result is not None)
+        merged = heapq.nlargest(top_n, candidates, key=lambda item: (item[0], -item[1]))
+        return ShardResult(np.array([doc for _, doc in merged], dtype=np.int64),
+                           np.array([score for score, _ in merged], dtype=np.float32),
+                           sum(result[2] for result in results if result is not None),
+                           timed_out, failed)
+
+    def close(self):
+        """Остановка процессов шардов"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._pid = None
+        for connection, send_lock in zip(self._connections, self._send_locks):
+            try:
+                with send_lock:
+                    connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+        for connection in self._connections:
+            connection.close()
+
+
+def main():
+    from search_engine import SearchEngine
+
+    parser = argparse.ArgumentParser(description='Построение шардированного индекса поисковой системы')
+    parser.add_argument('--shards', type=int, default=4, help='количество шардов')
+    parser.add_argument('--output', default='shards', help='директория шардированного индекса')
+    parser.add_argument('--snapshot-path', default=None, help='снимок индекса для ускорения загрузки')
+    parser.add_argument('--index-path', default='../Задание3/inverted_index.json')
+    parser.add_argument('--tokens-path', default='../Задание2/tokens.txt')
+    parser.add_argument('--lemmas-path', default='../Задание2/lemmas.txt')
+    parser.add_argument('--pages-dir', default='../Задание_1/crawler/data/pages')
+    parser.add_argument('--tf-idf-dir', default='../Задание4/results')
+    parser.add_argument('--suggest-queries', default=None,
+                        help='файл с запросами для учета популярности в подсказках')
+    parser.add_argument('--crawl-index-path', default='../Задание_1/crawler/data/index.txt',
+                        help='индексный файл краулера (URL и метаданные страниц для фильтров)')
+    args = parser.parse_args()
+
+    if args.shards < 1:
+        parser.error('количество шардов должно быть положительным')
+
+    engine = SearchEngine(index_path=args.index_path,
+                          tokens_path=args.tokens_path,
+                          lemmas_path=args.lemmas_path,
+                          pages_dir=args.pages_dir,
+                          tf_idf_dir=args.tf_idf_dir,
+                          suggest_queries=args.suggest_queries,
+                          crawl_index_path=args.crawl_index_path,
+                          snapshot_path=args.snapshot_path,
+                          semantic_dir=None)
+    build_shards(engine, args.shards, args.output)
+    print(f"Шардированный индекс сохранен в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Снимок индекса поисковой системы
+
+Все структуры, нужные во время поиска (словарь терминов, словарь лемм,
+список документов, веса и нормы), записываются в один версионированный файл.
+Числовые массивы отображаются в память через mmap без копирования, поэтому
+загрузка занимает миллисекунды вместо разбора десятков тысяч текстовых файлов.
+
+Формат файла:
+    8 байт   - сигнатура SNAPSHOT_MAGIC
+    4 байта  - версия формата (little-endian uint32)
+    4 байта  - длина заголовка (little-endian uint32)
+    заголовок - JSON с метаданными и таблицей секций
+    секции   - массивы NumPy, выровненные по 8 байт
+
+Пример:
+    python snapshot.py --output index.snapshot
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b'OIPSNAP\x00'
+SNAPSHOT_VERSION = 4
+SECTION_ALIGNMENT = 8
+# Манифест результатов Задания 4 (записывается последним, см. Задание4/main.py)
+TF_IDF_MANIFEST = 'manifest.json'
+
+
+def _file_signature(path: str) -> Optional[List[int]]:
+    """Размер и время изменения файла (None, если файла нет)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _dir_signature(path: str, suffix: str = '') -> Optional[List[int]]:
+    """Количество файлов, суммарный размер и максимальное время изменения в директории"""
+    try:
+        entries = [entry for entry in os.scandir(path) if entry.name.endswith(suffix)]
+    except OSError:
+        return None
+    stats = [entry.stat() for entry in entries]
+    return [len(stats),
+            sum(stat.st_size for stat in stats),
+            max((stat.st_mtime_ns for stat in stats), default=0)]
+
+
+def _results_signature(tf_idf_dir: str) -> Optional[List[int]]:
+    """
+    Сигнатура результатов Задания 4 по их манифесту
+
+    Без манифеста (результаты старой версии Задания 4) обходятся все файлы директории.
+    """
+    signature = _file_signature(os.path.join(tf_idf_dir, TF_IDF_MANIFEST))
+    return signature if signature is not None else _dir_signature(tf_idf_dir)
+
+
+def source_signature(engine) -> Dict[str, Any]:
+    """
+    Сигнатура исходных файлов поисковой системы
+
+    Снимок считается устаревшим, если сигнатура при загрузке не совпадает
+    с сохраненной в снимке. Проверка не зависит от количества документов:
+    директория страниц сравнивается по времени изменения (добавление и удаление
+    страниц), результаты Задания 4 - по манифесту.
+
+    :param engine: поисковая система (используются только пути к данным)
+    :return: словарь с размерами и временами изменения исходных файлов
+    """
+    return {
+        'index': _file_signature(engine.index_path),
+        'tokens': _file_signature(engine.tokens_path),
+        'lemmas': _file_signature(engine.lemmas_path),
+        'pages': _file_signature(engine.pages_dir),
+        'tf_idf': _results_signature(engine.tf_idf_dir),
+        'semantic': _dir_signature(engine.semantic_dir) if engine.semantic_dir else None,
+        'suggest_queries': suggest_signature(engine),
+        'crawl_index': _file_signature(engine.crawl_index_path) if engine.crawl_index_path else None,
+    }
+
+
+def suggest_signature(engine) -> Optional[List[int]]:
+    """
+    Сигнатура журнала запросов для подсказок
+
+    При ее изменении перестраивается только индекс подсказок, а не весь снимок.
+
+    :param engine: поисковая система
+    :return: размер и время изменения журнала (None, если журнал не задан)
+    """
+    return _file_signature(engine.suggest_queries) if engine.suggest_queries else None
+
+
+def encode_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Кодирование списка строк в UTF-8 блоб со смещениями
+
+    Строки разделяются символом перевода строки, смещение i указывает на начало
+    i-й строки, последнее смещение - на конец блоба (плюс разделитель).
+
+    :param strings: список строк (без символов перевода строки)
+    :return: (блоб uint8, смещения int64)
+    """
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) + 1 for b in encoded])
+    blob = np.frombuffer(b'\n'.join(encoded) + (b'\n' if encoded else b''), dtype=np.uint8)
+    return blob, offsets
+
+
+def decode_strings(blob: np.ndarray, count: int) -> List[str]:
+    """Декодирование всех строк блоба одним вызовом"""
+    if count == 0:
+        return []
+    return blob.tobytes().decode('utf-8').split('\n')[:count]
+
+
+class Snapshot:
+    """
+    Снимок индекса, отображенный в память
+    """
+    def __init__(self, path: str):
+        """
+        Открытие снимка
+
+        :param path: путь к файлу снимка
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic = self._mmap[:8]
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Файл {path} не является снимком индекса")
+
+        version, header_length = struct.unpack('<II', self._mmap[8:16])
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия снимка: {version}")
+
+        header = json.loads(self._mmap[16:16 + header_length].decode('utf-8'))
+        self.meta = header['meta']
+        self.sections = header['sections']
+
+    def array(self, name: str) -> np.ndarray:
+        """
+        Массив секции без копирования данных
+
+        :param name: имя секции
+        :return: массив NumPy только для чтения
+        """
+        dtype, offset, count = self.sections[name]
+        return np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=offset)
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """
+        Все массивы секций с заданным префиксом имени
+
+        :param prefix: префикс имени секции
+        :return: словарь {имя без префикса: массив}
+        """
+        return {name[len(prefix):]: self.array(name)
+                for name in self.sections if name.startswith(prefix)}
+
+    def strings(self, name: str) -> List[str]:
+        """
+        Список строк, сохраненный функцией encode_strings
+
+        :param name: имя строковой таблицы
+        :return: список строк
+        """
+        offsets = self.array(f"{name}.offsets")
+        return decode_strings(self.array(f"{name}.blob"), len(offsets) - 1)
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    Загрузка снимка индекса
+
+    :param path: путь к файлу снимка
+    :return: снимок или None, если файла нет или он поврежден
+    """
+    if not os.path.exists(path):
+        print(f"Снимок не найден: {path}")
+        return None
+    try:
+        return Snapshot(path)
+    except Exception as e:
+        print(f"Ошибка при загрузке снимка {path}: {e}")
+        return None
+
+
+def dictionary_sections(engine) -> Dict[str, np.ndarray]:
+    """
+    Секции словарей и списка документов (все, кроме весов)
+
+    Используются и полным снимком, и глобальной частью шардированного индекса
+    (см. sharding.py).
+
+    :param engine: загруженная поисковая система
+    :return: словарь {имя секции: массив}
+    """
+    sections = {}
+
+    # Словарь терминов и документные частоты
+    for name, array in engine.terms.to_arrays('terms.').items():
+        sections[name] = np.asarray(array)
+    sections['term_df'] = np.asarray(engine.term_df, dtype=np.int32)
+
+    # Индекс удалений для нечеткого расширения терминов
+    for name, array in engine.expander.deletion_index.items():
+        sections[f"expansion.{name}"] = np.asarray(array)
+    # Словарь перевернутых терминов для шаблонов с ведущей `*`
+    for name, array in engine.expander.reverse_index.items():
+        sections[f"reverse.{name}"] = np.asarray(array)
+
+    # Словарь токенов и лемм (Lexicon из Задания 2)
+    for name, array in engine.lexicon.to_arrays().items():
+        sections[f"lexicon.{name}"] = np.asarray(array)
+
+    # Подсказки запросов (префиксы терминов с лучшими дополнениями)
+    for name, array in engine.suggest_index.to_arrays().items():
+        sections[f"suggest.{name}"] = np.asarray(array)
+
+    # Битовые карты и столбцы метаданных для фильтров
+    for name, array in engine.filter_index.to_arrays().items():
+        sections[f"filters.{name}"] = np.asarray(array)
+
+    # Документы
+    sections['page_files.blob'], sections['page_files.offsets'] = encode_strings(engine.page_files)
+    sections['doc_ids'] = np.asarray(engine.doc_ids, dtype=np.int32)
+    sections['doc_norms'] = np.asarray(engine.doc_norms, dtype=np.float32)
+    return sections
+
+
+def write_sections(path: str, sections: Dict[str, np.ndarray], meta: Dict[str, Any]):
+    """
+    Запись массивов в файл формата снимка
+
+    Файл записывается во временный и атомарно переименовывается.
+
+    :param path: путь к файлу
+    :param sections: словарь {имя секции: массив}
+    :param meta: метаданные заголовка
+    """
+    # Таблица секций: смещения считаются от начала файла, поэтому
+    # размер заголовка подбирается итеративно (он зависит от смещений)
+    header_length = 0
+    while True:
+        offset = 16 + header_length
+        table = {}
+        for name, array in sections.items():
+            offset += -offset % SECTION_ALIGNMENT
+            table[name] = [array.dtype.str, offset, int(array.size)]
+            offset += array.nbytes
+        header = json.dumps({'meta': meta, 'sections': table}, ensure_ascii=False).encode('utf-8')
+        if len(header) == header_length:
+            break
+        header_length = len(header)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack('<II', SNAPSHOT_VERSION, header_length))
+        f.write(header)
+        for name, array in sections.items():
+            f.write(b'\0' * (table[name][1] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, path)
+
+
+def write_snapshot(engine, path: str):
+    """
+    Запись снимка всех структур поисковой системы, используемых при поиске
+
+    :param engine: загруженная поисковая система
+    :param path: путь к файлу снимка
+    """
+    sections = dictionary_sections(engine)
+
+    # Матрица весов
+    sections['postings_offsets'] = np.asarray(engine.postings_offsets, dtype=np.int64)
+    sections['postings_docs'] = np.asarray(engine.postings_docs, dtype=np.int32)
+    sections['postings_weights'] = np.asarray(engine.postings_weights, dtype=np.float32)
+
+    # Первый уровень матрицы весов (лучшие вхождения терминов)
+    if engine.tiered_index is not None:
+        for name, array in engine.tiered_index.to_arrays().items():
+            sections[f"tiers.{name}"] = np.asarray(array)
+
+    # Квантованные вклады BM25/BM25F (документы уже заменены на позиции в doc_ids)
+    for ranking, impact_index in engine.impact_indexes.items():
+        for name, array in impact_index.to_arrays().items():
+            sections[f"impacts.{ranking}.{name}"] = np.asarray(array)
+
+    # Семантический индекс (LSA + IVF-PQ)
+    if engine.semantic_index is not None:
+        for name, array in engine.semantic_index.to_arrays().items():
+            sections[f"semantic.{name}"] = np.asarray(array)
+
+    meta = {
+        'documents_count': engine.documents_count,
+        'sources': source_signature(engine),
+    }
+    write_sections(path, sections, meta)
+
+
+def main():
+    from search_engine import SearchEngine
+    from tiered_index import DEFAULT_TIER_SIZE
+
+    parser = argparse.ArgumentParser(description='Компиляция снимка индекса поисковой системы')
+    parser.add_argument('--output', default='index.snapshot', help='путь к файлу снимка')
+    parser.add_argument('--index-path', default='../Задание3/inverted_index.json')
+    parser.add_argument('--tokens-path', default='../Задание2/tokens.txt')
+    parser.add_argument('--lemmas-path', default='../Задание2/lemmas.txt')
+    parser.add_argument('--pages-dir', default='../Задание_1/crawler/data/pages')
+    parser.add_argument('--tf-idf-dir', default='../Задание4/results')
+    parser.add_argument('--suggest-queries', default=None,
+                        help='файл с запросами для учета популярности в подсказках')
+    parser.add_argument('--crawl-index-path', default='../Задание_1/crawler/data/index.txt',
+                        help='индексный файл краулера (URL и метаданные страниц для фильтров)')
+    parser.add_argument('--semantic-dir', default='semantic_index')
+    parser.add_argument('--tier-size', type=int, default=DEFAULT_TIER_SIZE,
+                        help='вхождений термина в первом уровне индекса (0 - без первого уровня)')
+    args = parser.parse_args()
+
+    engine = SearchEngine(index_path=args.index_path,
+                          tokens_path=args.tokens_path,
+                          lemmas_path=args.lemmas_path,
+                          pages_dir=args.pages_dir,
+                          tf_idf_dir=args.tf_idf_dir,
+                          suggest_queries=args.suggest_queries,
+                          crawl_index_path=args.crawl_index_path,
+                          semantic_dir=args.semantic_dir,
+                          tier_size=args.tier_size)
+    write_snapshot(engine, args.output)
+    print(f"Снимок сохранен в {args.output} ({os.path.getsize(args.output)} байт)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Индекс подсказок запроса (автодополнение)
+
+Для каждого префикса терминов длиной до MAX_PREFIX_LENGTH символов заранее
+вычисляются SUGGEST_TOP_K лучших дополнений. Префиксы хранятся в отдельном
+TermDictionary (поиск префикса за O(1) по хеш-таблице), дополнения - матрицей
+идентификаторов терминов (строка - префикс). Вес термина - документная частота
+из инвертированного индекса плюс популярность термина в журнале запросов.
+
+Для более длинных префиксов лучшие дополнения выбираются из диапазона
+отсортированного словаря терминов (диапазон префикса находится за O(log n)
+и при такой длине префикса мал), поэтому весь словарь не просматривается.
+"""
+
+from collections import Counter
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from term_dictionary import TermDictionary
+from text_tokenizer import TOKEN_PATTERN, is_pattern, normalize, tokenize_query
+
+SUGGEST_TOP_K = 10
+MAX_PREFIX_LENGTH = 6
+# Вес одного вхождения термина в журнал запросов относительно одного документа
+QUERY_POPULARITY_WEIGHT = 1.0
+
+
+def suggestion_scores(terms: TermDictionary, term_df: np.ndarray,
+                      queries: Optional[Iterable[str]] = None) -> np.ndarray:
+    """
+    Веса терминов для подсказок
+
+    :param terms: словарь терминов
+    :param term_df: документные частоты терминов
+    :param queries: запросы из журнала (None - только документные частоты)
+    :return: вес каждого термина (0 - термин не подсказывается)
+    """
+    scores = np.asarray(term_df, dtype=np.float32).copy()
+    if queries is None:
+        return scores
+    counts = Counter(token for query in queries for token in tokenize_query(query) if not is_pattern(token))
+    for token, count in counts.items():
+        term_id = terms.get(token)
+        # Подсказываются только термины, по которым что-то найдется
+        if term_id is not None and scores[term_id] > 0:
+            scores[term_id] += QUERY_POPULARITY_WEIGHT * count
+    return scores
+
+
+def read_queries(path: str) -> List[str]:
+    """Запросы из файла (по одному на строку); пустой список, если файл не прочитан"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    except Exception as e:
+        print(f"Ошибка при чтении журнала запросов {path}: {e}")
+        return []
+
+
+class SuggestIndex:
+    """
+    Префиксы терминов с заранее вычисленными лучшими дополнениями
+    """
+    def __init__(self, terms: TermDictionary, scores: np.ndarray,
+                 prefixes: TermDictionary, completions: np.ndarray):
+        """
+        :param terms: словарь терминов
+        :param scores: веса терминов
+        :param prefixes: словарь префиксов
+        :param completions: идентификаторы лучших терминов каждого префикса
+                            (префиксы × top_k, -1 - пустая позиция)
+        """
+        self.terms = terms
+        self.scores = scores
+        self.prefixes = prefixes
+        self.completions = completions
+
+    @property
+    def top_k(self) -> int:
+        return self.completions.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Суммарный размер массивов индекса в байтах"""
+        return self.prefixes.nbytes + self.completions.nbytes + np.asarray(self.scores).nbytes
+
+    @classmethod
+    def build(cls, terms: TermDictionary, scores: np.ndarray,
+              top_k: int = SUGGEST_TOP_K,
+              max_prefix_length: int = MAX_PREFIX_LENGTH) -> 'SuggestIndex':
+        """
+        Построение индекса подсказок
+
+        Термины словаря отсортированы, поэтому термины с общим префиксом идут
+        подряд: для каждой длины префикса группы находятся сравнением соседних
+        префиксов, а лучшие термины групп - одной сортировкой.
+
+        :param terms: словарь терминов
+        :param scores: веса терминов (термины с нулевым весом не подсказываются)
+        :param top_k: количество дополнений на префикс
+        :param max_prefix_length: максимальная длина префикса с готовыми дополнениями
+        :return: индекс подсказок
+        """
+        scores = np.asarray(scores, dtype=np.float32)
+        term_list = terms.terms()
+        candidates = np.flatnonzero(scores > 0)
+        candidate_terms = [term_list[term_id] for term_id in candidates]
+        lengths = np.array([len(term) for term in candidate_terms], dtype=np.int32)
+
+        node_prefixes: List[str] = []
+        node_rows: List[np.ndarray] = []
+        for length in range(1, max_prefix_length + 1):
+            selected = np.flatnonzero(lengths >= length)
+            if not len(selected):
+                break
+            prefixes = [candidate_terms[i][:length] for i in selected]
+            # Номер группы - количество смен префикса до текущего термина
+            changes = np.fromiter((prefixes[i] != prefixes[i - 1] for i in range(1, len(prefixes))),
+                                  dtype=bool, count=len(prefixes) - 1)
+            groups = np.concatenate(([0], np.cumsum(changes)))
+            group_starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+
+            # Внутри группы - по убыванию веса, при равенстве - по алфавиту
+            term_ids = candidates[selected]
+            order = np.lexsort((term_ids, -scores[term_ids], groups))
+            ranks = np.arange(len(order)) - group_starts[groups[order]]
+            keep = ranks < top_k
+
+            rows = np.full((len(group_starts), top_k), -1, dtype=np.int32)
+            rows[groups[order][keep], ranks[keep]] = term_ids[order][keep]
+            node_prefixes.extend(prefixes[start] for start in group_starts)
+            node_rows.append(rows)
+
+        prefix_dictionary = TermDictionary.from_terms(node_prefixes)
+        completions = np.full((len(prefix_dictionary), top_k), -1, dtype=np.int32)
+        if node_rows:
+            # Строки матрицы идут в порядке идентификаторов словаря префиксов
+            positions = np.array([prefix_dictionary[prefix] for prefix in node_prefixes], dtype=np.int64)
+            completions[positions] = np.concatenate(node_rows)
+        return cls(terms, scores, prefix_dictionary, completions)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Массивы индекса для сохранения (словарь терминов сохраняется отдельно)"""
+        arrays = self.prefixes.to_arrays('prefixes.')
+        arrays['completions'] = self.completions
+        arrays['scores'] = self.scores
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping, terms: TermDictionary) -> 'SuggestIndex':
+        """Индекс из массивов, сохраненных методом to_arrays"""
+        prefixes = TermDictionary.from_arrays(arrays, 'prefixes.')
+        completions = arrays['completions'].reshape(max(len(prefixes), 1), -1)[:len(prefixes)]
+        return cls(terms, arrays['scores'], prefixes, completions)
+
+    def complete(self, prefix: str, limit: int = SUGGEST_TOP_K) -> List[str]:
+        """
+        Лучшие термины, начинающиеся с префикса
+
+        :param prefix: нормализованный префикс
+        :param limit: максимальное количество терминов
+        :return: термины по убыванию веса
+        """
+        if not prefix or limit <= 0:
+            return []
+        limit = min(limit, self.top_k)
+        node = self.prefixes.get(prefix)
+        if node is not None:
+            term_ids = self.completions[node, :limit]
+            return [self.terms.term(int(term_id)) for term_id in term_ids if term_id >= 0]
+
+        # Префикс длиннее сохраненных: лучшие термины его диапазона в словаре
+        start, end = self.terms.prefix_range(prefix)
+        if start >= end:
+            return []
+        scores = self.scores[start:end]
+        top = np.flatnonzero(scores > 0)
+        if len(top) > limit:
+            top = top[np.argpartition(-scores[top], limit - 1)[:limit]]
+        top = top[np.lexsort((top, -scores[top]))]
+        return [self.terms.term(start + int(i)) for i in top]
+
+    def suggest(self, text: str, limit: int = SUGGEST_TOP_K) -> List[str]:
+        """
+        Подсказки для вводимого запроса: дополняется последнее слово
+
+        :param text: начало запроса
+        :param limit: максимальное количество подсказок
+        :return: запросы с дополненным последним словом
+        """
+        normalized = normalize(text)
+        words = TOKEN_PATTERN.findall(normalized)
+        # Последнее слово еще вводится, только если запрос не заканчивается разделителем
+        if not words or not normalized.endswith(words[-1]):
+            return []
+        head = ' '.join(words[:-1])
+        return [f"{head} {term}" if head else term for term in self.complete(words[-1], limit)]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Первый уровень индекса со статическим прунингом (tiered index)
+
+Для каждого термина в первый уровень попадают не более tier_size вхождений с
+наибольшими нормированными весами TF-IDF (вкладами в косинус); второй уровень -
+полная матрица весов поисковой системы. Для каждого термина хранится граница:
+наибольший вес среди вхождений, не попавших в первый уровень.
+
+Граница дает верхнюю оценку любого документа по первому уровню: сумма найденных
+в первом уровне вкладов плюс вес запроса × граница по терминам, в первом уровне
+которых документа нет. Документ, не найденный в первом уровне, набирает не
+больше суммы границ; если это меньше точной оценки top_n-го документа первого
+уровня, результат совпадает с полным поиском (см. SearchEngine._rank_tiered),
+иначе запрос выполняется по второму уровню.
+"""
+
+from collections.abc import Mapping
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Вхождений термина в первом уровне по умолчанию
+DEFAULT_TIER_SIZE = 128
+
+
+class TieredIndex:
+    """
+    Первый уровень индекса: лучшие вхождения терминов и границы отброшенных весов
+    """
+    def __init__(self, offsets: np.ndarray, docs: np.ndarray, weights: np.ndarray,
+                 bounds: np.ndarray, tier_size: int):
+        """
+        :param offsets: смещения списков вхождений терминов (int64)
+        :param docs: документы первого уровня, по возрастанию внутри термина (int32)
+        :param weights: нормированные веса TF-IDF (float32)
+        :param bounds: наибольший вес вхождения термина вне первого уровня (0 - термин
+                       целиком в первом уровне)
+        :param tier_size: максимум вхождений термина в первом уровне
+        """
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+        self.bounds = bounds
+        self.tier_size = int(tier_size)
+
+    @classmethod
+    def build(cls, offsets: np.ndarray, docs: np.ndarray, weights: np.ndarray,
+              tier_size: int = DEFAULT_TIER_SIZE) -> 'TieredIndex':
+        """
+        Построение первого уровня из полной матрицы весов в формате CSR
+
+        :param offsets: смещения списков вхождений терминов
+        :param docs: документы списков вхождений (по возрастанию внутри термина)
+        :param weights: веса вхождений
+        :param tier_size: максимум вхождений термина в первом уровне
+        :return: первый уровень индекса
+        """
+        lengths = np.diff(offsets)
+        bounds = np.zeros(len(lengths), dtype=np.float32)
+        keep = np.ones(len(docs), dtype=bool)
+        # Короткие списки целиком попадают в первый уровень
+        for term_id in np.flatnonzero(lengths > tier_size).tolist():
+            start, end = int(offsets[term_id]), int(offsets[term_id + 1])
+            order = np.argpartition(-weights[start:end], tier_size)
+            keep[start + order[tier_size:]] = False
+            bounds[term_id] = weights[start + order[tier_size]]
+
+        # Смещения первого уровня: количество оставленных вхождений до начала термина
+        kept = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept[1:])
+        return cls(kept[offsets], np.asarray(docs)[keep].astype(np.int32),
+                   np.asarray(weights)[keep].astype(np.float32), bounds, tier_size)
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Вхождения термина в первом уровне
+
+        :param term_id: номер термина
+        :return: (индексы документов в doc_ids, нормированные веса)
+        """
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.docs[start:end], self.weights[start:end]
+
+    @property
+    def nbytes(self) -> int:
+        """Объем памяти массивов первого уровня"""
+        return self.offsets.nbytes + self.docs.nbytes + self.weights.nbytes + self.bounds.nbytes
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Массивы первого уровня для сохранения"""
+        return {
+            'offsets': self.offsets,
+            'docs': self.docs,
+            'weights': self.weights,
+            'bounds': self.bounds,
+            'tier_size': np.array([self.tier_size], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping) -> 'TieredIndex':
+        """Первый уровень из массивов, сохраненных методом to_arrays"""
+        return cls(arrays['offsets'], arrays['docs'], arrays['weights'], arrays['bounds'],
+                   int(arrays['tier_size'][0]))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Точка входа WSGI для продакшен-запуска
+
+Пример:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Индекс загружается при импорте модуля. С preload_app = True (см. gunicorn.conf.py)
+импорт выполняется в мастер-процессе один раз, а воркеры получают уже
+загруженные структуры через fork.
+
+Если рядом есть актуальный снимок индекса (см. snapshot.py), он загружается
+через mmap; путь задается переменной окружения SEARCH_SNAPSHOT.
+
+Шардированный индекс (см. sharding.py) подключается переменной SEARCH_SHARDS,
+время ожидания ответа шарда - SEARCH_SHARD_TIMEOUT (секунды).
+
+Документы, добавленные через POST /api/documents, записываются в журнал
+SEARCH_DOCUMENTS_LOG (по умолчанию live_documents.jsonl): все воркеры применяют
+его записи перед поиском, а после перезапуска документы восстанавливаются.
+
+С переменной SEARCH_GENERATION_POINTER индекс загружается из поколения, на
+которое указывает файл-указатель, и перезагружается без остановки сервиса
+при изменении указателя (см. reloader.py).
+
+Подсказки /api/suggest ранжируются по документной частоте термина; файл
+запросов SEARCH_SUGGEST_QUERIES (по одному на строку) добавляет к весу
+популярность термина в запросах.
+
+Журнал запросов /search и /api/search включается переменной SEARCH_QUERY_LOG -
+директорией файлов журнала (см. query_log.py); по журналу replay.py
+воспроизводит нагрузку.
+
+SEARCH_METRICS_DIR - общая директория метрик воркеров (задается в gunicorn.conf.py):
+/metrics отдает сумму метрик всех воркеров, а не только ответившего.
+"""
+
+import os
+
+from app import create_app
+from query_log import QueryLog
+
+query_log_dir = os.environ.get('SEARCH_QUERY_LOG')
+app = create_app(snapshot_path=os.environ.get('SEARCH_SNAPSHOT', 'index.snapshot'),
+                 generation_pointer=os.environ.get('SEARCH_GENERATION_POINTER'),
+                 query_log=QueryLog(query_log_dir) if query_log_dir else None,
+                 shards_dir=os.environ.get('SEARCH_SHARDS'),
+                 shard_timeout=float(os.environ.get('SEARCH_SHARD_TIMEOUT', 1.0)),
+                 documents_log=os.environ.get('SEARCH_DOCUMENTS_LOG', 'live_documents.jsonl'),
+                 suggest_queries=os.environ.get('SEARCH_SUGGEST_QUERIES'),
+                 metrics_dir=os.environ.get('SEARCH_METRICS_DIR'))
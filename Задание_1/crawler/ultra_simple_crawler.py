@@ -1,16 +1,46 @@
 #!/usr/bin/env python3
 import os
+import re
 import time
+import codecs
 import random
+import datetime
 import requests
-from typing import List
+from typing import List, Optional
 from bs4 import BeautifulSoup
 
-urls_file = "config/urls.txt"
+try:
+    from charset_normalizer import from_bytes
+except ImportError:  # зависимость requests, но может отсутствовать
+    from_bytes = None
 
-pages_dir = "data/pages"
+# Пути и параметры можно переопределить переменными окружения (см. benchmarks/README.md)
+urls_file = os.environ.get("OIP_CRAWLER_URLS_FILE", "config/urls.txt")
 
-index_file = "data/index.txt"
+pages_dir = os.environ.get("OIP_PAGES_DIR", "data/pages")
+
+index_file = os.environ.get("OIP_CRAWLER_INDEX_FILE", "data/index.txt")
+
+max_pages = int(os.environ.get("OIP_CRAWLER_MAX_PAGES", 100))
+
+min_delay = float(os.environ.get("OIP_CRAWLER_MIN_DELAY", 1.0))
+max_delay = float(os.environ.get("OIP_CRAWLER_MAX_DELAY", 3.0))
+
+# Страницы больше лимита не скачиваются до конца и не сохраняются
+max_page_bytes = int(os.environ.get("OIP_CRAWLER_MAX_PAGE_BYTES", 5 * 1024 * 1024))
+
+# Тело ответа читается и перекодируется блоками этого размера
+chunk_size = 64 * 1024
+
+html_content_types = ('text/html', 'application/xhtml+xml')
+
+charset_pattern = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Кодировка из <meta charset> или <meta http-equiv="Content-Type" content="...; charset=...">
+meta_charset_pattern = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Атрибут lang тега <html>: язык страницы для фильтров поиска
+html_lang_pattern = re.compile(r'<html[^>]*?\blang\s*=\s*["\']?([a-zA-Z]{2,3})', re.IGNORECASE)
 
 os.makedirs(pages_dir, exist_ok=True)
 os.makedirs(os.path.dirname(index_file), exist_ok=True)
@@ -25,28 +55,102 @@ def load_urls(file_path: str) -> List[str]:
     print(f"Загружено {len(urls)} URL из файла {file_path}")
     return urls
 
-def download_page(url: str) -> str:
+def normalize_charset(name: Optional[str]) -> Optional[str]:
+    """Каноническое имя кодировки или None, если Python ее не знает"""
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+def detect_charset(header_charset: Optional[str], head: bytes) -> str:
+    """
+    Кодировка страницы: из заголовка Content-Type, из <meta> в начале страницы,
+    и только если их нет - угадывание по первому блоку (charset_normalizer)
+    """
+    charset = normalize_charset(header_charset)
+    if charset:
+        return charset
+    meta = meta_charset_pattern.search(head)
+    charset = normalize_charset(meta.group(1).decode('ascii', 'ignore') if meta else None)
+    if charset:
+        return charset
+    if from_bytes is not None and head:
+        best = from_bytes(head).best()
+        charset = normalize_charset(best.encoding if best else None)
+        if charset:
+            return charset
+    return 'utf-8'
+
+def transcode(source: str, target: str, charset: str):
+    """Перекодирование файла в UTF-8 блоками (в памяти только один блок)"""
+    decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+    with open(source, 'rb') as src, open(target, 'w', encoding='utf-8') as dst:
+        for chunk in iter(lambda: src.read(chunk_size), b''):
+            dst.write(decoder.decode(chunk))
+        dst.write(decoder.decode(b'', final=True))
+
+def download_page(url: str, file_id: int) -> Optional[str]:
+    """
+    Потоковая загрузка страницы в файл в UTF-8
+
+    Ответы не-HTML типов отклоняются по заголовкам, до чтения тела; тело
+    пишется на диск блоками и не дочитывается, если превышает max_page_bytes.
+    Возвращает путь к сохраненной странице или None.
+    """
+    file_path = os.path.join(pages_dir, f"page_{file_id:03d}.html")
+    part_path = file_path + '.part'
     try:
         print(f"Загрузка страницы {url}")
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         }
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            return response.text
-        else:
-            print(f"Ошибка при загрузке {url}: статус {response.status_code}")
-            return ""
+        with requests.get(url, headers=headers, timeout=10, stream=True) as response:
+            if response.status_code != 200:
+                print(f"Ошибка при загрузке {url}: статус {response.status_code}")
+                return None
+            content_type = response.headers.get('Content-Type', '')
+            if content_type and content_type.split(';')[0].strip().lower() not in html_content_types:
+                print(f"Пропуск {url}: тип содержимого {content_type}")
+                return None
+            declared_size = response.headers.get('Content-Length', '')
+            if declared_size.isdigit() and int(declared_size) > max_page_bytes:
+                print(f"Пропуск {url}: размер {declared_size} байт больше {max_page_bytes}")
+                return None
+            header_charset = charset_pattern.search(content_type)
+            size = 0
+            head = b''
+            with open(part_path, 'wb') as f:
+                # iter_content распаковывает gzip, поэтому лимит действует на распакованный размер
+                for chunk in response.iter_content(chunk_size):
+                    size += len(chunk)
+                    if size > max_page_bytes:
+                        print(f"Пропуск {url}: страница больше {max_page_bytes} байт")
+                        return None
+                    if len(head) < chunk_size:
+                        head += chunk[:chunk_size - len(head)]
+                    f.write(chunk)
+        if size == 0:
+            return None
+        # Перекодируется и UTF-8: недопустимые байты заменяются, и следующие этапы
+        # читают страницы без ошибок декодирования
+        charset = detect_charset(header_charset.group(1) if header_charset else None, head)
+        transcode(part_path, file_path, charset)
+        return file_path
     except Exception as e:
         print(f"Ошибка при загрузке {url}: {e}")
-        return ""
+        return None
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
 
-def save_page(content: str, file_id: int) -> str:
-    filename = f"page_{file_id:03d}.html"
-    file_path = os.path.join(pages_dir, filename)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return file_path
+def index_line(file_id: int, url: str, file_path: str) -> str:
+    """Строка индексного файла: номер, URL, дата загрузки, размер в байтах и язык страницы"""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        lang = html_lang_pattern.search(f.read(4096))
+    return (f"{file_id} {url} {datetime.date.today().isoformat()} "
+            f"{os.path.getsize(file_path)} {lang.group(1).lower() if lang else '-'}\n")
 
 # Основная функция
 def main():
@@ -54,21 +158,21 @@ def main():
     
     with open(index_file, 'w', encoding='utf-8') as index:
         for i, url in enumerate(urls, 1):
-            if i > 100:  
+            if i > max_pages:
                 break
                 
-            content = download_page(url)
+            file_path = download_page(url, i)
             
-            if not content:
+            if not file_path:
                 continue
                 
-            file_path = save_page(content, i)
             print(f"Сохранена страница {i}: {url} -> {file_path}")
             
-            index.write(f"{i} {url}\n")
+            index.write(index_line(i, url, file_path))
             
-            delay = random.uniform(1.0, 3.0)
-            time.sleep(delay)
+            delay = random.uniform(min_delay, max_delay)
+            if delay > 0:
+                time.sleep(delay)
     
     print("Краулинг завершен")
 